@@ -0,0 +1,336 @@
+# asgi.py
+# Async (ASGI) entry point for peak submission traffic.
+#
+# With sync workers every in-flight request holds a thread while it waits on
+# TiDB Cloud. Here the hot, I/O-bound routes run on an event loop with an
+# aiomysql pool, so one worker process keeps many requests in flight:
+#   POST /submit
+#   GET  /schools, /locations, /reporting_branch, /grades, /workbook_name, /form-bootstrap
+# They run the same SQL as backend.py (ENTRY_INSERT, entry_totals_sql,
+# lock_stock_sql, ... are imported from there) and share its lookup_cache, so
+# responses are identical. Every other route (/login, /admin/*, /submit/batch,
+# CORS preflights, ...) is passed to the Flask app through asgiref's WSGI
+# adapter, which runs it on a thread pool like before.
+#
+# Run it with gunicorn_asgi.conf.py (uvicorn workers):
+#   gunicorn -c gunicorn_asgi.conf.py asgi:app
+# or for development: uvicorn asgi:app --port 5001
+#
+# ASYNC_DB_POOL_SIZE connections per worker (default 10) serve the async
+# routes; DB_POOL_* still sizes the sync pool used by the Flask routes. With a
+# read endpoint configured (DB_READ_*, see backend.py) the lookups read from a
+# second pool of the same size there.
+import asyncio
+import os
+import ssl
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs
+
+import aiomysql
+from asgiref.wsgi import WsgiToAsgi
+
+import backend
+import metrics
+from db import connect_args_from_env, read_endpoint_configured, read_session_sql
+
+ASYNC_DB_POOL_SIZE = int(os.environ.get("ASYNC_DB_POOL_SIZE", 10))
+ASYNC_DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+ASYNC_DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-expose-headers", ", ".join(backend.CORS_EXPOSE_HEADERS).encode()),
+]
+
+flask_app = WsgiToAsgi(backend.app)
+pool = None
+read_pool = None
+
+
+async def create_pool(args, session_sql=()):
+    context = None
+    if not args.get("ssl_disabled"):
+        # Same TLS settings as the sync pool: verify the server against DB_SSL_CA
+        context = ssl.create_default_context(cafile=args.get("ssl_ca"))
+    return await aiomysql.create_pool(
+        host=args["host"], port=args["port"], user=args["user"], password=args["password"],
+        db=args["database"], ssl=context, autocommit=False, init_command="; ".join(session_sql) or None,
+        # minsize=0: no connection at startup, so a database blip can't fail the lifespan (and the worker)
+        minsize=0, maxsize=ASYNC_DB_POOL_SIZE, pool_recycle=ASYNC_DB_POOL_RECYCLE,
+    )
+
+
+async def warm_pools():
+    """Opens one connection per async pool in the background, like backend.warm_pools()."""
+    for p in (pool, read_pool):
+        if p is None:
+            continue
+        try:
+            conn = await p.acquire()
+            p.release(conn)
+        except Exception as e:
+            print(f"Async database pool could not connect yet: {e}")
+
+
+class db_cursor:
+    """async with db_cursor() as (conn, cur): -- like backend.db_cursor(); rolled back unless committed."""
+
+    def __init__(self, read=False):
+        # Same rule as the Flask lookups: no replica right after this worker invalidated them
+        self.pool = read_pool if read and read_pool and backend.lookup_read() else pool
+
+    async def __aenter__(self):
+        try:
+            self.conn = await asyncio.wait_for(self.pool.acquire(), ASYNC_DB_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise backend.PoolTimeout(f"No database connection free after {ASYNC_DB_POOL_TIMEOUT:.0f}s")
+        self.cur = await self.conn.cursor()
+        return self.conn, self.cur
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            await self.cur.close()
+            await self.conn.rollback()  # no-op after commit(); ends read snapshots too
+        finally:
+            self.pool.release(self.conn)
+
+
+async def execute(cur, sql, params=None, many=False):
+    """cur.execute()/executemany() timed into the same metrics as db.py's cursors."""
+    started = time.perf_counter()
+    try:
+        if many:
+            await cur.executemany(sql, params)
+        else:
+            await cur.execute(sql, params)
+    finally:
+        metrics.observe_query(sql, time.perf_counter() - started)
+
+
+async def fetchall(cur):
+    rows = await cur.fetchall()
+    metrics.observe_rows(len(rows))
+    return rows
+
+
+async def fetch_column(sql, params=()):
+    async with db_cursor(read=True) as (conn, cur):
+        await execute(cur, sql, params)
+        return [r[0] for r in await fetchall(cur)]
+
+
+# --- RESPONSES ---
+async def respond(send, status, body=b"", headers=()):
+    """Sends the response; returns (status, body bytes) for the request metrics."""
+    headers = CORS_HEADERS + [(k.encode(), v.encode()) for k, v in headers]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+    return status, len(body)
+
+
+async def respond_json(send, status, value, headers=()):
+    body = backend.app.json.dumps(value).encode()
+    return await respond(send, status, body, [("content-type", "application/json"), *headers])
+
+
+def header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def etag_matches(scope, etag):
+    # If-None-Match: "abc", W/"def" -- same test as werkzeug's request.if_none_match
+    tags = [t.strip().removeprefix("W/").strip('"') for t in header(scope, b"if-none-match").split(",")]
+    return etag in tags or "*" in tags
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+# --- ROUTES (same behaviour as the Flask routes of the same name) ---
+async def cached_lookup(scope, send, key, loader):
+    value, etag = await backend.lookup_cache.get_or_load_async(key, loader)
+    headers = [("etag", f'"{etag}"'), ("cache-control", backend.LOOKUP_CACHE_CONTROL)]
+    if etag_matches(scope, etag):
+        return await respond(send, 304, headers=headers)
+    return await respond_json(send, 200, value, headers)
+
+
+async def get_schools(scope, send, args):
+    return await cached_lookup(scope, send, ("schools",), lambda: fetch_column(backend.LOOKUP_SQL["schools"]))
+
+
+async def get_locations(scope, send, args):
+    school = args.get("school", "")
+    return await cached_lookup(scope, send, ("locations", school),
+                               lambda: fetch_column(backend.LOOKUP_SQL["locations"], (school,)))
+
+
+async def get_reporting_branch(scope, send, args):
+    school, location = args.get("school", ""), args.get("location", "")
+
+    async def load():
+        rows = await fetch_column(backend.LOOKUP_SQL["reporting_branch"], (school, location))
+        return {"reporting_branch": rows[0] if rows else ""}
+
+    return await cached_lookup(scope, send, ("reporting_branch", school, location), load)
+
+
+async def get_grades(scope, send, args):
+    return await cached_lookup(scope, send, ("grades",), lambda: fetch_column(backend.LOOKUP_SQL["grades"]))
+
+
+async def workbooks_by_grade(scope, send, args):
+    grade = args.get("grade")
+    if not grade:
+        return await respond_json(send, 200, {"workbooks": []})
+
+    async def load():
+        return {"workbooks": await fetch_column(backend.LOOKUP_SQL["workbook_name"], (grade,))}
+
+    return await cached_lookup(scope, send, ("workbook_name", grade), load)
+
+
+async def load_form_tree():
+    async with db_cursor(read=True) as (conn, cur):
+        await execute(cur, backend.FORM_TREE_SCHOOLS_SQL)
+        school_rows = await fetchall(cur)
+        await execute(cur, backend.FORM_TREE_WORKBOOKS_SQL)
+        workbook_rows = await fetchall(cur)
+    return backend.form_tree(school_rows, workbook_rows)
+
+
+async def form_bootstrap(scope, send, args):
+    tree, etag = await backend.lookup_cache.get_or_load_async(("form_tree",), load_form_tree)
+    headers = [("etag", f'"{etag}"'), ("cache-control", backend.LOOKUP_CACHE_CONTROL), ("vary", "Accept-Encoding")]
+    if etag_matches(scope, etag):
+        return await respond(send, 304, headers=headers)
+    encoding = backend.negotiate_encoding(header(scope, b"accept-encoding"))
+    if encoding:
+        headers.append(("content-encoding", encoding))
+    body = backend.bootstrap_body(tree, etag, encoding)
+    return await respond(send, 200, body, [("content-type", "application/json"), *headers])
+
+
+async def submit_form(scope, send, data):
+    submitted_at = datetime.utcnow() + timedelta(hours=5, minutes=30)
+    count = backend.positive_count(data.get("count"))
+    if count is None:
+        return await respond_json(send, 400, {"success": False, "message": backend.COUNT_MESSAGE})
+    stock_key = (str(data.get("grade")), str(data.get("workbook")))
+
+    async with db_cursor() as (conn, cur):
+        await execute(cur, *backend.lock_stock_sql([stock_key]))
+        balances = backend.stock_balances_from(await fetchall(cur))
+        balance = balances.get(stock_key)
+        if backend.STOCK_ENFORCE and balance and balance[0] - balance[1] < count:
+            return await respond_json(send, 409, {
+                "success": False, "message": f"Only {max(balance[0] - balance[1], 0)} left in stock"})
+
+        await execute(cur, backend.ENTRY_INSERT, (
+            data.get("school"), data.get("location"), data.get("grade"), data.get("term"), data.get("workbook"),
+            count, data.get("remark"), data.get("submitted_by"), submitted_at.isoformat()))
+        new_id = cur.lastrowid
+        await execute(cur, *backend.entry_totals_sql([new_id], +1))
+        # Balance rows are already locked above, so this is record_stock_movements() minus the second lock
+        ledger, updates, keys = backend.stock_movement_rows(
+            [(stock_key[0], stock_key[1], "reserve", 0, count, new_id)], balances)
+        if ledger:
+            await execute(cur, backend.STOCK_MOVEMENT_INSERT, ledger, many=True)
+            if updates:
+                await execute(cur, backend.STOCK_BALANCE_UPDATE, updates, many=True)
+            await execute(cur, *backend.workbook_changes_sql(keys))
+        await execute(cur, *backend.change_log_sql("entries", [new_id], "upsert"))
+        await conn.commit()
+    return await respond_json(send, 200, {"success": True, "id": new_id, "message": "Form submitted successfully"})
+
+
+GET_ROUTES = {
+    "/schools": get_schools,
+    "/locations": get_locations,
+    "/reporting_branch": get_reporting_branch,
+    "/grades": get_grades,
+    "/workbook_name": workbooks_by_grade,
+    "/form-bootstrap": form_bootstrap,
+}
+
+
+async def handle(scope, receive, send):
+    path, method = scope["path"], scope["method"]
+    route = GET_ROUTES.get(path) if method == "GET" else None
+    if route is None and not (path == "/submit" and method == "POST"):
+        return await flask_app(scope, receive, send)
+
+    metrics.start_request(path)
+    status, size = 500, None
+    try:
+        if route is not None:
+            args = {k: v[0] for k, v in parse_qs(scope["query_string"].decode()).items()}
+            status, size = await route(scope, send, args)
+        else:
+            try:
+                data = backend.app.json.loads(await read_body(receive) or b"{}")
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                status, size = await respond_json(send, 400, {"success": False, "message": "Invalid JSON body"})
+            else:
+                status, size = await submit_form(scope, send, data)
+    except backend.PoolTimeout as err:
+        status, size = await respond_json(send, 503, {"success": False, "message": str(err)})
+    except aiomysql.Error as err:
+        print(f"Async route {path} failed: {err}")
+        status, size = await respond_json(send, 500, {"success": False, "message": f"Database error: {err}"})
+    finally:
+        metrics.finish_request(method, status, size)
+
+
+async def lifespan(receive, send):
+    global pool, read_pool
+    warm_task = None
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                pool = await create_pool(connect_args_from_env())
+                if read_endpoint_configured():
+                    read_pool = await create_pool(connect_args_from_env("DB_READ_"), read_session_sql())
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            print(f"Async database pool created (max {ASYNC_DB_POOL_SIZE} connections).")
+            backend.create_app()  # warms the sync pools used by the Flask routes
+            warm_task = asyncio.get_running_loop().create_task(warm_pools())
+            if backend.MAINTENANCE_MODE == "thread":
+                backend.maintenance.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if warm_task is not None and not warm_task.done():
+                # Still waiting on a connection: don't close the pools under it
+                warm_task.cancel()
+                try:
+                    await warm_task
+                except asyncio.CancelledError:
+                    pass
+            for p in (pool, read_pool):
+                if p is not None:
+                    p.close()
+                    await p.wait_closed()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return None
+    return await handle(scope, receive, send)
@@ -0,0 +1,88 @@
+# auth.py
+# Signed, expiring access tokens (itsdangerous) so protected routes can be
+# authorized from the token alone, without a users lookup per request.
+#
+# Tokens carry the user's id, email, name and role plus their issue time.
+# update_user/delete_user revoke a user: tokens issued before that moment are
+# refused. Revocations are applied in-process immediately and written to the
+# user_revocations table; other workers pick them up when they refresh the
+# cache (one query every AUTH_REVOCATION_REFRESH seconds, not per request).
+import os
+import secrets
+import threading
+import time
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+
+class AuthError(Exception):
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenAuth:
+    def __init__(self, secret_key, ttl=8 * 3600, revocation_refresh=30.0):
+        self.serializer = URLSafeTimedSerializer(secret_key, salt="access-token")
+        self.ttl = ttl
+        self.revocation_refresh = revocation_refresh
+        self._revoked = {}  # user_id -> revoked_at (unix time)
+        self._lock = threading.Lock()
+        self._refreshed_at = 0.0
+
+    @classmethod
+    def from_env(cls, dev=False):
+        """dev=True (or FLASK_DEBUG=1) allows a random key when SECRET_KEY is unset."""
+        secret_key = os.environ.get("SECRET_KEY")
+        if not secret_key:
+            # Tokens won't validate across workers/restarts without a shared
+            # key, so only a dev server may start without one
+            if not dev and os.environ.get("FLASK_DEBUG", "").lower() not in ("1", "true"):
+                raise RuntimeError("SECRET_KEY is not set (set FLASK_DEBUG=1 to use a random key in development)")
+            print("WARNING: SECRET_KEY not set; using a random per-process key for access tokens.")
+            secret_key = secrets.token_hex(32)
+        return cls(
+            secret_key,
+            ttl=int(os.environ.get("ACCESS_TOKEN_TTL", 8 * 3600)),
+            revocation_refresh=float(os.environ.get("AUTH_REVOCATION_REFRESH", 30)),
+        )
+
+    def issue(self, user_id, email, name, role):
+        return self.serializer.dumps({"uid": user_id, "email": email, "name": name, "role": role, "iat": time.time()})
+
+    def verify(self, token, load_revocations=None):
+        """Returns the token claims, or raises AuthError."""
+        try:
+            claims = self.serializer.loads(token, max_age=self.ttl)
+        except SignatureExpired:
+            raise AuthError("Session expired, please log in again")
+        except BadSignature:
+            raise AuthError("Invalid token")
+
+        if load_revocations and time.monotonic() - self._refreshed_at > self.revocation_refresh:
+            self.refresh_revocations(load_revocations)
+        with self._lock:
+            revoked_at = self._revoked.get(claims["uid"])
+        if revoked_at is not None and claims["iat"] <= revoked_at:
+            raise AuthError("Session revoked, please log in again")
+        return claims
+
+    def revoke(self, user_id, revoked_at=None):
+        with self._lock:
+            self._revoked[user_id] = revoked_at or time.time()
+
+    def refresh_revocations(self, load_revocations):
+        """load_revocations(since) -> [(user_id, revoked_at_unix), ...] revoked after since."""
+        self._refreshed_at = time.monotonic()
+        since = time.time() - self.ttl
+        try:
+            rows = load_revocations(since)
+        except Exception as e:
+            print(f"Could not refresh token revocations: {e}")
+            return
+        with self._lock:
+            for user_id, revoked_at in rows:
+                self._revoked[user_id] = max(self._revoked.get(user_id, 0), revoked_at)
+            # Anything older than the token lifetime can no longer match a live token
+            for user_id in [u for u, at in self._revoked.items() if at < since]:
+                del self._revoked[user_id]
@@ -1,66 +1,245 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, stream_with_context, g, has_request_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 from datetime import datetime, timedelta
 import secrets
+import json
+import gzip
+import tempfile
+import csv
+import io
+import threading
+import time
+from contextlib import contextmanager
 import mysql.connector
-from mysql.connector import pooling
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
-import pytz
+import click
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is used when brotli isn't installed
+    brotli = None
+
+from cache import LookupCache
+from db import (DBPool, PoolTimeout, ReadWriteRouter, connect_args_from_env, read_endpoint_configured,
+                read_session_sql)
+from mailer import EmailQueue
+from import_excel import import_file, DEFAULT_CHUNK_SIZE
+from auth import TokenAuth, AuthError
+from passwords import hash_password, verify_password, needs_rehash, rehash_later
+from ratelimit import RateLimiter, parse_rule
+from scheduler import Scheduler
+import changefeed
+from changefeed import ChangeNotifier
+from schoolsearch import SchoolIndex
+from totals import branch_of, refresh_branches
+from paging import encode_cursor, decode_cursor, chunked
+import bulkedit
+from migrate import migrate, explain_check
+import metrics
+import jsonprovider
 
 # .env file se environment variables load karo
 load_dotenv()
 
 # --- UPDATED DATABASE CONFIGURATION FOR TIDB CLOUD ---
-try:
-    # SSL arguments for the secure connection
-    ssl_args = {
-        'ssl_ca': os.environ.get("DB_SSL_CA"),    
-        'ssl_verify_identity': True
-    }
+# Pool sizing/timeouts come from DB_POOL_* env vars, see db.py.
+# Heavy reads can go to a second endpoint (see READ / WRITE ROUTING below):
+#   DB_READ_HOST=replica.example DB_READ_PORT=3306 ...  # MySQL replica; other DB_READ_* default to DB_*
+#   DB_READ_REPLICA_READ=follower                       # TiDB follower reads on the same cluster
+# Locally: two MySQL instances, e.g. DB_PORT=3306 and DB_READ_HOST=127.0.0.1 DB_READ_PORT=3307.
+# Creating the pools opens no connection: they connect (with retries) on first
+# use, so importing this module is fast and a database blip at boot doesn't
+# kill the worker. create_app() warms them in the background.
+db_pool = DBPool.from_env(connect_args_from_env())
+read_pool = None
+if read_endpoint_configured():
+    read_pool = DBPool.from_env(connect_args_from_env("DB_READ_"), "DB_READ_", read_session_sql())
+
+
+def warm_pools():
+    """Opens one connection per pool so the first request skips the TLS handshake; failures are only logged."""
+    for name, pool in (("Database", db_pool), ("Read", read_pool)):
+        if pool is None:
+            continue
+        try:
+            pool.prefill(1)
+            app.logger.info("%s connection pool ready (%s:%s).", name,
+                            pool.connect_args["host"], pool.connect_args["port"])
+        except mysql.connector.Error as err:
+            app.logger.warning("%s connection pool could not connect yet: %s. "
+                               "Requests will retry; check the DB_* environment variables if this persists.", name, err)
 
 
-    db_pool = pooling.MySQLConnectionPool(
-        pool_name="mypool",
-        pool_size=5,
-        host=os.environ.get("DB_HOST"),
-        user=os.environ.get("DB_USER"),
-        password=os.environ.get("DB_PASSWORD"),
-        database=os.environ.get("DB_NAME"),
-        port=int(os.environ.get("DB_PORT")),
-        **ssl_args
-    )
+app = Flask(__name__)
+# Response headers the browser may read; asgi.py sends the same list on its routes
+CORS_EXPOSE_HEADERS = ["X-Total-Count", "ETag", "X-Primary-Until"]
+CORS(app, expose_headers=CORS_EXPOSE_HEADERS)
+# orjson-backed jsonify() when orjson is installed (JSON_PROVIDER=default to turn off)
+app.logger.info("JSON provider: %s", jsonprovider.install(app))
+
+# --- METRICS (see metrics.py) ---
+# Per-route latency, DB queries/time, rows fetched and response size, plus a
+# slow-query log (SLOW_QUERY_MS). Scrape GET /metrics; set METRICS_TOKEN to
+# require "Authorization: Bearer <METRICS_TOKEN>" there.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+for pool in (db_pool, read_pool):
+    if pool:
+        pool.on_query = metrics.observe_query
+        pool.on_rows = metrics.observe_rows
+
+
+@app.before_request
+def start_request_metrics():
+    # Registered before the auth hooks so their time is included
+    metrics.start_request(request.url_rule.rule if request.url_rule else "unmatched")
+
+
+@app.after_request
+def finish_request_metrics(response):
+    # Streamed responses (exports) have no length up front; their latency is time to first byte
+    size = None if response.is_streamed else response.calculate_content_length()
+    metrics.finish_request(request.method, response.status_code, size)
+    return response
+
+
+def pool_gauge(pool):
+    def gauge():
+        stats = pool.stats()
+        return {(k,): stats[k] for k in ("in_use", "idle", "waiting")}
+    return gauge
+
+
+metrics.registry.register(metrics.Gauge("db_pool_connections", "Pool connections by state", pool_gauge(db_pool), ("state",)))
+if read_pool:
+    metrics.registry.register(metrics.Gauge(
+        "db_read_pool_connections", "Read pool connections by state", pool_gauge(read_pool), ("state",)))
+metrics.registry.register(metrics.Gauge(
+    "db_pool_timeouts", "Requests that gave up waiting for a connection", lambda: {(): db_pool.stats()["timeouts"]}))
+metrics.registry.register(metrics.Gauge(
+    "email_queue_pending", "Emails waiting to be sent", lambda: {(): email_queue.stats()["pending"]}))
+metrics.registry.register(metrics.Gauge(
+    "lookup_cache_hits", "Form lookup cache hits/misses", lambda: {
+        ("hit",): lookup_cache.stats()["hits"], ("miss",): lookup_cache.stats()["misses"]}, ("result",)))
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+    return metrics.registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+# --- HELPERS ---
+# Connection a maintenance job holds its GET_LOCK on (see maintenance_lock);
+# db_cursor() on that thread reuses it so the job takes no second pool slot.
+maintenance_conn = threading.local()
+
+
+def db_cursor(dictionary=False, read=False):
+    """
+    with db_cursor() as (conn, cur): ... -- cursor closed and connection returned on exit.
+    read=True lets a read-only query go to the read pool (see db_router).
+    """
+    pinned = getattr(maintenance_conn, "conn", None)
+    if pinned is not None:
+        return pinned_cursor(pinned, dictionary)
+    pool = db_router.pool_for(True, *read_client()) if read else db_pool
+    return pool.cursor(dictionary=dictionary)
+
+
+@contextmanager
+def pinned_cursor(conn, dictionary=False):
+    """Like db_cursor() on a connection we keep: closes the cursor and rolls back what wasn't committed."""
+    cur = conn.cursor(dictionary=dictionary)
+    try:
+        yield conn, cur
+    finally:
+        cur.close()
+        if conn.in_transaction:
+            conn.rollback()
 
-    print("Database connection pool created successfully for TiDB Cloud.")
-except mysql.connector.Error as err:
-    print(f"Error creating connection pool: {err}")
-    print("Please ensure your Render environment variables are configured correctly.")
-    exit()
 
+def fetch_table(cur):
+    """(column names, row tuples) of the last query on a tuple cursor."""
+    rows = cur.fetchall()
+    return [d[0] for d in cur.description], rows
 
-app = Flask(__name__)
-CORS(app)
 
-hashed_pw = generate_password_hash("user_plain_password")
-# --- HELPERS ---
-def get_conn():
-    """Gets a connection from the pool."""
-    return db_pool.get_connection()
+def wants_columns():
+    return request.args.get("format") == "columns"
+
+
+def table_body(columns, rows):
+    """
+    List payload for the admin tables. ?format=columns returns
+    {"columns": [...], "rows": [[...], ...]} (no per-row dicts, keys sent once);
+    otherwise the usual list of objects.
+    """
+    if wants_columns():
+        return {"columns": columns, "rows": rows}
+    return [dict(zip(columns, row)) for row in rows]
+
 
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(err):
+    return jsonify({"success": False, "message": str(err)}), 503
+
+
+@app.route("/admin/db-pool", methods=["GET"])
+def db_pool_stats():
+    stats = db_pool.stats()
+    if read_pool:
+        stats["read_pool"] = read_pool.stats()
+    stats["routing"] = db_router.stats()
+    return jsonify(stats)
+
+
+# --- READ / WRITE ROUTING (see db.py) ---
+# Routes whose queries only read and can stand a replica's lag (submission
+# lists, school/workbook tables, exports, summaries, dropdown lookups) open
+# db_cursor(read=True); everything else, and every read inside a write
+# transaction, stays on the primary. After a mutating request (POST/PUT/
+# PATCH/DELETE that succeeded) the same admin reads from the primary for
+# DB_READ_AFTER_WRITE seconds. The response's X-Primary-Until header carries
+# that deadline; a client sending it back gets the same on any worker.
+# TiDB follower reads are already consistent with the leader, so there the
+# window only costs a few primary reads.
+db_router = ReadWriteRouter(db_pool, read_pool, float(os.environ.get("DB_READ_AFTER_WRITE", 5)))
+MUTATING_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+def read_client():
+    """(client key, primary_until) of the current request for db_router.pool_for()."""
+    if not has_request_context():
+        return None, None
+    user = g.get("user")
+    try:
+        primary_until = float(request.headers.get("X-Primary-Until", ""))
+    except ValueError:
+        primary_until = None
+    return (user["uid"] if user else None), primary_until
+
+
+@app.after_request
+def note_request_writes(response):
+    user = g.get("user")
+    if db_router.split and user and request.method in MUTATING_METHODS and response.status_code < 400:
+        response.headers["X-Primary-Until"] = f"{db_router.note_write(user['uid']):.3f}"
+    return response
+
+
+# --- EMAIL (background queue, see mailer.py) ---
+# EMAIL_TRANSPORT=stub logs messages instead of calling SendGrid
+email_queue = EmailQueue.from_env()
 
-# --- SENDGRID EMAIL ---
-SENDGRID_API_KEY = os.environ.get("SENDGRID_API_KEY")
 
 def send_reset_email(to_email, reset_link):
-    """Send password reset email using SendGrid."""
-    message = Mail(
-        from_email='muhammed.shaikh@onmyowntechnology.com',
-        to_emails=to_email,
-        subject='OMOTEC Password Reset',
-        html_content=f"""
+    """Queue the password reset email; returns False if this recipient is rate limited."""
+    return email_queue.enqueue(
+        to_email,
+        'OMOTEC Password Reset',
+        f"""
         <p>Hello,</p>
         <p>We received a request to reset your password.</p>
         <p>Click the link below to set a new password (valid for 30 minutes):<br>
@@ -69,13 +248,110 @@ def send_reset_email(to_email, reset_link):
         <p>- OMOTEC Team</p>
         """
     )
-    try:
-        sg = SendGridAPIClient(SENDGRID_API_KEY)
-        response = sg.send(message)
-        print(f"SendGrid email sent. Status: {response.status_code}")
-    except Exception as e:
-        print("SendGrid error:", e)
-        raise e
+
+
+@app.route("/admin/email-queue", methods=["GET"])
+def email_queue_stats():
+    return jsonify(email_queue.stats())
+
+
+# --- ACCESS TOKENS (see auth.py) ---
+# login issues a signed token; every /admin/* route requires an admin token in
+# "Authorization: Bearer <token>" (or ?access_token= for downloads/streams).
+# `python backend.py` is the debug dev server (see MAIN), so it may run without SECRET_KEY
+token_auth = TokenAuth.from_env(dev=__name__ == "__main__")
+
+
+def load_revocations(since):
+    with db_cursor() as (conn, cur):
+        cur.execute("SELECT user_id, revoked_at FROM user_revocations WHERE revoked_at > %s", (since,))
+        return cur.fetchall()
+
+
+def revoke_user(cur, user_id):
+    """Invalidates tokens issued to user_id so far (role/password change, deletion)."""
+    now = time.time()
+    cur.execute(
+        "INSERT INTO user_revocations (user_id, revoked_at) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE revoked_at = VALUES(revoked_at)",
+        (user_id, now)
+    )
+    token_auth.revoke(user_id, now)
+
+
+def request_token():
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return header[len("Bearer "):].strip()
+    return request.args.get("access_token")
+
+
+def current_claims():
+    """Claims of the request's access token, or raises AuthError."""
+    token = request_token()
+    if not token:
+        raise AuthError("Login required")
+    return token_auth.verify(token, load_revocations)
+
+
+@app.before_request
+def authorize_admin_routes():
+    if request.method == "OPTIONS" or not request.path.startswith("/admin/"):
+        return None
+    claims = current_claims()
+    if claims.get("role") != "admin":
+        raise AuthError("Admin access required", 403)
+    g.user = claims
+    return None
+
+
+@app.errorhandler(AuthError)
+def handle_auth_error(err):
+    return jsonify({"success": False, "message": str(err)}), err.status
+
+
+# --- RATE LIMITING (see ratelimit.py) ---
+# Sliding-window limits on the auth endpoints, checked before any DB query or
+# password hash. Rules are "attempts/seconds" and can be tuned per env var.
+# RATE_LIMIT_BACKEND=redis shares the counters between workers.
+rate_limiter = RateLimiter.from_env()
+RATE_LIMITS = {
+    "login_ip": parse_rule(os.environ.get("RATE_LIMIT_LOGIN_IP", "30/300")),
+    "login_email": parse_rule(os.environ.get("RATE_LIMIT_LOGIN_EMAIL", "5/900")),  # failed attempts only
+    "forgot_ip": parse_rule(os.environ.get("RATE_LIMIT_FORGOT_IP", "5/900")),
+    "forgot_email": parse_rule(os.environ.get("RATE_LIMIT_FORGOT_EMAIL", "3/3600")),
+    "reset_ip": parse_rule(os.environ.get("RATE_LIMIT_RESET_IP", "10/900")),
+}
+
+# Render (and most hosts) put one proxy in front of the app, so remote_addr is
+# the proxy's IP; trust that many X-Forwarded-For hops. Use 0 when exposed directly.
+proxy_hops = int(os.environ.get("TRUSTED_PROXY_HOPS", 1))
+if proxy_hops:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops)
+
+
+def too_many_requests(retry_after):
+    response = jsonify({"success": False, "message": "Too many attempts, please try again later"})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+
+def throttle(*checks):
+    """
+    checks are (rule, key) pairs; each allowed one counts as an attempt.
+    Returns a 429 response if any rule is exhausted, else None.
+    """
+    for rule, key in checks:
+        limit, window = RATE_LIMITS[rule]
+        retry_after = rate_limiter.hit(rule, key, limit, window)
+        if retry_after:
+            return too_many_requests(retry_after)
+    return None
+
+
+@app.route("/admin/rate-limits", methods=["GET"])
+def rate_limit_stats():
+    return jsonify(rate_limiter.stats())
 
 
 # --- AUTHENTICATION & PASSWORD RESET APIS ---
@@ -86,10 +362,11 @@ def forgot_password():
     if not email:
         return jsonify({"success": False, "message": "Email required"}), 400
 
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+    limited = throttle(("forgot_ip", request.remote_addr), ("forgot_email", email.lower()))
+    if limited:
+        return limited
 
-    try:
+    with db_cursor(dictionary=True) as (conn, cur):
         cur.execute("SELECT id FROM users WHERE email=%s", (email,))
         user = cur.fetchone()
         if not user:
@@ -107,18 +384,12 @@ def forgot_password():
         )
         conn.commit()
 
-        # IMPORTANT: Fix the reset link
-        reset_link = f"https://school-operation-app.vercel.app/reset-password?token={token}"
+    # IMPORTANT: Fix the reset link
+    reset_link = f"https://school-operation-app.vercel.app/reset-password?token={token}"
 
-        try:
-            send_reset_email(email, reset_link)
-            return jsonify({"success": True, "message": "Password reset link sent to your email."})
-        except Exception as e:
-            return jsonify({"success": False, "message": f"Failed to send email: {str(e)}"}), 500
-
-    finally:
-        cur.close()
-        conn.close()
+    # Delivery happens in the background; the connection is already back in the pool
+    send_reset_email(email, reset_link)
+    return jsonify({"success": True, "message": "Password reset link sent to your email."})
 
 
 
@@ -131,55 +402,44 @@ def reset_password():
     if not token or not new_password:
         return jsonify({"success": False, "message": "Token and new password required"}), 400
 
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
+    # Limits token guessing per client
+    limited = throttle(("reset_ip", request.remote_addr))
+    if limited:
+        return limited
 
-    try:
-        cur.execute("SELECT email, expires_at FROM reset_tokens WHERE token=%s", (token,))
-        row = cur.fetchone()
+    with db_cursor(dictionary=True) as (conn, cur):
+        try:
+            # Expiry is filtered in SQL (expires_at is stored as naive UTC)
+            cur.execute(
+                "SELECT email FROM reset_tokens WHERE token=%s AND expires_at > %s",
+                (token, datetime.utcnow().replace(microsecond=0))
+            )
+            row = cur.fetchone()
 
-        if not row:
-            return jsonify({"success": False, "message": "Invalid or expired token"}), 400
-
-        email = row['email']
-        expires_at = row['expires_at']
-
-        # 🔹 Convert expires_at to datetime safely
-        if isinstance(expires_at, str):
-            try:
-                # Try with microseconds
-                expires_at = datetime.strptime(expires_at, "%Y-%m-%d %H:%M:%S.%f")
-            except ValueError:
-                # fallback: without microseconds
-                expires_at = datetime.strptime(expires_at, "%Y-%m-%d %H:%M:%S")
-        elif isinstance(expires_at, datetime):
-            pass  # already datetime
-
-        # 🔹 Make expires_at timezone-aware in UTC
-        expires_at = pytz.UTC.localize(expires_at)
-
-        # 🔹 Compare with current UTC time
-        now_utc = datetime.utcnow().replace(tzinfo=pytz.UTC)
-        if now_utc > expires_at:
-            return jsonify({"success": False, "message": "Token expired"}), 400
-
-        # 🔹 Hash new password
-        hashed_password = generate_password_hash(new_password)
-
-        # 🔹 Update user password and delete token
-        cur.execute("UPDATE users SET password=%s WHERE email=%s", (hashed_password, email))
-        cur.execute("DELETE FROM reset_tokens WHERE token=%s", (token,))
-        conn.commit()
+            if not row:
+                return jsonify({"success": False, "message": "Invalid or expired token"}), 400
 
-        return jsonify({"success": True, "message": "Password reset successful"})
+            email = row['email']
 
-    except mysql.connector.Error as err:
-        conn.rollback()
-        return jsonify({"success": False, "message": f"Database error: {err}"}), 500
+            # 🔹 Delete the token first so two concurrent resets can't both use it
+            cur.execute("DELETE FROM reset_tokens WHERE token=%s", (token,))
+            if cur.rowcount == 0:
+                conn.rollback()
+                return jsonify({"success": False, "message": "Invalid or expired token"}), 400
+
+            # 🔹 Hash new password (method/cost from PASSWORD_HASH_METHOD)
+            hashed_password = hash_password(new_password)
+
+            # 🔹 Update user password
+            cur.execute("UPDATE users SET password=%s WHERE email=%s", (hashed_password, email))
+            conn.commit()
+
+            return jsonify({"success": True, "message": "Password reset successful"})
+
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return jsonify({"success": False, "message": f"Database error: {err}"}), 500
 
-    finally:
-        cur.close()
-        conn.close()
 
 @app.route("/login", methods=["POST"])
 def login():
@@ -190,28 +450,49 @@ def login():
     if not email.endswith("@onmyowntechnology.com"):
         return jsonify({"success": False, "message": "Invalid domain"}), 401
 
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT password, role FROM users WHERE email=%s", (email,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    # The per-email rule counts failed attempts only (reset on success), so a
+    # user logging in normally never uses it up
+    email_key = email.lower()
+    limit, window = RATE_LIMITS["login_email"]
+    retry_after = rate_limiter.retry_after("login_email", email_key, limit, window)
+    if retry_after:
+        return too_many_requests(retry_after)
+    limited = throttle(("login_ip", request.remote_addr))
+    if limited:
+        return limited
+
+    with db_cursor(dictionary=True) as (conn, cur):
+        cur.execute("SELECT id, name, password, role FROM users WHERE email=%s", (email,))
+        user = cur.fetchone()
 
-    if user and check_password_hash(user['password'], password):
-        return jsonify({"success": True, "role": user['role'], "email": email})
+    if user and verify_password(user['password'], password):
+        rate_limiter.reset("login_email", email_key)
+        if needs_rehash(user['password']):
+            # Legacy/weaker hash: upgrade it off the request thread. The old hash
+            # in the WHERE keeps a concurrent password change from being overwritten
+            rehash_later(password, lambda new_hash, uid=user['id'], old=user['password']: save_rehash(uid, old, new_hash))
+        token = token_auth.issue(user['id'], email, user['name'], user['role'])
+        return jsonify({
+            "success": True, "role": user['role'], "email": email,
+            "token": token, "expires_in": token_auth.ttl,
+        })
     else:
+        rate_limiter.add("login_email", email_key, limit, window)
         return jsonify({"success": False, "message": "Invalid credentials"}), 401
 
+
+def save_rehash(user_id, old_hash, new_hash):
+    with db_cursor() as (conn, cur):
+        cur.execute("UPDATE users SET password=%s WHERE id=%s AND password=%s", (new_hash, user_id, old_hash))
+        conn.commit()
+
 # --- USER MANAGEMENT (ADMIN) ---
 @app.route("/admin/users", methods=["GET"])
 def get_users():
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id, name, email, role FROM users ORDER BY id") # Removed password from GET
-    users = cur.fetchall()
-    cur.close()
-    conn.close()
-    return jsonify(users)
+    with db_cursor(read=True) as (conn, cur):
+        cur.execute("SELECT id, name, email, role FROM users ORDER BY id") # Removed password from GET
+        columns, rows = fetch_table(cur)
+    return jsonify(table_body(columns, rows))
 
 @app.route("/admin/users", methods=["POST"])
 def add_user():
@@ -224,86 +505,178 @@ def add_user():
     if not email or not password:
         return jsonify({"success": False, "message": "Email and password required"}), 400
 
-    hashed_password = generate_password_hash(password)
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            "INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)",
-            (name, email, hashed_password, role)
-        )
-        conn.commit()
-        user_id = cur.lastrowid
-        return jsonify({"success": True, "message": "User added", "id": user_id})
-    except mysql.connector.IntegrityError:
-        return jsonify({"success": False, "message": "User with this email already exists"}), 400
-    finally:
-        cur.close()
-        conn.close()
-
-@app.route("/admin/users/<int:user_id>", methods=["PUT"])
+    hashed_password = hash_password(password)
+    with db_cursor(dictionary=True) as (conn, cur):
+        try:
+            cur.execute(
+                "INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)",
+                (name, email, hashed_password, role)
+            )
+            user_id = cur.lastrowid
+            record_changes(cur, "users", [user_id])
+            conn.commit()
+            return jsonify({"success": True, "message": "User added", "id": user_id})
+        except mysql.connector.IntegrityError:
+            return jsonify({"success": False, "message": "User with this email already exists"}), 400
+
+@app.route("/admin/users/<int:user_id>", methods=["PUT", "PATCH"])
 def update_user(user_id):
+    """Updates only the fields sent; the password is hashed only when a new one is given."""
     data = request.json or {}
-    name = data.get("name")
-    email = data.get("email")
-    password = data.get("password")
-    role = data.get("role", "user")
-
-    if not email or not password: # Password required to update
-        return jsonify({"success": False, "message": "Email and password required"}), 400
-
-    hashed_password = generate_password_hash(password)
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    try:
-        cur.execute(
-            "UPDATE users SET name=%s, email=%s, password=%s, role=%s WHERE id=%s",
-            (name, email, hashed_password, role, user_id)
-        )
+    fields = {k: data[k] for k in ("name", "email", "role") if k in data}
+    if "email" in fields and not fields["email"]:
+        return jsonify({"success": False, "message": "Email cannot be empty"}), 400
+    if data.get("password"):  # blank password = keep the current one
+        fields["password"] = hash_password(data["password"])
+    if not fields:
+        return jsonify({"success": False, "message": "Nothing to update"}), 400
+
+    assignments = ", ".join(f"{k}=%s" for k in fields)
+    with db_cursor(dictionary=True) as (conn, cur):
+        try:
+            cur.execute(f"UPDATE users SET {assignments} WHERE id=%s", list(fields.values()) + [user_id])
+        except mysql.connector.IntegrityError:
+            return jsonify({"success": False, "message": "User with this email already exists"}), 400
+        if cur.rowcount == 0:
+            cur.execute("SELECT 1 FROM users WHERE id=%s", (user_id,))
+            if not cur.fetchone():
+                return jsonify({"success": False, "message": "User not found"}), 404
+        # Tokens carry email/role, and a new password should end old sessions;
+        # a name-only edit leaves existing sessions alone
+        if fields.keys() & {"email", "role", "password"}:
+            revoke_user(cur, user_id)
+        record_changes(cur, "users", [user_id])
         conn.commit()
         return jsonify({"success": True, "message": "User updated"})
-    finally:
-        cur.close()
-        conn.close()
 
 @app.route("/admin/users/<int:user_id>", methods=["DELETE"])
 def delete_user(user_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
+    with db_cursor() as (conn, cur):
         cur.execute("DELETE FROM users WHERE id=%s", (user_id,))
+        revoke_user(cur, user_id)
+        record_changes(cur, "users", [user_id], "delete")
         conn.commit()
         return jsonify({"success": True, "message": "User deleted"})
-    finally:
-        cur.close()
-        conn.close()
 
 # --- FORM SUBMISSIONS (ADMIN) ---
+SUBMISSION_COLUMNS = "id, school_name, location, grade, term, workbook, count, remark, submitted_by, submitted_at, delivered"
+SUBMISSIONS_PAGE_SIZE = 100
+SUBMISSIONS_MAX_PAGE_SIZE = 500
+
+
+def submission_filters(args):
+    """
+    Builds the WHERE clauses for the submissions view from query params:
+    from / to (YYYY-MM-DD, inclusive), school, delivered (Yes/No) and q (a
+    school name or submitter email prefix, so both can use their index).
+    Returns (clauses, params) or raises ValueError for a bad date.
+    """
+    clauses, params = [], []
+
+    from_date = (args.get("from") or "").strip()
+    to_date = (args.get("to") or "").strip()
+    if from_date:
+        clauses.append("submitted_at >= %s")
+        params.append(datetime.strptime(from_date, "%Y-%m-%d").strftime("%Y-%m-%d"))
+    if to_date:
+        # Inclusive "to" date -> strictly before the next day
+        next_day = datetime.strptime(to_date, "%Y-%m-%d") + timedelta(days=1)
+        clauses.append("submitted_at < %s")
+        params.append(next_day.strftime("%Y-%m-%d"))
+
+    school = (args.get("school") or "").strip()
+    if school:
+        clauses.append("school_name = %s")
+        params.append(school)
+
+    delivered = (args.get("delivered") or "").strip()
+    if delivered:
+        clauses.append("delivered = %s")
+        params.append(delivered)
+
+    q = (args.get("q") or "").strip()
+    if q:
+        prefix = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        clauses.append("(school_name LIKE %s OR submitted_by LIKE %s)")
+        params.extend([prefix, prefix])
+
+    return clauses, params
+
+
 @app.route("/admin/form-submissions", methods=["GET"])
 def get_form_submissions():
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("""
-        SELECT id, school_name, location, grade, term, workbook, count, remark, submitted_by, submitted_at, delivered
-        FROM entries
-        ORDER BY submitted_at DESC
-    """)
-    submissions = cur.fetchall()
-    cur.close()
-    conn.close()
-    return jsonify(submissions)
+    """
+    One page of submissions, newest first, using keyset pagination on (submitted_at, id).
+    Pass the returned next_cursor back as ?cursor= to get the following page.
+    The total number of matching rows (total, and the X-Total-Count header) is
+    only counted for the first page, or any page with ?count=1.
+    """
+    try:
+        clauses, params = submission_filters(request.args)
+    except ValueError:
+        return jsonify({"success": False, "message": "Dates must be YYYY-MM-DD"}), 400
+
+    try:
+        limit = int(request.args.get("limit", SUBMISSIONS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"success": False, "message": "limit must be a number"}), 400
+    limit = max(1, min(limit, SUBMISSIONS_MAX_PAGE_SIZE))
+
+    page_clauses, page_params = list(clauses), list(params)
+    cursor = request.args.get("cursor")
+    if cursor:
+        position = decode_cursor(cursor)
+        if not position:
+            return jsonify({"success": False, "message": "Invalid cursor"}), 400
+        page_clauses.append("(submitted_at < %s OR (submitted_at = %s AND id < %s))")
+        page_params.extend([position[0], position[0], position[1]])
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    page_where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+
+    with db_cursor(read=True) as (conn, cur):
+        # Fetch one extra row to know whether another page exists
+        cur.execute(f"""
+            SELECT {SUBMISSION_COLUMNS}
+            FROM entries
+            {page_where}
+            ORDER BY submitted_at DESC, id DESC
+            LIMIT %s
+        """, page_params + [limit + 1])
+        columns, rows = fetch_table(cur)
+
+        total = None
+        if not cursor or request.args.get("count") == "1":
+            cur.execute(f"SELECT COUNT(*) FROM entries {where}", params)
+            total = cur.fetchone()[0]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[columns.index("submitted_at")], last[columns.index("id")])
+
+    body = {"next_cursor": next_cursor, "total": total}
+    if wants_columns():
+        body.update(columns=columns, rows=rows)
+    else:
+        body["submissions"] = table_body(columns, rows)
+    response = jsonify(body)
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
+    return response
 
 @app.route("/admin/form-submissions/<int:submission_id>", methods=["DELETE"])
 def delete_submission(submission_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("DELETE FROM entries WHERE id=%s", (submission_id,))
+    with db_cursor() as (conn, cur):
+        cur.execute("SELECT id FROM entries WHERE id=%s FOR UPDATE", (submission_id,))
+        if cur.fetchone():
+            apply_entry_totals(cur, [submission_id], -1)
+            release_stock_for(cur, [submission_id])
+            cur.execute("DELETE FROM entries WHERE id=%s", (submission_id,))
+            record_changes(cur, "entries", [submission_id], "delete")
         conn.commit()
         return jsonify({"success": True, "message": f"Submission {submission_id} deleted"})
-    finally:
-        cur.close()
-        conn.close()
 
 @app.route("/admin/mark-delivered", methods=["PUT"])
 def mark_delivered():
@@ -314,96 +687,481 @@ def mark_delivered():
     if not ids:
         return jsonify({"success": False, "message": "No IDs provided"}), 400
 
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        placeholders = ",".join(["%s"] * len(ids))
-        query = f"UPDATE entries SET delivered = %s WHERE id IN ({placeholders})"
-        params = [delivered] + ids
+    with db_cursor() as (conn, cur):
+        try:
+            placeholders = ",".join(["%s"] * len(ids))
+            # Only rows whose status actually changes move between entry_totals groups
+            cur.execute(
+                f"SELECT id FROM entries WHERE id IN ({placeholders}) AND delivered <> %s FOR UPDATE",
+                ids + [delivered]
+            )
+            changed = [r[0] for r in cur.fetchall()]
+            updated = 0
+            if changed:
+                # Delivering takes copies off the shelf and out of reserved; undoing puts them back
+                movements = []
+                for entry_id, grade, workbook, count, old in entry_stock_rows(cur, changed):
+                    n = to_int(count)
+                    if delivered == "Yes":
+                        movements.append((grade, workbook, "deliver", -n, -n, entry_id))
+                    elif old == "Yes":
+                        movements.append((grade, workbook, "undeliver", n, n, entry_id))
+                record_stock_movements(cur, movements)
+
+                apply_entry_totals(cur, changed, -1)
+                placeholders = ",".join(["%s"] * len(changed))
+                query = f"UPDATE entries SET delivered = %s WHERE id IN ({placeholders})"
+                params = [delivered] + changed
+                cur.execute(query, params)
+                updated = cur.rowcount
+                apply_entry_totals(cur, changed, +1)
+                record_changes(cur, "entries", changed)
+            conn.commit()
+            return jsonify({"success": True, "updated": updated})
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"success": False, "message": str(e)}), 500
+
+# --- EXPORTS (ADMIN) ---
+# Rows are read from an unbuffered cursor with fetchmany() and written out as
+# they arrive, so memory stays flat regardless of how big entries gets.
+EXPORT_FETCH_SIZE = 1000
+EXPORT_REPORTS = {
+    "submissions": (
+        ["id", "school_name", "location", "grade", "term", "workbook", "count", "remark",
+         "submitted_by", "submitted_at", "delivered"],
+        "SELECT {columns} FROM entries {where} ORDER BY submitted_at DESC, id DESC",
+    ),
+    "delivery": (
+        ["school_name", "location", "grade", "term", "workbook", "ordered", "delivered", "pending"],
+        """
+        SELECT school_name, location, grade, term, workbook,
+               SUM(count) AS ordered,
+               SUM(CASE WHEN delivered = 'Yes' THEN count ELSE 0 END) AS delivered,
+               SUM(CASE WHEN delivered = 'Yes' THEN 0 ELSE count END) AS pending
+        FROM entries {where}
+        GROUP BY school_name, location, grade, term, workbook
+        ORDER BY school_name, location, grade, term, workbook
+        """,
+    ),
+}
+
+
+def stream_rows(query, params):
+    """Yields result rows in batches of EXPORT_FETCH_SIZE; the connection is held only while iterating."""
+    with db_cursor(read=True) as (conn, cur):
         cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+
+
+def csv_chunks(header, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % EXPORT_FETCH_SIZE == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def xlsx_chunks(header, rows, sheet_title):
+    # openpyxl can't emit a zip stream directly; a write-only workbook keeps
+    # memory flat by spilling rows to a temp file, which is then streamed out
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_title)
+    ws.append(header)
+    for row in rows:
+        ws.append(list(row))
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(64 * 1024)
+            if not chunk:
+                break
+            yield chunk
+
+
+@app.route("/admin/form-submissions/export", methods=["GET"])
+def export_submissions():
+    """
+    Streams ?report=submissions (default) or ?report=delivery (ordered/delivered/pending
+    per school, grade, term and workbook) as ?format=csv (default) or xlsx.
+    Accepts the same filters as /admin/form-submissions.
+    """
+    report = request.args.get("report", "submissions")
+    fmt = request.args.get("format", "csv").lower()
+    if report not in EXPORT_REPORTS:
+        return jsonify({"success": False, "message": "report must be submissions or delivery"}), 400
+    if fmt not in ("csv", "xlsx"):
+        return jsonify({"success": False, "message": "format must be csv or xlsx"}), 400
+    try:
+        clauses, params = submission_filters(request.args)
+    except ValueError:
+        return jsonify({"success": False, "message": "Dates must be YYYY-MM-DD"}), 400
+
+    header, template = EXPORT_REPORTS[report]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = template.format(columns=", ".join(header), where=where)
+    rows = stream_rows(query, params)
+
+    filename = f"{report}_{datetime.utcnow():%Y%m%d}.{fmt}"
+    if fmt == "csv":
+        body, mimetype = csv_chunks(header, rows), "text/csv"
+    else:
+        body = xlsx_chunks(header, rows, report.capitalize())
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    response = app.response_class(stream_with_context(body), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+# --- DEMAND / DELIVERY SUMMARY (ADMIN) ---
+# entry_totals holds SUM(count) and COUNT(*) of entries per
+# (school_name, location, reporting_branch, grade, term, workbook, delivered).
+# Every route that inserts, deletes or re-labels entries calls
+# apply_entry_totals() inside its own transaction, so summary reads touch one
+# row per group instead of scanning entries. The branch comes from school_data;
+# every write to school_data (routes and roster import) calls
+# refresh_branches() for the schools it touched (see totals.py).
+# `flask --app backend rebuild-totals` recomputes it all from scratch (backfills).
+#
+# group_key hashes the raw values and the SELECT groups by that same hash:
+# grouping by the (case-insensitive) columns would merge "Pune" and "pune "
+# under one member's key, and the per-entry +/-1 updates would then miss it.
+GROUP_KEY_SQL = """SHA1(CONCAT_WS(CHAR(31), IFNULL(e.school_name, ''), IFNULL(e.location, ''), IFNULL(e.grade, ''),
+                              IFNULL(e.term, ''), IFNULL(e.workbook, ''), IFNULL(e.delivered, '')))"""
+TOTALS_SELECT = f"""
+    SELECT g.group_key, g.school_name, g.location, {branch_of("g")},
+           g.grade, g.term, g.workbook, g.delivered, g.n_rows, g.n_total
+    FROM (
+        SELECT {GROUP_KEY_SQL} AS group_key,
+               ANY_VALUE(e.school_name) AS school_name, ANY_VALUE(e.location) AS location,
+               ANY_VALUE(e.grade) AS grade, ANY_VALUE(e.term) AS term,
+               ANY_VALUE(e.workbook) AS workbook, ANY_VALUE(e.delivered) AS delivered,
+               %s * COUNT(*) AS n_rows, %s * COALESCE(SUM(e.count), 0) AS n_total
+        FROM entries e
+        {{where}}
+        GROUP BY group_key
+    ) g
+"""
+SUMMARY_DIMENSIONS = ("school_name", "location", "reporting_branch", "grade", "term", "workbook", "delivered")
+
+
+def entry_totals_sql(ids, sign):
+    """(sql, params) adding/removing up to BULK_DELETE_CHUNK entries rows to/from entry_totals."""
+    placeholders = ",".join(["%s"] * len(ids))
+    return f"""
+        INSERT INTO entry_totals
+        (group_key, school_name, location, reporting_branch, grade, term, workbook, delivered, row_count, total_count)
+        {TOTALS_SELECT.format(where=f"WHERE e.id IN ({placeholders})")}
+        ON DUPLICATE KEY UPDATE
+            row_count = row_count + VALUES(row_count),
+            total_count = total_count + VALUES(total_count)
+    """, [sign, sign] + list(ids)
+
+
+def apply_entry_totals(cur, ids, sign):
+    """Adds (sign=+1) or removes (sign=-1) the given entries rows from entry_totals."""
+    for chunk in chunked(list(ids), BULK_DELETE_CHUNK):
+        cur.execute(*entry_totals_sql(chunk, sign))
+
+
+def rebuild_entry_totals():
+    """Recomputes entry_totals from entries in one transaction; returns the number of groups."""
+    with db_cursor() as (conn, cur):
+        cur.execute("DELETE FROM entry_totals")
+        cur.execute(f"""
+            INSERT INTO entry_totals
+            (group_key, school_name, location, reporting_branch, grade, term, workbook, delivered, row_count, total_count)
+            {TOTALS_SELECT.format(where="")}
+        """, [1, 1])
+        groups = cur.rowcount
         conn.commit()
-        return jsonify({"success": True, "updated": cur.rowcount})
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"success": False, "message": str(e)}), 500
-    finally:
-        cur.close()
-        conn.close()
+    return groups
+
+
+@app.cli.command("rebuild-totals")
+def rebuild_totals_command():
+    """Backfill entry_totals from the entries table."""
+    started = datetime.utcnow()
+    groups = rebuild_entry_totals()
+    print(f"entry_totals rebuilt: {groups} groups in {(datetime.utcnow() - started).total_seconds():.2f}s")
+
+
+@app.route("/admin/summary", methods=["GET"])
+def get_summary():
+    """
+    Totals from entry_totals grouped by ?group_by= (comma separated, any of
+    SUMMARY_DIMENSIONS, default reporting_branch,grade,delivered) and filtered by
+    any dimension passed as a query param, e.g.
+    /admin/summary?group_by=reporting_branch&grade=5&delivered=No
+    """
+    group_by = [d.strip() for d in request.args.get("group_by", "reporting_branch,grade,delivered").split(",") if d.strip()]
+    unknown = [d for d in group_by if d not in SUMMARY_DIMENSIONS]
+    if unknown or not group_by:
+        return jsonify({"success": False, "message": f"group_by must be from {', '.join(SUMMARY_DIMENSIONS)}"}), 400
+
+    clauses, params = ["row_count > 0"], []
+    for dim in SUMMARY_DIMENSIONS:
+        value = request.args.get(dim)
+        if value is not None and value != "":
+            clauses.append(f"{dim} = %s")
+            params.append(value)
+
+    dims = ", ".join(group_by)
+    with db_cursor(dictionary=True, read=True) as (conn, cur):
+        cur.execute(f"""
+            SELECT {dims}, SUM(row_count) AS entries, SUM(total_count) AS total
+            FROM entry_totals
+            WHERE {' AND '.join(clauses)}
+            GROUP BY {dims}
+            ORDER BY {dims}
+        """, params)
+        rows = cur.fetchall()
+    for row in rows:
+        row["entries"] = int(row["entries"])
+        row["total"] = int(row["total"])
+    return jsonify(rows)
+
+
+BULK_DELETE_CHUNK = 500
+BULK_DELETE_MAX = 5000
+
+
+@app.route("/admin/form-submissions/bulk-delete", methods=["POST"])
+def bulk_delete_submissions():
+    """
+    Deletes many submissions in one transaction.
+    Body: {"ids": [1, 2, ...]} or a filter {"from": "YYYY-MM-DD", "to": ..., "school": ..., "delivered": ...}
+    With "archive": true the rows are copied to entries_archive before being removed.
+    Returns a per-id status: deleted / archived / not_found.
+    """
+    data = request.json or {}
+    archive = bool(data.get("archive"))
+    ids = data.get("ids")
+
+    if ids is not None:
+        try:
+            ids = list(dict.fromkeys(int(i) for i in ids))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "ids must be a list of numbers"}), 400
+        if not ids:
+            return jsonify({"success": False, "message": "No IDs provided"}), 400
+        clauses, params = [], []
+    else:
+        try:
+            clauses, params = submission_filters(data)
+        except ValueError:
+            return jsonify({"success": False, "message": "Dates must be YYYY-MM-DD"}), 400
+        if not clauses:
+            return jsonify({"success": False, "message": "Provide ids or at least one filter"}), 400
+
+    with db_cursor() as (conn, cur):
+        try:
+            # Lock the target rows first so the per-id report matches what was removed
+            if ids is None:
+                cur.execute(
+                    f"SELECT id FROM entries WHERE {' AND '.join(clauses)} LIMIT %s FOR UPDATE",
+                    params + [BULK_DELETE_MAX + 1]
+                )
+                ids = [r[0] for r in cur.fetchall()]
+                found = set(ids)
+            else:
+                found = set()
+                for chunk in chunked(ids, BULK_DELETE_CHUNK):
+                    placeholders = ",".join(["%s"] * len(chunk))
+                    cur.execute(f"SELECT id FROM entries WHERE id IN ({placeholders}) FOR UPDATE", chunk)
+                    found.update(r[0] for r in cur.fetchall())
+
+            if len(ids) > BULK_DELETE_MAX:
+                conn.rollback()
+                return jsonify({
+                    "success": False,
+                    "message": f"More than {BULK_DELETE_MAX} rows match; narrow the filter or send fewer ids"
+                }), 400
+
+            targets = [i for i in ids if i in found]
+            for chunk in chunked(targets, BULK_DELETE_CHUNK):
+                placeholders = ",".join(["%s"] * len(chunk))
+                if archive:
+                    cur.execute(f"INSERT INTO entries_archive SELECT * FROM entries WHERE id IN ({placeholders})", chunk)
+                apply_entry_totals(cur, chunk, -1)
+                release_stock_for(cur, chunk)
+                cur.execute(f"DELETE FROM entries WHERE id IN ({placeholders})", chunk)
+            record_changes(cur, "entries", targets, "delete")
+            conn.commit()
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return jsonify({"success": False, "message": f"Database error: {err}"}), 500
+
+    done = "archived" if archive else "deleted"
+    results = {str(i): (done if i in found else "not_found") for i in ids}
+    return jsonify({"success": True, "deleted": len(targets), "results": results})
 
 # --- SCHOOL DATA (ADMIN) ---
+# school_data has one row per (school_name, location): uq_school_location
+DUPLICATE_SCHOOL_MESSAGE = "This school already has an entry for that location"
+
+
 @app.route("/admin/entries", methods=["GET"])
 def get_entries():
     # ... (code is correct, just needs connection pool integration)
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    # The rest of the original logic is fine
-    cur.execute("SELECT id, school_name, location, reporting_branch, num_students FROM school_data ORDER BY school_name")
-    entries = cur.fetchall()
-    cur.close()
-    conn.close()
-    return jsonify(entries)
+    with db_cursor(read=True) as (conn, cur):
+        # The rest of the original logic is fine
+        cur.execute("SELECT id, school_name, location, reporting_branch, num_students, version FROM school_data ORDER BY school_name")
+        columns, rows = fetch_table(cur)
+    return jsonify(table_body(columns, rows))
 
 @app.route("/admin/entries", methods=["POST"])
 def add_entry():
     # ... (code is correct, just needs connection pool integration)
     data = request.json or {}
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            INSERT INTO school_data (school_name, location, reporting_branch, num_students)
-            VALUES (%s, %s, %s, %s)
-        """, (data.get("school_name"), data.get("location"), data.get("reporting_branch"), data.get("num_students")))
+    with db_cursor() as (conn, cur):
+        try:
+            cur.execute("""
+                INSERT INTO school_data (school_name, location, reporting_branch, num_students)
+                VALUES (%s, %s, %s, %s)
+            """, (data.get("school_name"), data.get("location"), data.get("reporting_branch"), data.get("num_students")))
+        except mysql.connector.IntegrityError:
+            return jsonify({"success": False, "message": DUPLICATE_SCHOOL_MESSAGE}), 400
+        new_id = cur.lastrowid
+        refresh_branches(cur, [(data.get("school_name"), data.get("location"))])
+        record_changes(cur, "school_data", [new_id])
         conn.commit()
-        return jsonify({"success": True, "id": cur.lastrowid})
-    finally:
-        cur.close()
-        conn.close()
+        lookup_cache.invalidate()
+        refresh_school_rows(cur, [new_id])
+        return jsonify({"success": True, "id": new_id, "version": 1})
 
 @app.route("/admin/update/<int:row_id>", methods=["PUT"])
 def update_entry(row_id):
     # ... (code is correct, just needs connection pool integration)
     data = request.json or {}
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            UPDATE school_data
-            SET school_name=%s, location=%s, reporting_branch=%s, num_students=%s
-            WHERE id=%s
-        """, (data.get("school_name"), data.get("location"), data.get("reporting_branch"), data.get("num_students"), row_id))
+    with db_cursor() as (conn, cur):
+        cur.execute("SELECT school_name, location FROM school_data WHERE id = %s FOR UPDATE", (row_id,))
+        old = cur.fetchall()
+        try:
+            cur.execute("""
+                UPDATE school_data
+                SET school_name=%s, location=%s, reporting_branch=%s, num_students=%s, version = version + 1
+                WHERE id=%s
+            """, (data.get("school_name"), data.get("location"), data.get("reporting_branch"), data.get("num_students"), row_id))
+        except mysql.connector.IntegrityError:
+            return jsonify({"success": False, "message": DUPLICATE_SCHOOL_MESSAGE}), 400
+        refresh_branches(cur, old + [(data.get("school_name"), data.get("location"))])
+        record_changes(cur, "school_data", [row_id])
         conn.commit()
+        lookup_cache.invalidate()
+        refresh_school_rows(cur, [row_id])
         return jsonify({"success": True, "message": f"Row {row_id} updated"})
-    finally:
-        cur.close()
-        conn.close()
 
 @app.route("/admin/delete/<int:entry_id>", methods=["DELETE"])
 def delete_entry(entry_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
+    with db_cursor() as (conn, cur):
+        cur.execute("SELECT school_name, location FROM school_data WHERE id = %s FOR UPDATE", (entry_id,))
+        old = cur.fetchall()
         cur.execute("DELETE FROM school_data WHERE id = %s", (entry_id,))
+        deleted = cur.rowcount
+        refresh_branches(cur, old)
+        record_changes(cur, "school_data", [entry_id], "delete")
         conn.commit()
-        if cur.rowcount > 0:
+        lookup_cache.invalidate()
+        school_index.remove(entry_id)
+        if deleted > 0:
             return jsonify({"success": True})
         else:
             return jsonify({"success": False, "message": "School not found"})
+
+
+# --- SCHOOL ROSTER IMPORT (ADMIN) ---
+# Uploads run import_excel.import_file in a background thread; poll the job for progress.
+IMPORT_JOBS_KEPT = 50
+import_jobs = {}
+import_jobs_lock = threading.Lock()
+
+
+def run_import_job(job, path, chunk_size):
+    job["status"] = "running"
+    try:
+        with db_pool.connection() as conn:
+            job["stats"] = import_file(conn, path, chunk_size=chunk_size,
+                                       progress=lambda stats: job.update(stats=stats))
+        job["status"] = "done"
+        lookup_cache.invalidate()
+        # The upsert doesn't report which rows it touched: open dashboards reload the table
+        with db_cursor() as (conn, cur):
+            record_changes(cur, "school_data", [None], "reset")
+            conn.commit()
+        print(f"School import {job['id']} done: {job['stats']}")
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+        print(f"School import {job['id']} failed: {e}")
     finally:
-        cur.close()
-        conn.close()
+        job["finished_at"] = datetime.utcnow().isoformat()
+        os.remove(path)
+
+
+@app.route("/admin/import/schools", methods=["POST"])
+def upload_school_import():
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"success": False, "message": "Upload a .xlsx or .csv file as 'file'"}), 400
+    ext = os.path.splitext(upload.filename)[1].lower()
+    if ext not in (".xlsx", ".csv"):
+        return jsonify({"success": False, "message": "Only .xlsx and .csv files are supported"}), 400
+    chunk_size = request.form.get("chunk_size", type=int) or DEFAULT_CHUNK_SIZE
+
+    job_id = secrets.token_hex(8)
+    path = os.path.join(tempfile.gettempdir(), f"school_import_{job_id}{ext}")
+    upload.save(path)
+
+    job = {
+        "id": job_id, "file": upload.filename, "status": "queued", "stats": None,
+        "error": None, "started_at": datetime.utcnow().isoformat(), "finished_at": None,
+    }
+    with import_jobs_lock:
+        import_jobs[job_id] = job
+        while len(import_jobs) > IMPORT_JOBS_KEPT:
+            import_jobs.pop(next(iter(import_jobs)))
+    threading.Thread(target=run_import_job, args=(job, path, chunk_size), daemon=True).start()
+    return jsonify({"success": True, "job_id": job_id}), 202
+
+
+@app.route("/admin/import/jobs/<job_id>", methods=["GET"])
+def get_import_job(job_id):
+    job = import_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify({"success": True, **job})
 
 
 # --- WORKBOOKS (ADMIN) ---
+# quantity is the live on-hand count from the stock ledger when the workbook is tracked
+WORKBOOKS_SELECT = """
+    SELECT w.id, w.grade, w.workbook_name, COALESCE(b.on_hand, w.quantity) AS quantity,
+           COALESCE(b.reserved, 0) AS reserved,
+           COALESCE(b.on_hand, w.quantity) - COALESCE(b.reserved, 0) AS available, w.version
+    FROM workbook_status w
+    LEFT JOIN stock_balances b ON b.grade = w.grade AND b.workbook_name = w.workbook_name
+"""
+
+
 @app.route("/admin/workbooks", methods=["GET"])
 def get_workbooks():
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT id, grade, workbook_name, quantity FROM workbook_status")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return jsonify(rows)
+    with db_cursor(read=True) as (conn, cur):
+        cur.execute(WORKBOOKS_SELECT)
+        columns, rows = fetch_table(cur)
+    return jsonify(table_body(columns, rows))
 
 @app.route("/admin/workbooks", methods=["POST"])
 def add_workbook():
@@ -412,93 +1170,634 @@ def add_workbook():
     workbook_name = data.get("workbook_name")
     quantity = data.get("quantity")
 
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
+    with db_cursor() as (conn, cur):
         cur.execute(
             "INSERT INTO workbook_status (grade, workbook_name, quantity) VALUES (%s, %s, %s)",
             (grade, workbook_name, quantity)
         )
+        new_id = cur.lastrowid
+        ensure_stock_balance(cur, grade, workbook_name)
+        record_stock_movements(cur, [(grade, workbook_name, "restock", to_int(quantity), 0, None)])
+        record_changes(cur, "workbook_status", [new_id])
+        # The restock may have bumped it past 1
+        cur.execute("SELECT version FROM workbook_status WHERE id = %s", (new_id,))
+        version = cur.fetchone()[0]
         conn.commit()
-        return jsonify({"success": True, "id": cur.lastrowid})
-    finally:
-        cur.close()
-        conn.close()
+        lookup_cache.invalidate()
+        return jsonify({"success": True, "id": new_id, "version": version})
 
 @app.route("/admin/workbooks/<int:w_id>", methods=["PUT"])
 def update_workbook(w_id):
-    data = request.json
-    qty = data.get("quantity")
-    conn = get_conn()
-    cur = conn.cursor()
+    data = request.json or {}
+    # A missing or bad quantity must not be read as 0: that would write off the whole stock
     try:
+        qty = whole_quantity(data.get("quantity"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    with db_cursor() as (conn, cur):
+        cur.execute("SELECT grade, workbook_name FROM workbook_status WHERE id = %s", (w_id,))
+        row = cur.fetchone()
         cur.execute(
-            "UPDATE workbook_status SET quantity = %s WHERE id = %s", (qty, w_id)
+            "UPDATE workbook_status SET quantity = %s, version = version + 1 WHERE id = %s", (qty, w_id)
         )
+        if row:
+            # The admin typed a physical count: record the difference as an adjustment
+            grade, workbook_name = row
+            ensure_stock_balance(cur, grade, workbook_name)
+            on_hand = lock_stock(cur, [(grade, workbook_name)])[(str(grade), str(workbook_name))][0]
+            if qty != on_hand:
+                record_stock_movements(cur, [(grade, workbook_name, "adjust", qty - on_hand, 0, None)])
+        record_changes(cur, "workbook_status", [w_id])
         conn.commit()
+        # quantity is not part of any dropdown lookup, so lookup_cache stays valid
         return jsonify({"success": True, "id": w_id, "quantity": qty})
-    finally:
-        cur.close()
-        conn.close()
 
 @app.route("/admin/workbooks/<int:w_id>", methods=["DELETE"])
 def delete_workbook(w_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
+    with db_cursor() as (conn, cur):
+        cur.execute("SELECT grade, workbook_name FROM workbook_status WHERE id = %s", (w_id,))
+        row = cur.fetchone()
         cur.execute("DELETE FROM workbook_status WHERE id = %s", (w_id,))
+        if row:
+            # Stop tracking stock once no workbook_status row refers to it (the ledger is kept)
+            cur.execute("SELECT 1 FROM workbook_status WHERE grade = %s AND workbook_name = %s LIMIT 1", row)
+            if not cur.fetchone():
+                cur.execute("DELETE FROM stock_balances WHERE grade = %s AND workbook_name = %s", row)
+        record_changes(cur, "workbook_status", [w_id], "delete")
         conn.commit()
+        lookup_cache.invalidate()
         return jsonify({"success": True, "id": w_id, "message": "Workbook deleted"})
-    finally:
-        cur.close()
-        conn.close()
+
+
+# --- INVENTORY LEDGER ---
+# stock_movements is an append-only log of every stock change per
+# (grade, workbook_name); stock_balances caches its running totals:
+#   on_hand  - physical copies (restock/adjust add, delivery removes)
+#   reserved - copies promised to undelivered submissions
+# A submission reserves, a delivery deducts from both, deleting an undelivered
+# submission releases. Balance rows are locked FOR UPDATE before every change,
+# so two submitters can't both take the last copies. Only workbooks with a
+# stock_balances row are tracked; `flask --app backend rebuild-stock` seeds
+# missing ones from workbook_status and recomputes balances from the ledger.
+STOCK_ENFORCE = os.environ.get("STOCK_ENFORCE", "1") == "1"
+LOW_STOCK_THRESHOLD = int(os.environ.get("LOW_STOCK_THRESHOLD", "10"))
+
+
+def to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+# The SQL of the stock helpers is built by *_sql functions so the async entry
+# point (asgi.py) runs exactly the same statements.
+STOCK_MOVEMENT_INSERT = """
+    INSERT INTO stock_movements (grade, workbook_name, kind, on_hand_delta, reserved_delta, entry_id, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+STOCK_BALANCE_UPDATE = """
+    UPDATE stock_balances SET on_hand = on_hand + %s, reserved = reserved + %s, updated_at = %s
+    WHERE grade = %s AND workbook_name = %s
+"""
+
+
+def lock_stock_sql(keys):
+    """(sql, params) locking the balance rows of (grade, workbook_name) keys, or None for no keys."""
+    keys = sorted({(str(g), str(w)) for g, w in keys})
+    if not keys:
+        return None
+    placeholders = ",".join(["(%s, %s)"] * len(keys))
+    return (
+        f"SELECT grade, workbook_name, on_hand, reserved FROM stock_balances "
+        f"WHERE (grade, workbook_name) IN ({placeholders}) FOR UPDATE",
+        [v for key in keys for v in key]
+    )
+
+
+def stock_balances_from(rows):
+    return {(str(r[0]), str(r[1])): [int(r[2]), int(r[3])] for r in rows}
+
+
+def lock_stock(cur, keys):
+    """Locks the balance rows for (grade, workbook_name) keys; returns {key: [on_hand, reserved]} for tracked keys."""
+    query = lock_stock_sql(keys)
+    if not query:
+        return {}
+    cur.execute(*query)
+    return stock_balances_from(cur.fetchall())
+
+
+def stock_movement_rows(movements, balances):
+    """
+    (ledger rows, balance update rows, touched keys) for the movements of
+    tracked workbooks; the update rows go with STOCK_BALANCE_UPDATE.
+    """
+    tracked = [m for m in movements if (str(m[0]), str(m[1])) in balances]
+    now = datetime.utcnow().replace(microsecond=0)
+    totals = {}
+    for grade, name, _, on_hand, reserved, _ in tracked:
+        t = totals.setdefault((str(grade), str(name)), [0, 0])
+        t[0] += on_hand
+        t[1] += reserved
+    return (
+        [(str(m[0]), str(m[1]), m[2], m[3], m[4], m[5], now) for m in tracked],
+        [(oh, rs, now, g, n) for (g, n), (oh, rs) in totals.items() if oh or rs],
+        list(totals),
+    )
+
+
+def record_stock_movements(cur, movements):
+    """
+    Appends movements (grade, workbook_name, kind, on_hand_delta, reserved_delta, entry_id)
+    to the ledger and applies them to stock_balances. Untracked workbooks are ignored.
+    """
+    balances = lock_stock(cur, [(m[0], m[1]) for m in movements])
+    ledger, updates, keys = stock_movement_rows(movements, balances)
+    if not ledger:
+        return
+    cur.executemany(STOCK_MOVEMENT_INSERT, ledger)
+    cur.executemany(STOCK_BALANCE_UPDATE, updates)
+    # An on-hand change makes an admin's copy of the quantity stale, so it
+    # bumps the row version; reservations (every submit) don't
+    bump_workbook_versions(cur, [(u[3], u[4]) for u in updates if u[0]])
+    # /admin/workbooks shows the balances, so their rows count as changed
+    record_workbook_changes(cur, keys)
+
+
+def bump_workbook_versions(cur, keys):
+    keys = sorted({(str(g), str(w)) for g, w in keys})
+    if keys:
+        placeholders = ",".join(["(%s, %s)"] * len(keys))
+        cur.execute(f"UPDATE workbook_status SET version = version + 1 WHERE (grade, workbook_name) IN ({placeholders})",
+                    [v for key in keys for v in key])
+
+
+def entry_stock_rows(cur, ids):
+    """(id, grade, workbook, count, delivered) for the given entries ids."""
+    rows = []
+    for chunk in chunked(list(ids), BULK_DELETE_CHUNK):
+        placeholders = ",".join(["%s"] * len(chunk))
+        cur.execute(f"SELECT id, grade, workbook, count, delivered FROM entries WHERE id IN ({placeholders})", chunk)
+        rows.extend(cur.fetchall())
+    return rows
+
+
+def release_stock_for(cur, ids):
+    """Releases the reservations of undelivered entries that are about to be deleted."""
+    record_stock_movements(cur, [
+        (grade, workbook, "release", 0, -to_int(count), entry_id)
+        for entry_id, grade, workbook, count, delivered in entry_stock_rows(cur, ids)
+        if delivered != "Yes"
+    ])
+
+
+def ensure_stock_balance(cur, grade, workbook_name):
+    """
+    Starts tracking a workbook's stock. Entries submitted while it was untracked
+    and not delivered yet are reserved by an opening movement, as in
+    rebuild_stock(), so delivering or deleting them can't take reserved below 0.
+    """
+    cur.execute(
+        "INSERT IGNORE INTO stock_balances (grade, workbook_name, on_hand, reserved, updated_at) VALUES (%s, %s, 0, 0, %s)",
+        (str(grade), str(workbook_name), datetime.utcnow().replace(microsecond=0))
+    )
+    if not cur.rowcount:
+        return
+    cur.execute(
+        "SELECT COALESCE(SUM(count), 0) FROM entries WHERE grade = %s AND workbook = %s AND delivered <> 'Yes'",
+        (str(grade), str(workbook_name))
+    )
+    reserved = int(cur.fetchone()[0])
+    if reserved:
+        record_stock_movements(cur, [(grade, workbook_name, "opening", 0, reserved, None)])
+
+
+def rebuild_stock():
+    """Seeds untracked workbooks with an opening movement, then recomputes balances from the ledger."""
+    now = datetime.utcnow().replace(microsecond=0)
+    with db_cursor() as (conn, cur):
+        cur.execute("""
+            INSERT INTO stock_movements (grade, workbook_name, kind, on_hand_delta, reserved_delta, entry_id, created_at)
+            SELECT w.grade, w.workbook_name, 'opening', SUM(w.quantity),
+                   COALESCE((SELECT SUM(e.count) FROM entries e
+                             WHERE e.grade = w.grade AND e.workbook = w.workbook_name AND e.delivered <> 'Yes'), 0),
+                   NULL, %s
+            FROM workbook_status w
+            WHERE NOT EXISTS (SELECT 1 FROM stock_balances b
+                              WHERE b.grade = w.grade AND b.workbook_name = w.workbook_name)
+            GROUP BY w.grade, w.workbook_name
+        """, (now,))
+        seeded = cur.rowcount
+        cur.execute("DELETE FROM stock_balances")
+        cur.execute("""
+            INSERT INTO stock_balances (grade, workbook_name, on_hand, reserved, updated_at)
+            SELECT grade, workbook_name, SUM(on_hand_delta), SUM(reserved_delta), %s
+            FROM stock_movements
+            GROUP BY grade, workbook_name
+        """, (now,))
+        balances = cur.rowcount
+        record_changes(cur, "workbook_status", [None], "reset")
+        conn.commit()
+    return seeded, balances
+
+
+@app.cli.command("rebuild-stock")
+def rebuild_stock_command():
+    """Seed stock for untracked workbooks and recompute stock_balances from stock_movements."""
+    seeded, balances = rebuild_stock()
+    print(f"Seeded {seeded} workbook(s); {balances} stock balance(s) rebuilt from the ledger.")
+
+
+@app.route("/admin/stock", methods=["GET"])
+def get_stock():
+    """Current balances; ?low=1 (optionally &threshold=N) returns only items at or below the threshold."""
+    clauses, params = [], []
+    if request.args.get("low"):
+        clauses.append("on_hand - reserved <= %s")
+        params.append(request.args.get("threshold", LOW_STOCK_THRESHOLD, type=int))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    with db_cursor(dictionary=True, read=True) as (conn, cur):
+        cur.execute(f"""
+            SELECT grade, workbook_name, on_hand, reserved, on_hand - reserved AS available, updated_at
+            FROM stock_balances
+            {where}
+            ORDER BY available, grade, workbook_name
+        """, params)
+        rows = cur.fetchall()
+    return jsonify(rows)
+
+
+@app.route("/admin/stock/movements", methods=["GET"])
+def get_stock_movements():
+    """Ledger history for one workbook: ?grade=&workbook_name= (latest first, ?limit= default 100)."""
+    limit = max(1, min(request.args.get("limit", 100, type=int), 1000))
+    with db_cursor(dictionary=True, read=True) as (conn, cur):
+        cur.execute("""
+            SELECT id, grade, workbook_name, kind, on_hand_delta, reserved_delta, entry_id, created_at
+            FROM stock_movements
+            WHERE grade = %s AND workbook_name = %s
+            ORDER BY id DESC
+            LIMIT %s
+        """, (request.args.get("grade", ""), request.args.get("workbook_name", ""), limit))
+        rows = cur.fetchall()
+    return jsonify(rows)
+
+
+# --- BULK EDITS (ADMIN, see bulkedit.py) ---
+# PATCH /admin/entries and PATCH /admin/workbooks apply many partial row edits
+# in one transaction, each checked against the version the admin loaded (the
+# GET routes return it); stale edits come back as conflicts with the current row.
+BULK_EDIT_FIELDS = {
+    "school_data": ("school_name", "location", "reporting_branch", "num_students"),
+    # Renaming a workbook would orphan its stock ledger, so only the count is editable here
+    "workbook_status": ("quantity",),
+}
+
+
+def whole_quantity(value):
+    quantity = to_int(value, -1)
+    if quantity < 0:
+        raise ValueError("quantity must be a whole number >= 0")
+    return quantity
+
+
+def run_bulk_edit(table, coerce=None, lock_columns=(), before_commit=None, after_commit=None):
+    """
+    Shared body of the bulk PATCH routes. before_commit(cur, edits, updated ids, previous)
+    runs in the transaction, after_commit(cur, updated ids) once it is committed.
+    """
+    data = request.json or {}
+    try:
+        edits = bulkedit.parse_edits(data, BULK_EDIT_FIELDS[table], coerce)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    def in_transaction(cur, edits, updated, previous):
+        if before_commit:
+            before_commit(cur, edits, updated, previous)
+        record_changes(cur, table, updated)
+
+    with db_cursor() as (conn, cur):
+        try:
+            status, body, updated = bulkedit.run(
+                conn, cur, table, edits, load_change_rows, mysql.connector.IntegrityError,
+                atomic=bool(data.get("atomic")), lock_columns=lock_columns, before_commit=in_transaction,
+            )
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return jsonify({"success": False, "message": f"Database error: {err}"}), 500
+        if updated and after_commit:
+            after_commit(cur, updated)
+        return jsonify(body), status
+
+
+def refresh_edited_branches(cur, edits, updated, previous):
+    """Summary groups of every school + location an edit moved away from or onto."""
+    changes = {row_id: changes for row_id, _, changes in edits}
+    keys = []
+    for row_id in updated:
+        old = previous[row_id]
+        keys.append((old["school_name"], old["location"]))
+        keys.append((changes[row_id].get("school_name", old["school_name"]),
+                     changes[row_id].get("location", old["location"])))
+    refresh_branches(cur, keys)
+
+
+def refresh_school_lookups(cur, ids):
+    lookup_cache.invalidate()
+    refresh_school_rows(cur, ids)
+
+
+def adjust_edited_stock(cur, edits, updated, previous):
+    """Records each new workbook quantity as a stock adjustment, like PUT /admin/workbooks/<id>."""
+    quantities = {row_id: changes["quantity"] for row_id, _, changes in edits}
+    keys = [(previous[row_id]["grade"], previous[row_id]["workbook_name"]) for row_id in updated]
+    for grade, workbook_name in keys:
+        ensure_stock_balance(cur, grade, workbook_name)
+    balances = lock_stock(cur, keys)
+    movements = []
+    for row_id, (grade, workbook_name) in zip(updated, keys):
+        balance = balances[(str(grade), str(workbook_name))]
+        delta = quantities[row_id] - balance[0]
+        if delta:
+            movements.append((grade, workbook_name, "adjust", delta, 0, None))
+            balance[0] += delta  # two rows for the same workbook: the last count wins
+    record_stock_movements(cur, movements)
+
+
+@app.route("/admin/entries", methods=["PATCH"])
+def bulk_update_entries():
+    """Bulk edit of school_data rows (school_name, location, reporting_branch, num_students)."""
+    return run_bulk_edit("school_data", lock_columns=("school_name", "location"),
+                         before_commit=refresh_edited_branches, after_commit=refresh_school_lookups)
+
+
+@app.route("/admin/workbooks", methods=["PATCH"])
+def bulk_update_workbooks():
+    """Bulk edit of workbook quantities (physical counts); differences go to the ledger as adjustments."""
+    # quantity is not part of any dropdown lookup, so lookup_cache stays valid
+    return run_bulk_edit("workbook_status", coerce={"quantity": whole_quantity},
+                         lock_columns=("grade", "workbook_name"), before_commit=adjust_edited_stock)
+
+
+# --- CHANGE FEED (see changefeed.py) ---
+# Every route that creates, updates or deletes a row also logs (table, row id,
+# op) into change_log in the same transaction (record_changes), so an open
+# dashboard can fetch only what changed instead of reloading whole tables:
+#   GET /admin/changes?tables=entries,users            -> {"version": ...}
+#   GET /admin/changes?since=<version>&tables=...      -> {"version", "more", "reset",
+#       "changes": {table: {"upserts": [rows], "deletes": [ids]}}}
+# Get a version first, load the table, then poll with since=<last version>.
+# A version is an opaque (changed_at, id) keyset cursor like the submissions
+# one. Changes newer than CHANGE_FEED_SETTLE seconds are held back, so a
+# transaction that logged its change just before a slow commit isn't skipped;
+# a change can therefore come twice, apply upserts/deletes idempotently.
+# Tables listed in "reset" must be reloaded: since is older than the kept log
+# (CHANGE_LOG_RETENTION_HOURS, pruned by the purge-change-log job), or a bulk
+# job (roster import, rebuild-stock) rewrote the table.
+#
+# GET /admin/changes/stream?tables=entries pushes the same payloads as
+# Server-Sent Events (event "changes", id = version, so EventSource resumes with
+# Last-Event-ID). One poller thread per worker watches change_log and wakes the
+# streams (changefeed.ChangeNotifier). Each open stream holds a worker thread,
+# so serve it from threaded workers (gunicorn --worker-class gthread --threads N);
+# at most CHANGE_STREAM_MAX per worker, and every stream ends after
+# CHANGE_STREAM_MAX_SECONDS (EventSource reconnects on its own).
+CHANGE_FEED_SETTLE = float(os.environ.get("CHANGE_FEED_SETTLE", 3))
+CHANGE_FEED_LIMIT = int(os.environ.get("CHANGE_FEED_LIMIT", 1000))
+CHANGE_LOG_RETENTION_HOURS = int(os.environ.get("CHANGE_LOG_RETENTION_HOURS", 48))
+CHANGE_STREAM_MAX = int(os.environ.get("CHANGE_STREAM_MAX", 20))
+CHANGE_STREAM_MAX_SECONDS = float(os.environ.get("CHANGE_STREAM_MAX_SECONDS", 300))
+CHANGE_STREAM_HEARTBEAT = float(os.environ.get("CHANGE_STREAM_HEARTBEAT", 15))
+
+# How the feed reads the current state of changed rows, per table
+CHANGE_TABLES = {
+    "entries": f"SELECT {SUBMISSION_COLUMNS} FROM entries WHERE id IN ({{}})",
+    "school_data":
+        "SELECT id, school_name, location, reporting_branch, num_students, version FROM school_data WHERE id IN ({})",
+    "users": "SELECT id, name, email, role FROM users WHERE id IN ({})",
+    "workbook_status": WORKBOOKS_SELECT + " WHERE w.id IN ({})",
+}
+
+
+def change_log_sql(table, ids, op):
+    # NOW(6) from the database, the same clock the feed compares against
+    return (
+        "INSERT INTO change_log (table_name, row_id, op, changed_at) VALUES "
+        + ",".join(["(%s, %s, %s, NOW(6))"] * len(ids)),
+        [v for row_id in ids for v in (table, row_id, op)]
+    )
+
+
+def workbook_changes_sql(keys):
+    keys = sorted({(str(g), str(w)) for g, w in keys})
+    if not keys:
+        return None
+    placeholders = ",".join(["(%s, %s)"] * len(keys))
+    return f"""
+        INSERT INTO change_log (table_name, row_id, op, changed_at)
+        SELECT 'workbook_status', id, 'upsert', NOW(6) FROM workbook_status
+        WHERE (grade, workbook_name) IN ({placeholders})
+    """, [v for key in keys for v in key]
+
+
+def record_changes(cur, table, ids, op="upsert"):
+    """Logs rows of table as changed (op upsert/delete, or reset with ids [None]); call just before commit."""
+    for chunk in chunked(list(ids), BULK_DELETE_CHUNK):
+        cur.execute(*change_log_sql(table, chunk, op))
+
+
+def record_workbook_changes(cur, keys):
+    """Logs the workbook_status rows of (grade, workbook_name) keys as changed."""
+    query = workbook_changes_sql(keys)
+    if query:
+        cur.execute(*query)
+
+
+def parse_change_tables(value, default=None):
+    """Table names from ?tables=a,b (all feed tables by default); raises ValueError for unknown ones."""
+    tables = [t.strip() for t in (value or "").split(",") if t.strip()] or list(default or CHANGE_TABLES)
+    unknown = [t for t in tables if t not in CHANGE_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(unknown)}")
+    return list(dict.fromkeys(tables))
+
+
+def parse_version(version):
+    """(changed_at, id) from a version string, or None if it is malformed."""
+    position = decode_cursor(version)
+    if not position:
+        return None
+    try:
+        return datetime.fromisoformat(position[0]), position[1]
+    except ValueError:
+        return None
+
+
+def read_changes(since, tables):
+    """Feed payload for tables after since ((changed_at, id) or None = just the current version)."""
+    with db_cursor() as (conn, cur):
+        return changefeed.read_changes(cur, since, tables, load_change_rows, settle=CHANGE_FEED_SETTLE,
+                                       retention_hours=CHANGE_LOG_RETENTION_HOURS, limit=CHANGE_FEED_LIMIT)
+
+
+def load_change_rows(cur, table, ids):
+    """Current rows (as the admin GET routes return them) of table for ids; missing ids are skipped."""
+    rows = []
+    for chunk in chunked(list(ids), BULK_DELETE_CHUNK):
+        cur.execute(CHANGE_TABLES[table].format(",".join(["%s"] * len(chunk))), chunk)
+        columns, chunk_rows = fetch_table(cur)
+        rows.extend(dict(zip(columns, row)) for row in chunk_rows)
+    return rows
+
+
+@app.route("/admin/changes", methods=["GET"])
+def get_changes():
+    try:
+        tables = parse_change_tables(request.args.get("tables"))
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    since = None
+    if request.args.get("since"):
+        since = parse_version(request.args["since"])
+        if not since:
+            return jsonify({"success": False, "message": "Invalid since version"}), 400
+    return jsonify(read_changes(since, tables))
+
+
+def load_change_marker():
+    with db_cursor() as (conn, cur):
+        cur.execute("SELECT MAX(changed_at) FROM change_log WHERE changed_at <= NOW(6) - INTERVAL %s MICROSECOND",
+                    (int(CHANGE_FEED_SETTLE * 1_000_000),))
+        latest = cur.fetchone()[0]
+    return str(latest or "")
+
+
+change_notifier = ChangeNotifier(load_change_marker, float(os.environ.get("CHANGE_STREAM_POLL", 1)))
+change_streams = threading.BoundedSemaphore(CHANGE_STREAM_MAX)
+
+
+@app.route("/admin/changes/stream", methods=["GET"])
+def stream_changes():
+    """Server-Sent Events of the change feed (?tables=, default entries; resumes from Last-Event-ID or ?since=)."""
+    try:
+        tables = parse_change_tables(request.args.get("tables"), default=["entries"])
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    version = request.headers.get("Last-Event-ID") or request.args.get("since")
+    since = parse_version(version) if version else None
+    if version and not since:
+        return jsonify({"success": False, "message": "Invalid since version"}), 400
+    if not change_streams.acquire(blocking=False):
+        return jsonify({"success": False, "message": "Too many open change streams"}), 503
+
+    def events():
+        try:
+            position = since
+            if position is None:
+                first = read_changes(None, tables)
+                position = parse_version(first["version"])
+                yield f"id: {first['version']}\nevent: version\ndata: {app.json.dumps(first)}\n\n"
+            deadline = time.monotonic() + CHANGE_STREAM_MAX_SECONDS
+            seen = None
+            while time.monotonic() < deadline:
+                marker = change_notifier.wait(seen, min(CHANGE_STREAM_HEARTBEAT, deadline - time.monotonic()))
+                if marker == seen:
+                    yield ": keep-alive\n\n"
+                    continue
+                seen = marker
+                more = True
+                while more:
+                    body = read_changes(position, tables)
+                    position = parse_version(body["version"])
+                    more = body["more"]
+                    if body["changes"] or body["reset"]:
+                        yield f"id: {body['version']}\nevent: changes\ndata: {app.json.dumps(body)}\n\n"
+        finally:
+            change_streams.release()
+
+    response = app.response_class(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx/Render proxies: don't buffer the stream
+    return response
+
+
+@app.route("/admin/changes/stats", methods=["GET"])
+def change_feed_stats():
+    return jsonify({**change_notifier.stats(), "max_streams": CHANGE_STREAM_MAX})
 
 
 # --- USER-FACING FORM APIS ---
+# Reference data for the form dropdowns only changes through the admin
+# school/workbook routes, so it is served from lookup_cache and those routes
+# call lookup_cache.invalidate().
+lookup_cache = LookupCache(
+    ttl=int(os.environ.get("LOOKUP_CACHE_TTL", "300")),
+    maxsize=int(os.environ.get("LOOKUP_CACHE_SIZE", "1024")),
+)
+LOOKUP_CACHE_CONTROL = os.environ.get("LOOKUP_CACHE_CONTROL", "no-cache")
+
+
+# Shared with the async entry point (asgi.py)
+LOOKUP_SQL = {
+    "schools": "SELECT DISTINCT school_name FROM school_data ORDER BY school_name",
+    "locations": "SELECT DISTINCT location FROM school_data WHERE school_name=%s ORDER BY location",
+    "reporting_branch": "SELECT reporting_branch FROM school_data WHERE school_name=%s AND location=%s ORDER BY id LIMIT 1",
+    "grades": "SELECT DISTINCT grade FROM workbook_status ORDER BY grade",
+    "workbook_name": "SELECT DISTINCT workbook_name FROM workbook_status WHERE grade=%s ORDER BY workbook_name",
+}
+
+
+def lookup_read():
+    """Lookups may use the read pool, except right after this worker invalidated them (a lagging replica would be cached)."""
+    return time.monotonic() - lookup_cache.invalidated_at > db_router.read_after_write
+
+
+def fetch_column(query, params=()):
+    """Runs a single-column query and returns the values as a list."""
+    with db_cursor(read=lookup_read()) as (conn, cur):
+        cur.execute(query, params)
+        return [r[0] for r in cur.fetchall()]
+
+
+def cached_lookup(key, loader):
+    """Serves a cached lookup with an ETag; answers 304 if the browser already has it."""
+    value, etag = lookup_cache.get_or_load(key, loader)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(value)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = LOOKUP_CACHE_CONTROL
+    return response
+
+
 @app.route("/schools", methods=["GET"])
 def get_schools():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT DISTINCT school_name FROM school_data ORDER BY school_name")
-    schools = [r[0] for r in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return jsonify(schools)
+    return cached_lookup(("schools",), lambda: fetch_column(LOOKUP_SQL["schools"]))
 
 @app.route("/locations", methods=["GET"])
 def get_locations():
     school = request.args.get("school", "")
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT DISTINCT location FROM school_data WHERE school_name=%s ORDER BY location", (school,))
-    locations = [r[0] for r in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return jsonify(locations)
+    return cached_lookup(("locations", school), lambda: fetch_column(LOOKUP_SQL["locations"], (school,)))
 
 @app.route("/reporting_branch", methods=["GET"])
 def get_reporting_branch():
     school = request.args.get("school", "")
     location = request.args.get("location", "")
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT reporting_branch FROM school_data WHERE school_name=%s AND location=%s LIMIT 1",
-                (school, location))
-    r = cur.fetchone()
-    conn.close()
-    return jsonify({"reporting_branch": r[0] if r else ""})
+
+    def load():
+        rows = fetch_column(LOOKUP_SQL["reporting_branch"], (school, location))
+        return {"reporting_branch": rows[0] if rows else ""}
+
+    return cached_lookup(("reporting_branch", school, location), load)
 
 
 
 @app.route("/grades", methods=["GET"])
 def get_grades():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT DISTINCT grade FROM workbook_status ORDER BY grade")
-    grades = [r[0] for r in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return jsonify(grades)
+    return cached_lookup(("grades",), lambda: fetch_column(LOOKUP_SQL["grades"]))
 
 
 
@@ -509,17 +1808,204 @@ def workbooks_by_grade():
     if not grade:
         return jsonify({"workbooks": []})
 
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT DISTINCT workbook_name FROM workbook_status WHERE grade=%s ORDER BY workbook_name",
-        (grade,)
-    )
-    rows = cur.fetchall()
-    conn.close()
+    return cached_lookup(("workbook_name", grade), lambda: {"workbooks": fetch_column(
+        LOOKUP_SQL["workbook_name"], (grade,)
+    )})
+
+
+# --- SCHOOL SEARCH (see schoolsearch.py) ---
+# GET /schools/search?q=xav&k=10 -> top-k school_data rows for a typeahead
+# (prefix matches first, then typo-tolerant trigram matches), answered from an
+# in-memory index instead of shipping every school to the browser.
+# GET /admin/schools/duplicates lists rows that look like the same school
+# spelled differently, for cleaning up the roster.
+# The index is built on first use. Edits in this worker update it right away;
+# edits handled by other workers (and roster imports) reach it through the
+# change feed, checked at most every SCHOOL_INDEX_SYNC seconds.
+SCHOOL_INDEX_SYNC = float(os.environ.get("SCHOOL_INDEX_SYNC", 5))
+SCHOOL_SEARCH_MAX_K = 50
+school_index = SchoolIndex()
+school_index_state = {"version": None, "synced_at": 0.0}
+school_index_lock = threading.Lock()
+
+
+def load_school_rows(cur, ids=None):
+    query = "SELECT id, school_name, location, reporting_branch FROM school_data"
+    if ids is None:
+        cur.execute(query)
+        return cur.fetchall()
+    rows = []
+    for chunk in chunked(list(ids), BULK_DELETE_CHUNK):
+        cur.execute(f"{query} WHERE id IN ({','.join(['%s'] * len(chunk))})", chunk)
+        rows.extend(cur.fetchall())
+    return rows
+
+
+def sync_school_index():
+    """Builds the index on first use, later applies school_data changes from the change feed."""
+    if school_index_state["version"] and time.monotonic() - school_index_state["synced_at"] < SCHOOL_INDEX_SYNC:
+        return
+    with school_index_lock:
+        if school_index_state["version"] and time.monotonic() - school_index_state["synced_at"] < SCHOOL_INDEX_SYNC:
+            return
+        version = school_index_state["version"]
+        while True:
+            if version is None:
+                # Version first, then the rows: anything in between is replayed later
+                version = read_changes(None, ["school_data"])["version"]
+                with db_cursor() as (conn, cur):
+                    school_index.rebuild(load_school_rows(cur))
+                break
+            body = read_changes(parse_version(version), ["school_data"])
+            if body["reset"]:
+                version = None
+                continue
+            changes = body["changes"].get("school_data", {})
+            for row in changes.get("upserts", []):
+                school_index.upsert(row["id"], row["school_name"], row["location"], row["reporting_branch"])
+            for row_id in changes.get("deletes", []):
+                school_index.remove(row_id)
+            version = body["version"]
+            if not body["more"]:
+                break
+        school_index_state.update(version=version, synced_at=time.monotonic())
+
+
+def refresh_school_rows(cur, ids):
+    """Applies this worker's own school_data edits (already committed) to the index without waiting for a sync."""
+    if school_index_state["version"] is None:
+        return  # not built yet; the first search loads everything
+    rows = {row[0]: row for row in load_school_rows(cur, ids)}
+    for row_id in ids:
+        if row_id in rows:
+            school_index.upsert(*rows[row_id])
+        else:
+            school_index.remove(row_id)
+
+
+@app.route("/schools/search", methods=["GET"])
+def search_schools():
+    k = max(1, min(request.args.get("k", 10, type=int), SCHOOL_SEARCH_MAX_K))
+    sync_school_index()
+    return jsonify(school_index.results(request.args.get("q", ""), k))
+
+
+@app.route("/admin/schools/duplicates", methods=["GET"])
+def school_duplicates():
+    """Groups of school_data rows that are probably the same school (?threshold=0.85)."""
+    threshold = min(max(request.args.get("threshold", 0.85, type=float), 0.5), 1.0)
+    sync_school_index()
+    groups = school_index.duplicates(threshold)
+    return jsonify({"groups": groups, "count": len(groups), "index": school_index.stats()})
+
+
+# --- FORM BOOTSTRAP ---
+# One request that carries everything the form's cascading dropdowns need:
+#   schools: [[school_name, [[location, reporting_branch], ...]], ...]
+#   grades:  [[grade, [workbook_name, ...]], ...]
+# Lists of pairs (not objects) keep the SQL ordering and the payload small.
+_bootstrap_bodies = {}  # (etag, encoding) -> compressed body for the current tree
+_bootstrap_lock = threading.Lock()
+
+
+FORM_TREE_SCHOOLS_SQL = """
+    SELECT school_name, location, reporting_branch
+    FROM school_data
+    ORDER BY school_name, location, id
+"""
+FORM_TREE_WORKBOOKS_SQL = """
+    SELECT DISTINCT grade, workbook_name
+    FROM workbook_status
+    ORDER BY grade, workbook_name
+"""
+
+
+def load_form_tree():
+    with db_cursor(read=lookup_read()) as (conn, cur):
+        cur.execute(FORM_TREE_SCHOOLS_SQL)
+        school_rows = cur.fetchall()
+        cur.execute(FORM_TREE_WORKBOOKS_SQL)
+        workbook_rows = cur.fetchall()
+    return form_tree(school_rows, workbook_rows)
+
+
+def form_tree(school_rows, workbook_rows):
+    schools = {}
+    for school_name, location, reporting_branch in school_rows:
+        locations = schools.setdefault(school_name, {})
+        # Same rule as /reporting_branch: first row for a school+location wins
+        locations.setdefault(location, reporting_branch or "")
+
+    grades = {}
+    for grade, workbook_name in workbook_rows:
+        grades.setdefault(grade, []).append(workbook_name)
+
+    return {
+        "schools": [[name, [[loc, branch] for loc, branch in locs.items()]] for name, locs in schools.items()],
+        "grades": [[grade, names] for grade, names in grades.items()],
+    }
+
+
+def negotiate_encoding(accept_encoding):
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def bootstrap_body(tree, etag, encoding):
+    """The (compressed) JSON body for tree, built once per etag and encoding."""
+    with _bootstrap_lock:
+        body = _bootstrap_bodies.get((etag, encoding))
+    if body is None:
+        # Compressed outside the lock; two threads may both build it, the result is the same
+        body = json.dumps({"hash": etag, **tree}, separators=(",", ":")).encode()
+        if encoding == "br":
+            body = brotli.compress(body)
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=6)
+        with _bootstrap_lock:
+            if any(key[0] != etag for key in _bootstrap_bodies):
+                _bootstrap_bodies.clear()
+            _bootstrap_bodies[(etag, encoding)] = body
+    return body
+
+
+@app.route("/form-bootstrap", methods=["GET"])
+def form_bootstrap():
+    tree, etag = lookup_cache.get_or_load(("form_tree",), load_form_tree)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+        response = app.response_class(bootstrap_body(tree, etag, encoding), mimetype="application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = LOOKUP_CACHE_CONTROL
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+ENTRY_INSERT = """
+    INSERT INTO entries
+    (school_name, location, grade, term, workbook, count, remark, submitted_by, submitted_at, delivered)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'No')
+"""
+
 
-    workbooks = [r[0] for r in rows]
-    return jsonify({"workbooks": workbooks})
+COUNT_MESSAGE = "count must be a positive number"
+
+
+def positive_count(value):
+    """value as an int if it is a whole number > 0, else None (a submission can't reserve 0 or fewer copies)."""
+    if isinstance(value, float):
+        # int(3.9) would reserve 3 while the INT column stores 4
+        value = int(value) if value.is_integer() else 0
+    count = to_int(value, 0)
+    return count if count > 0 else None
 
 
 @app.route("/submit", methods=["POST"])
@@ -527,55 +2013,383 @@ def submit_form():
     data = request.json or {}
     submitted_at = datetime.utcnow() + timedelta(hours=5, minutes=30)
 
-    conn = get_conn()
-    cur = conn.cursor()
-    try:
-        cur.execute("""
-            INSERT INTO entries
-            (school_name, location, grade, term, workbook, count, remark, submitted_by, submitted_at, delivered)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'No')
-        """, (data.get("school"), data.get("location"), data.get("grade"), data.get("term"), data.get("workbook"), data.get("count"), data.get("remark"), data.get("submitted_by"), submitted_at.isoformat()))
-        conn.commit()
+    count = positive_count(data.get("count"))
+    if count is None:
+        return jsonify({"success": False, "message": COUNT_MESSAGE}), 400
+    stock_key = (str(data.get("grade")), str(data.get("workbook")))
+
+    with db_cursor() as (conn, cur):
+        balance = lock_stock(cur, [stock_key]).get(stock_key)
+        if STOCK_ENFORCE and balance and balance[0] - balance[1] < count:
+            conn.rollback()
+            return jsonify({"success": False, "message": f"Only {max(balance[0] - balance[1], 0)} left in stock"}), 409
+
+        cur.execute(ENTRY_INSERT, (data.get("school"), data.get("location"), data.get("grade"), data.get("term"), data.get("workbook"), count, data.get("remark"), data.get("submitted_by"), submitted_at.isoformat()))
         new_id = cur.lastrowid
+        apply_entry_totals(cur, [new_id], +1)
+        record_stock_movements(cur, [(stock_key[0], stock_key[1], "reserve", 0, count, new_id)])
+        record_changes(cur, "entries", [new_id])
+        conn.commit()
         return jsonify({"success": True, "id": new_id, "message": "Form submitted successfully"})
-    finally:
-        cur.close()
-        conn.close()
+
+# --- BATCH SUBMISSIONS ---
+BATCH_MAX_ITEMS = 200
+BATCH_REQUIRED_FIELDS = ("school", "location", "grade", "term", "workbook", "count")
+
+
+def validate_batch_item(item):
+    """Returns an error message for a batch line item, or None if it is valid."""
+    if not isinstance(item, dict):
+        return "Item must be an object"
+    missing = [f for f in BATCH_REQUIRED_FIELDS if item.get(f) in (None, "")]
+    if missing:
+        return f"Missing fields: {', '.join(missing)}"
+    if positive_count(item["count"]) is None:
+        return COUNT_MESSAGE
+    return None
+
+
+@app.route("/submit/batch", methods=["POST"])
+def submit_batch():
+    """
+    Submits many line items (e.g. every grade/workbook for one school) at once.
+    Body: {"items": [{school, location, grade, term, workbook, count, remark}, ...],
+           "submitted_by": "...", "idempotency_key": "..."}
+    The key can also be sent as an Idempotency-Key header; retrying a batch with
+    the same key returns the original result instead of inserting again.
+    Valid items are inserted in one transaction; invalid items are reported in
+    results with their error.
+    """
+    data = request.json or {}
+    items = data.get("items")
+    idem_key = (request.headers.get("Idempotency-Key") or data.get("idempotency_key") or "").strip()
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "items must be a non-empty list"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"success": False, "message": f"At most {BATCH_MAX_ITEMS} items per batch"}), 400
+    if len(idem_key) > 128:
+        return jsonify({"success": False, "message": "Idempotency key too long"}), 400
+
+    submitted_at = (datetime.utcnow() + timedelta(hours=5, minutes=30)).isoformat()
+    results, rows, row_indexes = [], [], []
+    for index, item in enumerate(items):
+        error = validate_batch_item(item)
+        results.append({"index": index, "id": None, "error": error})
+        if error:
+            continue
+        row_indexes.append(index)
+        # The validated count goes into both the insert and the reservation
+        rows.append((
+            item.get("school"), item.get("location"), item.get("grade"), item.get("term"),
+            item.get("workbook"), positive_count(item["count"]), item.get("remark"),
+            item.get("submitted_by") or data.get("submitted_by"), submitted_at,
+        ))
+
+    if not rows:
+        return jsonify({"success": False, "inserted": 0, "failed": len(items), "results": results}), 400
+
+    with db_cursor() as (conn, cur):
+        try:
+            if idem_key:
+                try:
+                    cur.execute(
+                        "INSERT INTO idempotency_keys (idem_key, response, created_at) VALUES (%s, NULL, %s)",
+                        (idem_key, datetime.utcnow().replace(microsecond=0))
+                    )
+                except mysql.connector.IntegrityError:
+                    conn.rollback()
+                    cur.execute("SELECT response FROM idempotency_keys WHERE idem_key=%s", (idem_key,))
+                    row = cur.fetchone()
+                    if not row or row[0] is None:
+                        return jsonify({"success": False, "message": "This batch is still being processed"}), 409
+                    response = app.response_class(row[0], mimetype="application/json")
+                    response.headers["Idempotent-Replay"] = "true"
+                    return response
+
+            # Allocate stock in item order; items that no longer fit are reported, not inserted
+            balances = lock_stock(cur, [(row[2], row[4]) for row in rows])
+            if STOCK_ENFORCE:
+                kept_rows, kept_indexes = [], []
+                for row, index in zip(rows, row_indexes):
+                    balance = balances.get((str(row[2]), str(row[4])))
+                    if balance and balance[0] - balance[1] < row[5]:
+                        results[index]["error"] = f"Only {max(balance[0] - balance[1], 0)} left in stock"
+                        continue
+                    if balance:
+                        balance[1] += row[5]
+                    kept_rows.append(row)
+                    kept_indexes.append(index)
+                rows, row_indexes = kept_rows, kept_indexes
+            if not rows:
+                conn.rollback()
+                return jsonify({"success": False, "inserted": 0, "failed": len(items), "results": results}), 409
+
+            # One INSERT per row: a multi-row INSERT's ids are not guaranteed to be
+            # consecutive (TiDB, innodb_autoinc_lock_mode=2), lastrowid per row is
+            new_ids = []
+            for row, index in zip(rows, row_indexes):
+                cur.execute(ENTRY_INSERT, row)
+                new_ids.append(cur.lastrowid)
+                results[index]["id"] = cur.lastrowid
+            apply_entry_totals(cur, new_ids, +1)
+            record_stock_movements(cur, [
+                (row[2], row[4], "reserve", 0, row[5], new_id)
+                for row, new_id in zip(rows, new_ids)
+            ])
+            record_changes(cur, "entries", new_ids)
+
+            body = {
+                "success": True,
+                "inserted": len(rows),
+                "failed": len(items) - len(rows),
+                "results": results,
+            }
+            if idem_key:
+                cur.execute(
+                    "UPDATE idempotency_keys SET response=%s WHERE idem_key=%s",
+                    (json.dumps(body), idem_key)
+                )
+            conn.commit()
+            return jsonify(body)
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return jsonify({"success": False, "message": f"Database error: {err}"}), 500
 
 @app.route("/user-info", methods=["GET"])
 def user_info():
-    email = request.args.get("email")
-    conn = get_conn()
-    cur = conn.cursor(dictionary=True)
-    cur.execute("SELECT name, email FROM users WHERE email=%s", (email,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
-    if user:
-        return jsonify({"success": True, "name": user['name'], "email": user['email']})
-    else:
-        return jsonify({"success": False, "message": "User not found"}), 404
+    # The token carries the name, so no users lookup is needed; no or a bad token is a 401
+    claims = current_claims()
+    return jsonify({"success": True, "name": claims["name"], "email": claims["email"]})
+
+# --- MAINTENANCE (see scheduler.py) ---
+# Housekeeping that keeps the hot tables small:
+#   purge-reset-tokens       deletes expired reset_tokens in batches
+#   archive-delivered        moves delivered entries older than ENTRY_RETENTION_DAYS
+#                            into entries_history (and out of entry_totals)
+#   purge-idempotency-keys   drops /submit/batch replay records older than IDEMPOTENCY_KEY_TTL_HOURS
+#   purge-change-log         drops change feed rows older than CHANGE_LOG_RETENTION_HOURS
+# MAINTENANCE_MODE=thread (default) runs them on a background thread of each web
+# worker, started on the first request; a MySQL named lock makes sure only one
+# worker runs a job at a time. MAINTENANCE_MODE=off leaves them to a separate
+# worker: `flask --app backend maintenance --loop`.
+MAINTENANCE_MODE = os.environ.get("MAINTENANCE_MODE", "thread").lower()
+MAINTENANCE_BATCH = int(os.environ.get("MAINTENANCE_BATCH", 1000))
+MAINTENANCE_MAX_BATCHES = int(os.environ.get("MAINTENANCE_MAX_BATCHES", 50))  # per run, so one run stays short
+ENTRY_RETENTION_DAYS = int(os.environ.get("ENTRY_RETENTION_DAYS", 365))  # 0 = never archive
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_KEY_TTL_HOURS", 72))
+
+
+@contextmanager
+def maintenance_lock(job_name):
+    """
+    Yields True if this process got the job's named lock (non-blocking).
+    GET_LOCK belongs to the session, so the job runs on this same connection
+    (db_cursor() picks it up via maintenance_conn) instead of taking a second one.
+    """
+    lock = f"maintenance:{job_name}"
+    with db_pool.connection() as conn:
+        with pinned_cursor(conn) as (_, cur):
+            cur.execute("SELECT GET_LOCK(%s, 0)", (lock,))
+            acquired = cur.fetchone()[0] == 1
+        if not acquired:
+            yield False
+            return
+        maintenance_conn.conn = conn
+        try:
+            yield True
+        finally:
+            maintenance_conn.conn = None
+            with pinned_cursor(conn) as (_, cur):
+                cur.execute("SELECT RELEASE_LOCK(%s)", (lock,))
+                cur.fetchone()
+
+
+def delete_in_batches(query, params):
+    """Runs a DELETE ... LIMIT %s repeatedly (one commit per batch); returns rows deleted."""
+    total = 0
+    with db_cursor() as (conn, cur):
+        for _ in range(MAINTENANCE_MAX_BATCHES):
+            cur.execute(query, list(params) + [MAINTENANCE_BATCH])
+            deleted = cur.rowcount
+            conn.commit()
+            total += deleted
+            if deleted < MAINTENANCE_BATCH:
+                break
+    return total
+
+
+def purge_expired_reset_tokens():
+    return delete_in_batches(
+        "DELETE FROM reset_tokens WHERE expires_at <= %s LIMIT %s",
+        [datetime.utcnow().replace(microsecond=0)]
+    )
+
+
+def purge_idempotency_keys():
+    cutoff = datetime.utcnow().replace(microsecond=0) - timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS)
+    return delete_in_batches("DELETE FROM idempotency_keys WHERE created_at < %s LIMIT %s", [cutoff])
+
+
+def purge_change_log():
+    return delete_in_batches(
+        "DELETE FROM change_log WHERE changed_at < NOW(6) - INTERVAL %s HOUR LIMIT %s",
+        [CHANGE_LOG_RETENTION_HOURS]
+    )
+
+
+def archive_delivered_entries():
+    if ENTRY_RETENTION_DAYS <= 0:
+        return 0
+    # submitted_at is stored in IST, same as the submit routes write it
+    now_ist = datetime.utcnow() + timedelta(hours=5, minutes=30)
+    cutoff = (now_ist - timedelta(days=ENTRY_RETENTION_DAYS)).strftime("%Y-%m-%d")
+    total = 0
+    with db_cursor() as (conn, cur):
+        for _ in range(MAINTENANCE_MAX_BATCHES):
+            cur.execute(
+                "SELECT id FROM entries WHERE delivered = 'Yes' AND submitted_at < %s "
+                "ORDER BY submitted_at, id LIMIT %s FOR UPDATE",
+                (cutoff, MAINTENANCE_BATCH)
+            )
+            ids = [r[0] for r in cur.fetchall()]
+            if not ids:
+                conn.commit()
+                break
+            placeholders = ",".join(["%s"] * len(ids))
+            cur.execute(f"INSERT IGNORE INTO entries_history SELECT * FROM entries WHERE id IN ({placeholders})", ids)
+            # Delivered rows hold no stock reservation, only the totals need updating
+            apply_entry_totals(cur, ids, -1)
+            cur.execute(f"DELETE FROM entries WHERE id IN ({placeholders})", ids)
+            record_changes(cur, "entries", ids, "delete")
+            conn.commit()
+            total += len(ids)
+            if len(ids) < MAINTENANCE_BATCH:
+                break
+    return total
+
+
+maintenance = Scheduler(guard=maintenance_lock)
+maintenance.add("purge-reset-tokens", purge_expired_reset_tokens,
+                float(os.environ.get("RESET_TOKEN_PURGE_INTERVAL", 15 * 60)))
+maintenance.add("archive-delivered", archive_delivered_entries,
+                float(os.environ.get("ENTRY_ARCHIVE_INTERVAL", 6 * 3600)))
+maintenance.add("purge-idempotency-keys", purge_idempotency_keys,
+                float(os.environ.get("IDEMPOTENCY_PURGE_INTERVAL", 3600)))
+maintenance.add("purge-change-log", purge_change_log,
+                float(os.environ.get("CHANGE_LOG_PURGE_INTERVAL", 3600)))
+
+
+@app.before_request
+def start_maintenance():
+    # Started lazily so CLI commands (rebuild-totals, ...) don't spawn it
+    if MAINTENANCE_MODE == "thread":
+        maintenance.start()
+
+
+@app.cli.command("maintenance")
+@click.option("--job", "jobs", multiple=True, help="Run only this job (repeatable).")
+@click.option("--loop", is_flag=True, help="Keep running jobs on their intervals (separate worker).")
+def maintenance_command(jobs, loop):
+    """Run the housekeeping jobs once (default) or as a long-running worker."""
+    if loop:
+        maintenance.run_forever()
+        return
+    for name in jobs or maintenance.stats()["jobs"]:
+        maintenance.run_job(name)
+
+
+@app.route("/admin/maintenance", methods=["GET"])
+def maintenance_stats():
+    return jsonify(maintenance.stats())
+
 
 # --- DATABASE INITIALIZATION ---
+# Schema lives in versioned scripts under migrations/, applied by migrate.py.
 def init_db():
     print("Initializing database...")
-    conn = get_conn()
-    cur = conn.cursor()
-    # Create tables if they don't exist
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(255),
-            email VARCHAR(255) UNIQUE NOT NULL, password VARCHAR(255) NOT NULL,
-            role VARCHAR(50) NOT NULL
-        )
-    """)
-    # ... Add other CREATE TABLE statements here for school_data, entries, etc.
-    conn.commit()
-    cur.close()
-    conn.close()
-    print("Database initialization check complete.")
+    with db_pool.connection() as conn:
+        applied = migrate(conn)
+    print(f"Database initialization check complete ({len(applied)} migration(s) applied).")
+
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    init_db()
+
+
+# Representative queries of the routes, for `flask --app backend check-queries`.
+# (name, sql, sample params, allow_full_scan) -- full scans are only allowed
+# where the route reads the whole table anyway (admin lists, rebuilds).
+ROUTE_QUERIES = [
+    ("login", "SELECT id, name, password, role FROM users WHERE email=%s", ["a@onmyowntechnology.com"], False),
+    ("reset_password", "SELECT email FROM reset_tokens WHERE token=%s AND expires_at > %s", ["t", "2025-01-01"], False),
+    ("purge-reset-tokens", "SELECT id FROM reset_tokens WHERE expires_at <= %s", ["2025-01-01"], False),
+    ("submissions page", f"SELECT {SUBMISSION_COLUMNS} FROM entries ORDER BY submitted_at DESC, id DESC LIMIT 101", [], False),
+    ("submissions page, school",
+     f"SELECT {SUBMISSION_COLUMNS} FROM entries WHERE school_name = %s ORDER BY submitted_at DESC, id DESC LIMIT 101",
+     ["x"], False),
+    ("submissions page, delivered",
+     f"SELECT {SUBMISSION_COLUMNS} FROM entries WHERE delivered = %s ORDER BY submitted_at DESC, id DESC LIMIT 101",
+     ["No"], False),
+    ("submissions search",
+     f"SELECT {SUBMISSION_COLUMNS} FROM entries WHERE (school_name LIKE %s OR submitted_by LIKE %s) "
+     "ORDER BY submitted_at DESC, id DESC LIMIT 101", ["x%", "x%"], False),
+    ("submissions search count",
+     "SELECT COUNT(*) FROM entries WHERE (school_name LIKE %s OR submitted_by LIKE %s)", ["x%", "x%"], False),
+    ("stock opening reservation",
+     "SELECT COALESCE(SUM(count), 0) FROM entries WHERE grade = %s AND workbook = %s AND delivered <> 'Yes'",
+     ["5", "x"], False),
+    ("archive-delivered",
+     "SELECT id FROM entries WHERE delivered = 'Yes' AND submitted_at < %s ORDER BY submitted_at, id LIMIT 1000",
+     ["2025-01-01"], False),
+    ("/locations", "SELECT DISTINCT location FROM school_data WHERE school_name=%s ORDER BY location", ["x"], False),
+    ("/reporting_branch",
+     "SELECT reporting_branch FROM school_data WHERE school_name=%s AND location=%s ORDER BY id LIMIT 1", ["x", "y"], False),
+    ("/workbook_name", "SELECT DISTINCT workbook_name FROM workbook_status WHERE grade=%s ORDER BY workbook_name", ["5"], False),
+    ("/grades", "SELECT DISTINCT grade FROM workbook_status ORDER BY grade", [], False),
+    ("/schools", "SELECT DISTINCT school_name FROM school_data ORDER BY school_name", [], False),
+    ("summary", "SELECT grade, SUM(total_count) FROM entry_totals WHERE reporting_branch = %s GROUP BY grade", ["x"], False),
+    ("change feed",
+     "SELECT id, table_name, row_id, op, changed_at FROM change_log "
+     "WHERE (changed_at > %s OR (changed_at = %s AND id > %s)) AND changed_at <= %s "
+     "AND table_name IN (%s) ORDER BY changed_at, id LIMIT 1001",
+     ["2025-01-01", "2025-01-01", 0, "2025-01-02", "entries"], False),
+    ("stock movements", "SELECT id FROM stock_movements WHERE grade = %s AND workbook_name = %s ORDER BY id DESC LIMIT 100",
+     ["5", "x"], False),
+    ("/admin/entries",
+     "SELECT id, school_name, location, reporting_branch, num_students, version FROM school_data ORDER BY school_name",
+     [], True),
+    ("/admin/users", "SELECT id, name, email, role FROM users ORDER BY id", [], True),
+]
+
+
+@app.cli.command("check-queries")
+def check_queries_command():
+    """EXPLAIN every query in ROUTE_QUERIES; exit 1 if one would scan a whole table."""
+    with db_pool.connection() as conn:
+        failures = explain_check(conn, ROUTE_QUERIES)
+    for name, tables in failures:
+        print(f"FULL SCAN  {name}: {', '.join(str(t) for t in tables)}")
+    if failures:
+        raise SystemExit(1)
+    print(f"All {len(ROUTE_QUERIES)} route queries use an index.")
+
+
+# --- APP FACTORY ---
+def create_app(warm=True):
+    """
+    Server entry point: gunicorn -w 4 "backend:create_app()".
+    Routes are registered at import; this only starts warming the DB pools in
+    the background, so the worker serves (or queues) requests right away.
+    """
+    if warm:
+        threading.Thread(target=warm_pools, name="warm-pools", daemon=True).start()
+    return app
+
 
 # --- MAIN ---
 if __name__ == "__main__":
     # init_db() # Run this once manually if needed, not on every server start
-    app.run(debug=True, host="127.0.0.1", port=5001)
\ No newline at end of file
+    create_app().run(debug=True, host="127.0.0.1", port=5001)
@@ -0,0 +1,120 @@
+# bench_password.py
+# Latency and CPU per request for login / user updates under concurrent load.
+#
+# Usage (from backend/):
+#   python benchmarks/bench_password.py                      # in-process, hashing work only
+#   python benchmarks/bench_password.py --methods scrypt:32768:8:1 pbkdf2:sha256:600000
+#   python benchmarks/bench_password.py --url http://127.0.0.1:5001 \
+#       --email admin@onmyowntechnology.com --password ... --user-id 7
+#
+# In-process mode runs what each request does on the CPU for every configured
+# hash method:
+#   login           verify_password() against a stored hash
+#   update+password hash_password() (an edit that changes the password)
+#   update profile  no hashing (name/role-only PATCH after this change; before
+#                   it, every edit paid for a hash like "update+password")
+# --url mode drives the real routes of a running server instead (POST /login,
+# PATCH /admin/users/<id> with and without a password) and reports client-side
+# latency; CPU per request is then only meaningful for the in-process mode.
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from harness import percentile  # noqa: E402
+from passwords import PASSWORD_HASH_METHOD, hash_password, verify_password  # noqa: E402
+
+
+def run(name, fn, requests, concurrency):
+    """Calls fn() requests times on concurrency threads; returns a stats dict."""
+    def timed(_):
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(timed, range(requests)))
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    return {
+        "name": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "rps": round(requests / wall, 1) if wall else 0.0,
+        "cpu_ms_per_request": round(cpu * 1000 / requests, 2),
+    }
+
+
+def in_process(methods, requests, concurrency):
+    results = []
+    for method in methods:
+        stored = hash_password("bench-password", method=method)
+        results.append(run(f"login [{method}]", lambda: verify_password(stored, "bench-password"), requests, concurrency))
+        results.append(run(f"update+password [{method}]", lambda: hash_password("new-password", method=method), requests, concurrency))
+    results.append(run("update profile [no hash]", lambda: None, requests, concurrency))
+    return results
+
+
+def post(url, body, method="POST", token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers=headers, method=method)
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read() or b"{}")
+
+
+def over_http(base, email, password, user_id, requests, concurrency):
+    token = post(f"{base}/login", {"email": email, "password": password})["token"]
+    user_url = f"{base}/admin/users/{user_id}"
+    return [
+        run("login", lambda: post(f"{base}/login", {"email": email, "password": password}), requests, concurrency),
+        run("update profile", lambda: post(user_url, {"name": "Bench User"}, "PATCH", token), requests, concurrency),
+        # Role/password edits revoke the user's tokens, so only point this at a
+        # throwaway user (not the admin account used to log in)
+        run("update+password", lambda: post(user_url, {"password": "bench-password"}, "PATCH", token), requests, concurrency),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark password hashing cost per request")
+    parser.add_argument("--methods", nargs="+", default=[PASSWORD_HASH_METHOD])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--url", help="base URL of a running backend (HTTP mode)")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--user-id", type=int, help="throwaway user to PATCH in HTTP mode")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        if not (args.email and args.password and args.user_id):
+            parser.error("--url needs --email, --password and --user-id")
+        results = over_http(args.url.rstrip("/"), args.email, args.password, args.user_id, args.requests, args.concurrency)
+    else:
+        results = in_process(args.methods, args.requests, args.concurrency)
+
+    print(f"{'case':<40} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8} {'cpu ms/req':>11}")
+    for r in results:
+        print(f"{r['name']:<40} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['rps']:>8} {r['cpu_ms_per_request']:>11}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# bench_startup.py
+# Cold-start cost of a backend worker: what a new gunicorn worker (or an
+# autoscaled host) pays before it can answer its first request.
+#
+# Usage (from backend/):
+#   python benchmarks/bench_startup.py                    # 10 fresh interpreters
+#   python benchmarks/bench_startup.py --runs 30 --warm   # also open the DB pools
+#   python benchmarks/bench_startup.py --importtime 15    # slowest imports
+#   python benchmarks/bench_startup.py --json benchmarks/results/startup.json
+#
+# Every run starts a new Python process that times, in-process:
+#   import        `import backend` (modules, routes, pools created but not connected)
+#   create_app    backend.create_app(); with --warm the pool warm-up thread is
+#                 joined too, i.e. the TLS handshake to the database
+#   first request GET /metrics through the test client (no database needed)
+# plus the whole process as seen from outside (spawn -> exit), next to a bare
+# `python -c pass` so the interpreter's own startup can be told apart.
+# The children get SECRET_KEY from the environment, or a throwaway one.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from harness import bench_secret_key, environment, percentile, save  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MARKER = "STARTUP "
+
+CHILD = """
+import json, threading, time
+t0 = time.perf_counter()
+import backend
+t1 = time.perf_counter()
+app = backend.create_app(warm={warm})
+for thread in threading.enumerate():
+    if thread.name == "warm-pools":
+        thread.join()
+t2 = time.perf_counter()
+app.test_client().get("/metrics")
+t3 = time.perf_counter()
+print({marker!r} + json.dumps({{"import": t1 - t0, "create_app": t2 - t1, "first_request": t3 - t2}}))
+"""
+
+
+def spawn(code):
+    """Runs code in a fresh interpreter; returns (wall seconds, stdout)."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{proc.stderr.strip()}")
+    return wall, proc.stdout
+
+
+def stats(name, values):
+    values = sorted(values)
+    return {
+        "name": name,
+        "runs": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "min_ms": round(values[0] * 1000, 1),
+    }
+
+
+def measure(runs, warm):
+    phases = {"import": [], "create_app": [], "first_request": [], "process": [], "python -c pass": []}
+    child = CHILD.format(warm=warm, marker=MARKER)
+    for _ in range(runs):
+        wall, out = spawn(child)
+        line = next(l for l in reversed(out.splitlines()) if l.startswith(MARKER))
+        for phase, seconds in json.loads(line[len(MARKER):]).items():
+            phases[phase].append(seconds)
+        phases["process"].append(wall)
+        phases["python -c pass"].append(spawn("pass")[0])
+    return [stats(name, values) for name, values in phases.items()]
+
+
+def slowest_imports(count):
+    """(cumulative ms, module) of the slowest imports under `import backend`, from -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import backend"],
+                          cwd=BACKEND_DIR, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]) / 1000, parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend worker cold start")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warm", action="store_true", help="include opening the DB pools (needs DB_* env)")
+    parser.add_argument("--importtime", type=int, metavar="N", help="also list the N slowest imports")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    bench_secret_key()  # inherited by every spawned interpreter
+    results = measure(args.runs, args.warm)
+    print(f"{'phase':<18} {'p50 ms':>8} {'p95 ms':>8} {'min ms':>8}")
+    for r in results:
+        print(f"{r['name']:<18} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['min_ms']:>8}")
+
+    imports = []
+    if args.importtime:
+        imports = slowest_imports(args.importtime)
+        print(f"\n{'cumulative ms':>13}  module")
+        for ms, module in imports:
+            print(f"{ms:>13.1f}  {module}")
+
+    if args.json:
+        save(args.json, {
+            "environment": environment(),
+            "config": {"runs": args.runs, "warm": args.warm},
+            "results": results,
+            "slowest_imports": [{"module": m.strip(), "cumulative_ms": ms} for ms, m in imports],
+        })
+
+
+if __name__ == "__main__":
+    main()
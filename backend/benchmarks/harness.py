@@ -0,0 +1,153 @@
+# harness.py
+# Shared pieces of the benchmark scripts: percentiles, a concurrent driver and
+# JSON result files that can be compared between runs.
+import json
+import os
+import platform
+import secrets
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def bench_secret_key():
+    """
+    Sets a throwaway SECRET_KEY unless one is given: importing backend
+    requires it, and the benchmarks' tokens never outlive the run.
+    """
+    os.environ.setdefault("SECRET_KEY", "benchmark-" + secrets.token_hex(16))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def summarize(name, latencies, errors, wall):
+    latencies = sorted(latencies)
+    total = len(latencies) + sum(errors.values())
+    return {
+        "name": name,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": dict(errors),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+def drive(scenarios, concurrency, duration=None, requests=None, warmup=0.0):
+    """
+    Runs weighted scenarios on concurrency threads for duration seconds (or
+    until requests calls were made). scenarios: [(name, weight, fn)] where
+    fn(worker_index) raises on failure; an exception's class name (or an
+    HTTP status) is recorded as the error kind. Returns (per-scenario
+    summaries, overall summary).
+    """
+    names = [name for name, _, _ in scenarios]
+    weights = [weight for _, weight, _ in scenarios]
+    fns = {name: fn for name, _, fn in scenarios}
+    latencies = defaultdict(list)
+    errors = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+    issued = [0]
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration if duration else None
+
+    # Deterministic, evenly spread schedule instead of random.choices, so two
+    # runs of the same config send the same mix
+    schedule = [name for name, weight in zip(names, weights) for _ in range(weight)]
+
+    def worker(index):
+        position = index
+        while True:
+            with lock:
+                if requests is not None and issued[0] >= requests:
+                    return
+                issued[0] += 1
+            now = time.perf_counter()
+            if stop_at and now >= stop_at:
+                return
+            name = schedule[position % len(schedule)]
+            position += concurrency
+            t0 = time.perf_counter()
+            try:
+                fns[name](index)
+                error = None
+            except Exception as e:
+                error = getattr(e, "code", None) or type(e).__name__
+            elapsed = time.perf_counter() - t0
+            if t0 < measure_from:
+                continue
+            with lock:
+                if error is None:
+                    latencies[name].append(elapsed)
+                else:
+                    errors[name][str(error)] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall = time.perf_counter() - max(started, measure_from)
+
+    results = [summarize(name, latencies[name], errors[name], wall) for name in names]
+    all_errors = defaultdict(int)
+    for per in errors.values():
+        for kind, count in per.items():
+            all_errors[kind] += count
+    overall = summarize("all", [x for name in names for x in latencies[name]], all_errors, wall)
+    return results, overall
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save(path, payload):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def print_table(results):
+    print(f"{'scenario':<28} {'ok':>7} {'err':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for r in results:
+        print(f"{r['name']:<28} {r['ok']:>7} {sum(r['errors'].values()):>5} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} {r['rps']:>8}")
+
+
+def compare(baseline_path, results, threshold=0.10):
+    """Prints p95/rps changes against a previous result file; returns True if something regressed."""
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+    regressed = False
+    print(f"\nvs {baseline_path}:")
+    for r in results:
+        old = baseline.get(r["name"])
+        if not old or not old["p95_ms"] or not old["rps"]:
+            continue
+        p95_change = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"]
+        rps_change = (r["rps"] - old["rps"]) / old["rps"]
+        flag = p95_change > threshold or rps_change < -threshold
+        regressed |= flag
+        print(f"  {r['name']:<26} p95 {p95_change:+.0%}  rps {rps_change:+.0%}{'  <-- regression' if flag else ''}")
+    return regressed
@@ -0,0 +1,210 @@
+# loadtest.py
+# Drives the real API routes at a fixed concurrency and reports p50/p95/p99
+# latency and requests/sec per route.
+#
+# Usage (from backend/, after benchmarks/seed.py):
+#   RATE_LIMIT_ENABLED=0 MAINTENANCE_MODE=off gunicorn -w 4 -b 127.0.0.1:5001 backend:app
+#   python benchmarks/loadtest.py --url http://127.0.0.1:5001 --concurrency 16 --duration 60
+#   python benchmarks/loadtest.py --in-process ...       # Flask test client, no HTTP server
+#   python benchmarks/loadtest.py ... --compare benchmarks/results/<earlier>.json
+#
+# The mix covers the form dropdown lookups, /submit, the admin submissions
+# view and /login (weights below, override with --mix name=weight,...).
+# RATE_LIMIT_ENABLED=0 on the server keeps the login limiter from turning the
+# run into 429s. Results go to benchmarks/results/<timestamp>.json together
+# with the settings and the git commit, so runs can be compared later;
+# --compare exits 1 if p95 or req/s regressed by more than --threshold.
+# --server-cores N (CPU cores given to the server) adds req/s per core, for
+# comparing deployments of different sizes (sync gunicorn vs asgi.py).
+# --in-process uses SECRET_KEY from the environment, or a throwaway one; the
+# servers above need it set like any deployment (or FLASK_DEBUG=1).
+import argparse
+import json
+import os
+import random
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from harness import bench_secret_key, compare, drive, environment, print_table, save  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_MIX = {
+    "GET /schools": 3,
+    "GET /locations": 3,
+    "GET /grades": 2,
+    "GET /workbook_name": 2,
+    "GET /form-bootstrap": 1,
+    "POST /submit": 2,
+    "GET /admin/form-submissions": 2,
+    "GET /admin/form-submissions?school": 1,
+    "POST /login": 1,
+}
+
+
+class StatusError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = dict(headers or {})
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            raise StatusError(e.code)
+
+
+class InProcessClient:
+    """Same routes through Flask's test client (uses the DB_* settings of this process)."""
+
+    def __init__(self):
+        bench_secret_key()
+        from backend import app
+
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        resp = self.client.open(path, method=method, json=body, headers=headers or {})
+        if resp.status_code >= 400:
+            raise StatusError(resp.status_code)
+        return resp.status_code, resp.get_data()
+
+
+def json_body(client, method, path, body=None, headers=None):
+    return json.loads(client.request(method, path, body, headers)[1])
+
+
+def build_scenarios(client, mix, email, password, seed):
+    token = json_body(client, "POST", "/login", {"email": email, "password": password})["token"]
+    auth = {"Authorization": f"Bearer {token}"}
+    schools = json_body(client, "GET", "/schools")
+    grades = json_body(client, "GET", "/grades")
+    if not schools or not grades:
+        sys.exit("No schools/grades found; run benchmarks/seed.py first.")
+    locations = {}
+    workbooks = {}
+    rngs = {}
+
+    def rng(worker):
+        if worker not in rngs:
+            rngs[worker] = random.Random(seed * 1000 + worker)
+        return rngs[worker]
+
+    def q(value):
+        return urllib.parse.quote(str(value))
+
+    def school_location(r):
+        school = r.choice(schools)
+        if school not in locations:
+            locations[school] = json_body(client, "GET", f"/locations?school={q(school)}") or [""]
+        return school, r.choice(locations[school])
+
+    def grade_workbook(r):
+        grade = r.choice(grades)
+        if grade not in workbooks:
+            workbooks[grade] = json_body(client, "GET", f"/workbook_name?grade={q(grade)}")["workbooks"] or [""]
+        return grade, r.choice(workbooks[grade])
+
+    def submit(worker):
+        r = rng(worker)
+        school, location = school_location(r)
+        grade, workbook = grade_workbook(r)
+        client.request("POST", "/submit", {
+            "school": school, "location": location, "grade": grade, "term": "1",
+            "workbook": workbook, "count": r.randint(1, 5), "remark": "loadtest",
+            "submitted_by": email,
+        })
+
+    scenarios = {
+        "GET /schools": lambda w: client.request("GET", "/schools"),
+        "GET /locations": lambda w: client.request("GET", f"/locations?school={q(rng(w).choice(schools))}"),
+        "GET /grades": lambda w: client.request("GET", "/grades"),
+        "GET /workbook_name": lambda w: client.request("GET", f"/workbook_name?grade={q(rng(w).choice(grades))}"),
+        "GET /form-bootstrap": lambda w: client.request("GET", "/form-bootstrap", headers={"Accept-Encoding": "gzip"}),
+        "POST /submit": submit,
+        "GET /admin/form-submissions": lambda w: client.request("GET", "/admin/form-submissions?limit=100", headers=auth),
+        "GET /admin/form-submissions?school": lambda w: client.request(
+            "GET", f"/admin/form-submissions?limit=100&school={q(rng(w).choice(schools))}", headers=auth),
+        "POST /login": lambda w: client.request("POST", "/login", {"email": email, "password": password}),
+    }
+    return [(name, weight, scenarios[name]) for name, weight in mix.items() if weight > 0]
+
+
+def parse_mix(value):
+    mix = dict(DEFAULT_MIX)
+    if value:
+        for part in value.split(","):
+            name, weight = part.rsplit("=", 1)
+            if name not in DEFAULT_MIX:
+                raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(DEFAULT_MIX)}")
+            mix[name] = int(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend routes")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="base URL of a running backend")
+    target.add_argument("--in-process", action="store_true", help="use Flask's test client instead of HTTP")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--mix", help='override weights, e.g. "POST /login=0,POST /submit=5"')
+    parser.add_argument("--email", default="bench.admin@onmyowntechnology.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="result file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold for --compare")
+    parser.add_argument("--server-cores", type=float, help="CPU cores of the server, to report req/s per core")
+    args = parser.parse_args()
+
+    client = InProcessClient() if args.in_process else HttpClient(args.url)
+    mix = parse_mix(args.mix)
+    scenarios = build_scenarios(client, mix, args.email, args.password, args.seed)
+
+    print(f"Running {len(scenarios)} scenarios at concurrency {args.concurrency} "
+          f"for {args.duration:.0f}s (+{args.warmup:.0f}s warmup)...")
+    results, overall = drive(scenarios, args.concurrency, duration=args.duration, warmup=args.warmup)
+    print_table(results + [overall])
+    if args.server_cores:
+        overall["rps_per_core"] = round(overall["rps"] / args.server_cores, 1)
+        print(f"req/s per server core: {overall['rps_per_core']}")
+
+    env = environment()
+    payload = {
+        "settings": {
+            "target": "in-process" if args.in_process else args.url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "mix": mix,
+            "seed": args.seed,
+            "server_cores": args.server_cores,
+        },
+        "environment": env,
+        "results": results + [overall],
+    }
+    out = args.out or os.path.join(RESULTS_DIR, env["timestamp"].replace(":", "") + ".json")
+    save(out, payload)
+
+    if args.compare and compare(args.compare, results + [overall], args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
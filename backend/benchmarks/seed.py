@@ -0,0 +1,146 @@
+# seed.py
+# Fills a local MySQL/TiDB database with benchmark-sized data.
+#
+# Usage (from backend/, with DB_* pointing at a throwaway database):
+#   docker run -d -p 3306:3306 -e MYSQL_ROOT_PASSWORD=bench -e MYSQL_DATABASE=bench mysql:8
+#   DB_HOST=127.0.0.1 DB_USER=root DB_PASSWORD=bench DB_NAME=bench DB_SSL=0 \
+#       python benchmarks/seed.py --schools 3000 --entries 300000
+#
+# Applies the migrations, then inserts schools (with 1-3 locations each),
+# workbooks, one admin + one user account (password "bench-password") and
+# entries spread over the last year, and rebuilds entry_totals and the stock
+# balances the same way `flask rebuild-totals` / `rebuild-stock` do.
+# The run is seeded, so the same arguments give the same data. It refuses to
+# touch a non-local host unless --force is given. Without SECRET_KEY in the
+# environment a throwaway one is used (the rebuilds import backend).
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+BRANCHES = ["Andheri", "Thane", "Pune", "Nashik", "Borivali", "Navi Mumbai", "Nagpur", "Kalyan"]
+CITIES = ["Mumbai", "Pune", "Thane", "Nashik", "Nagpur", "Aurangabad", "Kolhapur", "Solapur", "Surat", "Vadodara"]
+GRADES = [str(g) for g in range(1, 11)]
+WORKBOOKS_PER_GRADE = 6
+TERMS = ["1", "2"]
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench.admin@onmyowntechnology.com"
+USER_EMAIL = "bench.user@onmyowntechnology.com"
+
+
+def school_rows(count, rng):
+    rows = []
+    for i in range(count):
+        name = f"Bench School {i:05d}"
+        for city in rng.sample(CITIES, rng.randint(1, 3)):
+            rows.append((name, city, rng.choice(BRANCHES), str(rng.randint(80, 2500))))
+    return rows
+
+
+def workbook_rows(rng):
+    return [(grade, f"Workbook {grade}-{chr(65 + n)}", rng.randint(2000, 20000))
+            for grade in GRADES for n in range(WORKBOOKS_PER_GRADE)]
+
+
+def entry_rows(count, schools, workbooks, rng, now):
+    """Yields entries tuples; submitted_at is IST like the submit routes write it."""
+    for _ in range(count):
+        school, location, _, _ = rng.choice(schools)
+        grade, workbook, _ = rng.choice(workbooks)
+        submitted = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        # Older submissions are mostly delivered, recent ones mostly pending
+        delivered = "Yes" if rng.random() < min(0.95, (now - submitted).days / 60) else "No"
+        yield (school, location, grade, rng.choice(TERMS), workbook, rng.randint(5, 120), "",
+               "bench.user@onmyowntechnology.com", submitted.isoformat(), delivered)
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a local database for benchmarks")
+    parser.add_argument("--schools", type=int, default=3000)
+    parser.add_argument("--entries", type=int, default=300000)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append", action="store_true", help="keep existing rows (default: truncate first)")
+    parser.add_argument("--force", action="store_true", help="allow a non-local DB_HOST")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    host = os.environ.get("DB_HOST") or ""
+    if host not in ("localhost", "127.0.0.1", "::1", "db", "mysql") and not args.force:
+        sys.exit(f"Refusing to seed DB_HOST={host!r}; point DB_* at a local database or pass --force.")
+
+    import mysql.connector
+    from db import connect_args_from_env
+    from migrate import migrate
+    from passwords import hash_password
+
+    conn = mysql.connector.connect(**connect_args_from_env())
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    try:
+        migrate(conn)
+        cur = conn.cursor()
+        if not args.append:
+            for table in ("entries", "school_data", "workbook_status", "entry_totals",
+                          "stock_movements", "stock_balances", "idempotency_keys"):
+                cur.execute(f"TRUNCATE TABLE {table}")
+
+        schools = school_rows(args.schools, rng)
+        for batch in batches(schools, args.batch):
+            cur.executemany(
+                "INSERT IGNORE INTO school_data (school_name, location, reporting_branch, num_students) "
+                "VALUES (%s, %s, %s, %s)", batch)
+        workbooks = workbook_rows(rng)
+        cur.executemany("INSERT INTO workbook_status (grade, workbook_name, quantity) VALUES (%s, %s, %s)", workbooks)
+
+        password = hash_password(BENCH_PASSWORD)
+        cur.executemany("""
+            INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE password = VALUES(password), role = VALUES(role)
+        """, [("Bench Admin", ADMIN_EMAIL, password, "admin"), ("Bench User", USER_EMAIL, password, "user")])
+        conn.commit()
+        print(f"{len(schools)} school rows, {len(workbooks)} workbooks, 2 users")
+
+        now = datetime.utcnow() + timedelta(hours=5, minutes=30)
+        inserted = 0
+        for batch in batches(entry_rows(args.entries, schools, workbooks, rng, now), args.batch):
+            cur.executemany("""
+                INSERT INTO entries
+                (school_name, location, grade, term, workbook, count, remark, submitted_by, submitted_at, delivered)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, batch)
+            conn.commit()
+            inserted += len(batch)
+            print(f"  ... {inserted} entries")
+        cur.close()
+    finally:
+        conn.close()
+
+    # Same code paths as the CLI commands (imports the app with the same DB_* settings)
+    from harness import bench_secret_key
+    bench_secret_key()
+    from backend import rebuild_entry_totals, rebuild_stock
+    groups = rebuild_entry_totals()
+    seeded, balances = rebuild_stock()
+    print(f"entry_totals: {groups} groups; stock: {balances} balances")
+    print(f"Seeded in {time.perf_counter() - started:.1f}s. Log in as {ADMIN_EMAIL} / {BENCH_PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# bulkedit.py
+# Optimistic-concurrency bulk edits, used by PATCH /admin/entries and
+# PATCH /admin/workbooks in backend.py:
+#   {"rows": [{"id": 7, "version": 3, "num_students": 120}, ...], "atomic": false}
+# Each row carries the version the admin loaded. The rows are locked, checked
+# and updated in one transaction with UPDATE ... WHERE id=%s AND version=%s,
+# so an edit made on a stale copy is reported as a conflict (with the current
+# row) instead of silently overwriting someone else's change. With
+# "atomic": true one row that can't be applied rolls the whole batch back.
+BULK_EDIT_MAX = 500
+STATUSES = ("updated", "conflict", "not_found", "invalid", "rolled_back")
+
+
+def parse_edits(data, fields, coerce=None, max_rows=BULK_EDIT_MAX):
+    """
+    [(id, version, {column: value})] from a bulk PATCH body; raises ValueError.
+    Only columns in fields are taken; coerce maps a column to a function that
+    cleans its value (raising ValueError when it is invalid).
+    """
+    rows = data.get("rows")
+    if not isinstance(rows, list) or not rows:
+        raise ValueError("rows must be a non-empty list")
+    if len(rows) > max_rows:
+        raise ValueError(f"At most {max_rows} rows per request")
+    edits, seen = [], set()
+    for row in rows:
+        try:
+            row_id, version = int(row["id"]), int(row["version"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Every row needs a numeric id and version")
+        if row_id in seen:
+            raise ValueError(f"Row {row_id} is listed twice")
+        seen.add(row_id)
+        changes = {col: row[col] for col in fields if col in row}
+        if not changes:
+            raise ValueError(f"Row {row_id} changes nothing (editable: {', '.join(fields)})")
+        for col, clean in (coerce or {}).items():
+            if col in changes:
+                try:
+                    changes[col] = clean(changes[col])
+                except ValueError as e:
+                    raise ValueError(f"Row {row_id}: {e}")
+        edits.append((row_id, version, changes))
+    return edits
+
+
+def lock_rows(cur, table, ids, columns=()):
+    """{id: {"version": ..., column: ...}} of the ids that exist, locked until the transaction ends."""
+    if not ids:
+        return {}
+    names = ["id", "version", *columns]
+    placeholders = ",".join(["%s"] * len(ids))
+    cur.execute(f"SELECT {', '.join(names)} FROM {table} WHERE id IN ({placeholders}) FOR UPDATE", list(ids))
+    return {row[0]: dict(zip(names[1:], row[1:])) for row in cur.fetchall()}
+
+
+def apply_edits(cur, table, edits, previous, integrity_error):
+    """
+    Applies edits to the rows locked in previous; returns ({id: (status, message)}, updated ids).
+    A row that breaks a unique key is "invalid"; only that statement fails, the transaction carries on.
+    """
+    statuses, updated = {}, []
+    for row_id, version, changes in edits:
+        old = previous.get(row_id)
+        if old is None:
+            statuses[row_id] = ("not_found", None)
+            continue
+        if old["version"] != version:
+            statuses[row_id] = ("conflict", None)
+            continue
+        assignments = ", ".join(f"{col} = %s" for col in changes)
+        try:
+            cur.execute(
+                f"UPDATE {table} SET {assignments}, version = version + 1 WHERE id = %s AND version = %s",
+                [*changes.values(), row_id, version]
+            )
+        except integrity_error as err:
+            statuses[row_id] = ("invalid", str(err))
+            continue
+        if cur.rowcount:
+            statuses[row_id] = ("updated", None)
+            updated.append(row_id)
+        else:
+            statuses[row_id] = ("conflict", None)
+    return statuses, updated
+
+
+def report(edits, statuses, current):
+    """Response body: counts plus one result per row in request order, with the current row when known."""
+    results = []
+    for row_id, _, _ in edits:
+        status, message = statuses[row_id]
+        result = {"id": row_id, "status": status}
+        if message:
+            result["message"] = message
+        if row_id in current:
+            result["row"] = current[row_id]
+        results.append(result)
+    counts = {status: 0 for status in STATUSES}
+    for status, _ in statuses.values():
+        counts[status] += 1
+    return {"success": counts["updated"] == len(edits), **counts, "results": results}
+
+
+def run(conn, cur, table, edits, load_rows, integrity_error, atomic=False, lock_columns=(), before_commit=None):
+    """
+    Runs edits in one transaction on conn and commits it. Returns (http status, body, updated ids).
+
+    load_rows(cur, table, ids) gives the rows as the API returns them (for the
+    report); before_commit(cur, edits, updated ids, previous) runs inside the
+    transaction, previous holding lock_columns of every row before the edit.
+    With atomic, any row that isn't updated rolls everything back (409).
+    """
+    previous = lock_rows(cur, table, [row_id for row_id, _, _ in edits], lock_columns)
+    statuses, updated = apply_edits(cur, table, edits, previous, integrity_error)
+    if atomic and len(updated) < len(edits):
+        conn.rollback()
+        for row_id in updated:
+            statuses[row_id] = ("rolled_back", None)
+        updated = []
+        status = 409
+    else:
+        if updated and before_commit:
+            before_commit(cur, edits, updated, previous)
+        conn.commit()
+        status = 200
+    shown = [row_id for row_id, (s, _) in statuses.items() if s in ("updated", "conflict")]
+    current = {row["id"]: row for row in load_rows(cur, table, shown)} if shown else {}
+    return status, report(edits, statuses, current), updated
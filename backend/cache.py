@@ -0,0 +1,87 @@
+# cache.py
+# Small in-process read-through cache for reference data (dropdown lookups).
+# Each gunicorn worker keeps its own copy; the TTL bounds how stale a worker
+# can get after another worker handled the admin write that invalidated it.
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LookupCache:
+    """
+    Thread-safe TTL + LRU cache with a version counter.
+
+    invalidate() bumps the version and drops every entry, so a load that was
+    already in flight when an admin edit landed is not stored afterwards.
+    """
+
+    def __init__(self, ttl=300, maxsize=1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.version = 0
+        self.invalidated_at = float("-inf")  # time.monotonic() of the last invalidate()
+        self._data = OrderedDict()  # key -> (expires_at, value, etag)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        """Returns (value, etag) for key, calling loader() on a miss or expiry."""
+        item, version = self._lookup(key)
+        if item:
+            return item
+        return self._store(key, version, loader())
+
+    async def get_or_load_async(self, key, loader):
+        """get_or_load() with an async loader (the ASGI entry point, asgi.py)."""
+        item, version = self._lookup(key)
+        if item:
+            return item
+        return self._store(key, version, await loader())
+
+    def _lookup(self, key):
+        """((value, etag), version) on a hit, (None, version) on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return (item[1], item[2]), self.version
+            self.misses += 1
+            return None, self.version
+
+    def _store(self, key, version, value):
+        etag = make_etag(value)
+        with self._lock:
+            if version == self.version:
+                self._data[key] = (time.monotonic() + self.ttl, value, etag)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value, etag
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self.invalidated_at = time.monotonic()
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def make_etag(value):
+    """Content hash of a JSON-serializable value, identical across workers."""
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha1(raw).hexdigest()
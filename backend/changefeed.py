@@ -0,0 +1,127 @@
+# changefeed.py
+# Wakes Server-Sent Events streams when change_log moves.
+#
+# Each open /admin/changes/stream would otherwise poll the database on its own.
+# Instead, one poller thread per worker reads a cheap marker (the newest settled
+# change_log timestamp) every `interval` seconds, but only while at least one
+# stream is waiting, and wakes every waiting stream when it changes. Streams
+# then fetch just the changes they care about.
+# read_changes() builds one page of the feed (GET /admin/changes) on a cursor.
+import threading
+import time
+
+from paging import encode_cursor
+
+
+def collapse_changes(log):
+    """
+    (reset tables, {table: [row ids]}) from change_log rows (id, table_name,
+    row_id, op, changed_at) in feed order: each row id once, in the order it
+    first changed; a table with a "reset" only needs a full reload.
+    """
+    reset = {table for _, table, _, op, _ in log if op == "reset"}
+    touched = {}
+    for _, table, row_id, op, _ in log:
+        if table not in reset and row_id is not None:
+            touched.setdefault(table, {})[row_id] = True
+    return reset, {table: list(ids) for table, ids in touched.items()}
+
+
+def read_changes(cur, since, tables, load_rows, settle, retention_hours, limit):
+    """
+    Feed payload for tables after since ((changed_at, id) or None = just the
+    current version). Rows newer than settle seconds are left for the next
+    call (their transactions may still be committing); a since older than
+    retention_hours means the log was pruned, so the tables are reset.
+    load_rows(cur, table, ids) gives the current rows of ids that still exist.
+    """
+    cur.execute("SELECT NOW(6) - INTERVAL %s MICROSECOND, NOW(6) - INTERVAL %s HOUR",
+                (int(settle * 1_000_000), retention_hours))
+    settled, horizon = cur.fetchone()
+    body = {"version": encode_cursor(settled, 0), "more": False, "reset": [], "changes": {}}
+    if since is None:
+        return body
+    if since[0] < horizon:
+        body["reset"] = tables
+        return body
+
+    placeholders = ",".join(["%s"] * len(tables))
+    cur.execute(f"""
+        SELECT id, table_name, row_id, op, changed_at FROM change_log
+        WHERE (changed_at > %s OR (changed_at = %s AND id > %s)) AND changed_at <= %s
+          AND table_name IN ({placeholders})
+        ORDER BY changed_at, id
+        LIMIT %s
+    """, [since[0], since[0], since[1], settled] + tables + [limit + 1])
+    log = cur.fetchall()
+    if len(log) > limit:
+        log = log[:limit]
+        body["more"] = True
+        body["version"] = encode_cursor(log[-1][4], log[-1][0])
+
+    reset, touched = collapse_changes(log)
+    # Whatever the logged op, the row's current state decides: present = upsert, gone = delete
+    for table, ids in touched.items():
+        rows = load_rows(cur, table, ids)
+        present = {row["id"] for row in rows}
+        body["changes"][table] = {"upserts": rows, "deletes": [i for i in ids if i not in present]}
+    body["reset"] = sorted(reset)
+    return body
+
+
+class ChangeNotifier:
+    def __init__(self, load_latest, interval=1.0):
+        self.load_latest = load_latest  # () -> marker that changes when there is something new
+        self.interval = interval
+        self.latest = None
+        self._cond = threading.Condition()
+        self._waiters = 0
+        self._thread = None
+        self.polls = 0
+        self.errors = 0
+
+    def _ensure_poller(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="change-notifier", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._waiters:
+                    # Nobody listening: stop polling; the next wait() restarts the thread
+                    self._thread = None
+                    return
+            try:
+                latest = self.load_latest()
+            except Exception as e:
+                latest = None
+                with self._cond:
+                    self.errors += 1
+                print(f"Change notifier poll failed: {e}")
+            with self._cond:
+                self.polls += 1
+                if latest is not None and latest != self.latest:
+                    self.latest = latest
+                    self._cond.notify_all()
+            time.sleep(self.interval)
+
+    def wait(self, seen, timeout):
+        """Blocks until the marker differs from seen or timeout passes; returns the current marker."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._waiters += 1
+            self._ensure_poller()
+            try:
+                while self.latest is None or self.latest == seen:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                return self.latest
+            finally:
+                self._waiters -= 1
+
+    def stats(self):
+        with self._cond:
+            return {"latest": self.latest, "waiting": self._waiters, "polls": self.polls, "errors": self.errors}
@@ -0,0 +1,423 @@
+# db.py
+# Connection pool used by every route in backend.py.
+#
+# mysql.connector's MySQLConnectionPool raises as soon as it is exhausted and
+# never checks whether TiDB has dropped an idle connection. This pool instead:
+#   - waits (up to DB_POOL_TIMEOUT seconds) for a connection to be returned,
+#     with at most DB_POOL_MAX_WAITERS requests queued,
+#   - can open DB_POOL_MAX_OVERFLOW extra short-lived connections at peak,
+#   - pings connections that sat idle and recycles ones older than DB_POOL_RECYCLE,
+#   - opens connections lazily, retrying a failed connect DB_CONNECT_RETRIES
+#     times (a brief TiDB blip during a deploy fails a few requests, not the worker),
+#   - keeps counters for /admin/db-pool,
+#   - optionally reports every statement's duration and fetched rows
+#     (on_query/on_rows, wired to metrics.py by backend.py).
+# Every gunicorn worker gets its own pool (the module is imported per worker).
+#
+# ReadWriteRouter splits reads from writes over two such pools: the primary
+# (DB_*) and a read endpoint (DB_READ_*, see connect_args_from_env), e.g. a
+# MySQL replica or TiDB with follower reads.
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def db_env(prefix, name, default=None):
+    """prefix + name (e.g. DB_READ_HOST), falling back to the primary's DB_ + name."""
+    return os.environ.get(prefix + name, os.environ.get("DB_" + name, default))
+
+
+def connect_args_from_env(prefix="DB_"):
+    """
+    mysql.connector.connect() kwargs for the configured TiDB/MySQL database.
+    prefix="DB_READ_" gives the read endpoint; unset DB_READ_* values are the primary's.
+    """
+    args = dict(
+        host=db_env(prefix, "HOST"),
+        user=db_env(prefix, "USER"),
+        password=db_env(prefix, "PASSWORD"),
+        database=db_env(prefix, "NAME"),
+        port=int(db_env(prefix, "PORT", 3306)),
+        # SSL arguments for the secure connection
+        ssl_ca=db_env(prefix, "SSL_CA"),
+        ssl_verify_identity=True,
+    )
+    if db_env(prefix, "SSL", "1") == "0":
+        # Local MySQL (benchmarks, development) without TLS
+        del args["ssl_ca"], args["ssl_verify_identity"]
+        args["ssl_disabled"] = True
+    return args
+
+
+def mysql_driver():
+    """mysql.connector, imported when the first pool is created (tests pass their own driver)."""
+    import mysql.connector
+
+    return mysql.connector
+
+
+class PoolTimeout(Exception):
+    """No connection became free in time, or too many requests are already waiting."""
+
+
+def read_endpoint_configured():
+    """True when DB_READ_HOST or DB_READ_REPLICA_READ asks for a separate read pool."""
+    return bool(os.environ.get("DB_READ_HOST") or os.environ.get("DB_READ_REPLICA_READ"))
+
+
+def read_session_sql():
+    """Statements every read connection runs first (TiDB follower reads)."""
+    replica_read = os.environ.get("DB_READ_REPLICA_READ")
+    if not replica_read:
+        return []
+    if replica_read not in ("follower", "leader-and-follower", "closest-replicas", "closest-adaptive"):
+        raise ValueError(f"Unknown DB_READ_REPLICA_READ: {replica_read}")
+    return [f"SET SESSION tidb_replica_read = '{replica_read}'"]
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute()/executemany() and counts fetched rows."""
+
+    def __init__(self, raw, on_query, on_rows):
+        self._raw = raw
+        self._on_query = on_query
+        self._on_rows = on_rows
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def _timed(self, method, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            if self._on_query:
+                self._on_query(operation, time.perf_counter() - started)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._raw.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._raw.executemany, operation, *args, **kwargs)
+
+    def _count(self, rows):
+        if self._on_rows and rows:
+            self._on_rows(len(rows))
+        return rows
+
+    def fetchone(self):
+        row = self._raw.fetchone()
+        if self._on_rows and row is not None:
+            self._on_rows(1)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._count(self._raw.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._count(self._raw.fetchall())
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+
+class PooledConnection:
+    """Thin proxy around a raw connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self.created_at = created_at
+        self.last_used = time.monotonic()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        raw_cursor = self._raw.cursor(*args, **kwargs)
+        pool = self._pool
+        if pool is not None and (pool.on_query or pool.on_rows):
+            return InstrumentedCursor(raw_cursor, pool.on_query, pool.on_rows)
+        return raw_cursor
+
+    def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DBPool:
+    def __init__(self, connect_args, pool_size=5, max_overflow=0, timeout=10.0,
+                 max_waiters=32, recycle=1800.0, ping_after=30.0, on_query=None, on_rows=None,
+                 session_sql=(), connect_retries=2, retry_delay=0.5, driver=None):
+        # DB-API module with connect(), Error, InterfaceError and OperationalError
+        self.driver = driver or mysql_driver()
+        self.connect_args = connect_args
+        self.connect_retries = connect_retries
+        self.retry_delay = retry_delay  # doubles after every failed attempt
+        self.session_sql = list(session_sql)  # run on every new connection
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.on_query = on_query  # on_query(sql, seconds) after every statement
+        self.on_rows = on_rows  # on_rows(count) for every fetch
+
+        self._idle = deque()  # (raw connection, created_at, last_used)
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._waiting = 0
+
+        self.acquired = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.errors = 0
+        self.recycled = 0
+        self.ping_failures = 0
+
+    @classmethod
+    def from_env(cls, connect_args, prefix="DB_", session_sql=()):
+        """Sized by DB_POOL_* (prefix="DB_READ_": DB_READ_POOL_*, defaulting to DB_POOL_*)."""
+        def setting(name, default):
+            return db_env(prefix, "POOL_" + name, default)
+
+        return cls(
+            connect_args,
+            pool_size=int(setting("SIZE", 5)),
+            max_overflow=int(setting("MAX_OVERFLOW", 0)),
+            timeout=float(setting("TIMEOUT", 10)),
+            max_waiters=int(setting("MAX_WAITERS", 32)),
+            recycle=float(setting("RECYCLE", 1800)),
+            ping_after=float(setting("PING_AFTER", 30)),
+            session_sql=session_sql,
+            connect_retries=int(db_env(prefix, "CONNECT_RETRIES", 2)),
+            retry_delay=float(db_env(prefix, "CONNECT_RETRY_DELAY", 0.5)),
+        )
+
+    @property
+    def capacity(self):
+        return self.pool_size + self.max_overflow
+
+    def _connect(self):
+        delay = self.retry_delay
+        for attempt in range(self.connect_retries + 1):
+            try:
+                raw = self.driver.connect(**self.connect_args)
+                if self.session_sql:
+                    cur = raw.cursor()
+                    for sql in self.session_sql:
+                        cur.execute(sql)
+                    cur.close()
+                return raw
+            except self.driver.Error as err:
+                with self._cond:
+                    self.errors += 1
+                # Unreachable server / dropped handshake are worth another try; bad credentials aren't
+                transient = isinstance(err, (self.driver.InterfaceError, self.driver.OperationalError))
+                if not transient or attempt == self.connect_retries:
+                    raise
+                print(f"Database connect failed ({err}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay *= 2
+
+    def acquire(self):
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            if self._in_use >= self.capacity:
+                if self._waiting >= self.max_waiters:
+                    self.timeouts += 1
+                    raise PoolTimeout("Database is busy, too many requests waiting")
+                waited = True
+                self._waiting += 1
+                try:
+                    deadline = started + self.timeout
+                    while self._in_use >= self.capacity:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_use += 1
+            idle = self._idle.pop() if self._idle else None
+
+            self.acquired += 1
+            if waited:
+                wait_time = time.monotonic() - started
+                self.waits += 1
+                self.wait_time_total += wait_time
+                self.wait_time_max = max(self.wait_time_max, wait_time)
+
+        try:
+            return self._checkout(idle)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def _checkout(self, idle):
+        now = time.monotonic()
+        if idle:
+            raw, created_at, last_used = idle
+            if now - created_at > self.recycle:
+                self._discard(raw)
+                with self._cond:
+                    self.recycled += 1
+            elif now - last_used > self.ping_after and not self._ping(raw):
+                self._discard(raw)
+                with self._cond:
+                    self.ping_failures += 1
+            else:
+                return PooledConnection(self, raw, created_at)
+        return PooledConnection(self, self._connect(), time.monotonic())
+
+    def _ping(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except self.driver.Error:
+            return False
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except self.driver.Error:
+            pass
+
+    def release(self, conn):
+        raw = conn._raw
+        healthy = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except self.driver.Error:
+            healthy = False
+
+        with self._cond:
+            self._in_use -= 1
+            keep = healthy and len(self._idle) < self.pool_size
+            if keep:
+                self._idle.append((raw, conn.created_at, time.monotonic()))
+            self._cond.notify()
+        if not keep:
+            self._discard(raw)
+
+    def prefill(self, count):
+        """Opens up to count idle connections now (fails fast on bad credentials)."""
+        for _ in range(min(count, self.pool_size)):
+            raw = self._connect()
+            with self._cond:
+                self._idle.append((raw, time.monotonic(), time.monotonic()))
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "wait_time_total_ms": round(self.wait_time_total * 1000, 2),
+                "wait_time_avg_ms": round(self.wait_time_total * 1000 / self.waits, 2) if self.waits else 0.0,
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 2),
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "recycled": self.recycled,
+                "ping_failures": self.ping_failures,
+            }
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def cursor(self, dictionary=False):
+        """with pool.cursor() as (conn, cur): ... -- both are closed/returned on exit."""
+        with self.connection() as conn:
+            cur = conn.cursor(dictionary=dictionary)
+            try:
+                yield conn, cur
+            finally:
+                cur.close()
+
+
+class ReadWriteRouter:
+    """
+    Picks the pool for a statement: reads may go to read_pool, everything else
+    to write_pool. A client that wrote within the last read_after_write seconds
+    reads from write_pool too, so it sees its own changes while the replica
+    catches up (read-your-writes). Clients are remembered per process; a
+    client can also carry the deadline (primary_until, a unix time) between
+    workers. With no read_pool every statement goes to write_pool.
+    """
+
+    def __init__(self, write_pool, read_pool=None, read_after_write=5.0, max_clients=10000):
+        self.write_pool = write_pool
+        self.read_pool = read_pool or write_pool
+        self.read_after_write = read_after_write
+        self.max_clients = max_clients
+        self._writes = {}  # client key -> time.time() of its last write
+        self._lock = threading.Lock()
+        self.reads_replica = 0
+        self.reads_primary = 0  # reads pinned to the primary by a recent write
+
+    @property
+    def split(self):
+        return self.read_pool is not self.write_pool
+
+    def note_write(self, key):
+        """Records a write by key; returns the unix time until which its reads use the primary."""
+        now = time.time()
+        with self._lock:
+            if len(self._writes) >= self.max_clients:
+                cutoff = now - self.read_after_write
+                self._writes = {k: t for k, t in self._writes.items() if t > cutoff}
+            self._writes[key] = now
+        return now + self.read_after_write
+
+    def pool_for(self, read=False, key=None, primary_until=None):
+        if not read or not self.split:
+            return self.write_pool
+        now = time.time()
+        # A client-supplied deadline only counts within one window from now
+        pinned = primary_until is not None and now < primary_until <= now + self.read_after_write
+        if not pinned and key is not None:
+            with self._lock:
+                pinned = now - self._writes.get(key, 0) < self.read_after_write
+        with self._lock:
+            if pinned:
+                self.reads_primary += 1
+            else:
+                self.reads_replica += 1
+        return self.write_pool if pinned else self.read_pool
+
+    def stats(self):
+        with self._lock:
+            return {
+                "split": self.split,
+                "read_after_write_s": self.read_after_write,
+                "reads_replica": self.reads_replica,
+                "reads_primary": self.reads_primary,
+                "recent_writers": len(self._writes),
+            }
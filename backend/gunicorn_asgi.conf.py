@@ -0,0 +1,41 @@
+# gunicorn_asgi.conf.py
+# Production launcher for the async entry point (asgi.py):
+#   gunicorn -c gunicorn_asgi.conf.py asgi:app
+#
+# Defaults to one uvicorn worker (one event loop) per CPU core: a worker
+# waiting on TiDB holds no thread, so it shouldn't need more. How many req/s
+# per core this gains over the sync workers hasn't been measured yet -- run
+# the comparison below against the real database before relying on it. Per worker:
+#   - ASYNC_DB_POOL_SIZE (default 10) connections serve the async routes
+#     (/submit and the form lookups). Those are the in-flight DB calls at once;
+#     raise it until TiDB latency, not the pool, bounds throughput.
+#   - DB_POOL_SIZE (default 5) connections and ASGI_THREADS threads serve the
+#     Flask routes (admin, login, ...) through the WSGI adapter.
+#     An open /admin/changes/stream holds one of those threads for its whole
+#     life, so keep CHANGE_STREAM_MAX well below ASGI_THREADS.
+# Mind the database's connection limit: workers * (ASYNC_DB_POOL_SIZE + DB_POOL_SIZE).
+#
+# Compare against the sync deployment with the same load test, e.g.
+#   gunicorn -w 4 -b 127.0.0.1:5001 "backend:create_app()"       # current
+#   gunicorn -c gunicorn_asgi.conf.py -b 127.0.0.1:5001 asgi:app  # async
+#   python benchmarks/loadtest.py --url http://127.0.0.1:5001 --server-cores 4 \
+#       --mix "POST /submit=5" --compare benchmarks/results/<sync run>.json
+# and read req/s per core from both result files.
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '5001')}")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Waiting on TiDB/SendGrid costs no CPU, so a request may take long without the worker being stuck
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+# Restart workers now and then so slow leaks can't accumulate (jitter avoids restarting all at once)
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 20000))
+max_requests_jitter = 2000
+accesslog = "-"
+
+# asgiref runs the Flask routes on a thread pool of ASGI_THREADS threads; size
+# it like the sync DB pool so those routes queue for a connection, not a thread
+os.environ.setdefault("ASGI_THREADS", os.environ.get("DB_POOL_SIZE", "5"))
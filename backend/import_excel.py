@@ -1,77 +1,183 @@
 # import_excel.py
+# Streams a school roster (XLSX or CSV) into the configured school_data table.
+#
 # Usage:
-#   pip install pandas openpyxl
-#   python import_excel.py
-import pandas as pd
-import sqlite3
+#   pip install openpyxl
+#   python import_excel.py "SchoolWise Book Status (2).xlsx" [--chunk-size 1000] [--sheet NAME]
+#
+# Rows are read in chunks (openpyxl read-only mode / csv reader), so memory
+# stays flat for any file size, and each chunk is upserted with one
+# INSERT ... ON DUPLICATE KEY UPDATE keyed on UNIQUE(school_name, location).
+# The same import_file() is used by the admin upload endpoint in backend.py.
+import argparse
+import csv
 import os
 import time
 
-# --- CONFIG: update this path if your Excel is elsewhere ---
-file_path = "SchoolWise Book Status (2).xlsx"
-db_path = "workbook.db"
-
-# 1) Read Excel
-df = pd.read_excel(file_path, sheet_name=0)
-
-# 2) Basic checks & cleaning
-expected_cols = ['School Name', 'Location', 'Books Reporting Branch']
-for c in expected_cols:
-    if c not in df.columns:
-        raise RuntimeError(f"Expected column '{c}' not found. Found: {df.columns.tolist()}")
-
-df_clean = df.dropna(subset=['School Name', 'Location']).copy()
-df_clean['School Name'] = df_clean['School Name'].astype(str).str.strip()
-df_clean['Location'] = df_clean['Location'].astype(str).str.strip()
-df_clean['Books Reporting Branch'] = df_clean.get('Books Reporting Branch', "").astype(str).str.strip().fillna("")
-
-# 3) Backup existing DB if exists
-if os.path.exists(db_path):
-    bak = db_path + f".bak_{int(time.time())}"
-    os.rename(db_path, bak)
-    print(f"Existing DB backed up to: {bak}")
-
-# 4) Create DB & table (without grade & term columns)
-conn = sqlite3.connect(db_path)
-cur = conn.cursor()
-cur.execute("""
-CREATE TABLE IF NOT EXISTS school_data (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    school_name TEXT NOT NULL,
-    location TEXT,
-    reporting_branch TEXT,
-    num_students TEXT,
-    UNIQUE(school_name, location)
-)
-""")
-conn.commit()
-
-# 5) Insert: for each school+location insert once (no grade/term)
-inserted = 0
-pairs_seen = set()
-for _, row in df_clean.iterrows():
-    school = row['School Name']
-    location = row['Location']
-    reporting = row.get('Books Reporting Branch', "") or ""
-    num_students = row.get('No of Students', None)
-
-    pairs_seen.add((school, location))
-
-    cur.execute("""
-        INSERT OR IGNORE INTO school_data
-        (school_name, location, reporting_branch, num_students)
-        VALUES (?, ?, ?, ?)
-    """, (school, location, reporting, str(num_students) if num_students is not None else None))
-    if cur.rowcount > 0:
-        inserted += cur.rowcount
-
-conn.commit()
-
-# 6) Summary
-cur.execute("SELECT COUNT(*) FROM school_data")
-total_rows = cur.fetchone()[0]
-print(f"Unique school+location pairs in Excel: {len(pairs_seen)}")
-print(f"Total rows in school_data: {total_rows}")
-print(f"Database created at: {os.path.abspath(db_path)}")
-
-conn.close()
+from totals import refresh_branches
+
+SCHOOL_COL = 'School Name'
+LOCATION_COL = 'Location'
+BRANCH_COL = 'Books Reporting Branch'
+STUDENTS_COL = 'No of Students'
+EXPECTED_COLS = [SCHOOL_COL, LOCATION_COL, BRANCH_COL]
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def clean(value):
+    """Cell value -> stripped string, or "" for empty cells."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def iter_sheet_rows(path, sheet=None):
+    """Yields each data row of the file as a {header: value} dict."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = [clean(h) for h in next(reader, [])]
+            check_header(header)
+            for values in reader:
+                yield dict(zip(header, values))
+        return
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = [clean(h) for h in next(rows, ())]
+        check_header(header)
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+def check_header(header):
+    for c in EXPECTED_COLS:
+        if c not in header:
+            raise RuntimeError(f"Expected column '{c}' not found. Found: {header}")
+
+
+def iter_chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_file(conn, path, chunk_size=DEFAULT_CHUNK_SIZE, sheet=None, progress=None):
+    """
+    Upserts every row of path into school_data using conn, committing per chunk.
+    Returns {"rows", "inserted", "updated", "skipped", "seconds", "rows_per_sec"}.
+    progress, if given, is called with the running stats after each chunk.
+    """
+    stats = {"rows": 0, "inserted": 0, "updated": 0, "skipped": 0}
+    seen = set()
+    started = time.perf_counter()
+    cur = conn.cursor()
+    try:
+        for chunk in iter_chunks(iter_sheet_rows(path, sheet), chunk_size):
+            stats["rows"] += len(chunk)
+            records = {}
+            for row in chunk:
+                school = clean(row.get(SCHOOL_COL))
+                location = clean(row.get(LOCATION_COL))
+                # Same rule as before: rows without school/location are dropped,
+                # and the first row for a school+location in the file wins
+                if not school or not location or (school, location) in seen:
+                    stats["skipped"] += 1
+                    continue
+                seen.add((school, location))
+                students = clean(row.get(STUDENTS_COL))
+                records[(school, location)] = (clean(row.get(BRANCH_COL)), students or None)
+
+            if not records:
+                continue
+
+            # Compare against what is already stored so the counts are exact and
+            # unchanged rows are not rewritten
+            keys = list(records)
+            placeholders = ",".join(["(%s, %s)"] * len(keys))
+            cur.execute(
+                f"SELECT school_name, location, reporting_branch, num_students FROM school_data "
+                f"WHERE (school_name, location) IN ({placeholders})",
+                [v for key in keys for v in key]
+            )
+            existing = {(r[0], r[1]): (r[2] or "", None if r[3] is None else str(r[3])) for r in cur.fetchall()}
+
+            upserts = []
+            for key, values in records.items():
+                if key not in existing:
+                    stats["inserted"] += 1
+                elif existing[key] != values:
+                    stats["updated"] += 1
+                else:
+                    stats["skipped"] += 1
+                    continue
+                upserts.append(key + values)
+
+            if upserts:
+                cur.executemany("""
+                    INSERT INTO school_data (school_name, location, reporting_branch, num_students)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE
+                        version = version + 1,
+                        reporting_branch = VALUES(reporting_branch),
+                        num_students = VALUES(num_students)
+                """, upserts)
+                # New or re-branched schools move their summary groups to the new branch
+                refresh_branches(cur, [row[:2] for row in upserts])
+            conn.commit()
+
+            if progress:
+                progress(dict(stats))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 3)
+    stats["rows_per_sec"] = round(stats["rows"] / seconds, 1) if seconds else 0.0
+    return stats
+
+
+def main():
+    import mysql.connector
+    from dotenv import load_dotenv
+    from db import connect_args_from_env
+
+    parser = argparse.ArgumentParser(description="Import a school roster into school_data")
+    parser.add_argument("path", nargs="?", default="SchoolWise Book Status (2).xlsx")
+    parser.add_argument("--chunk-size", type=int, default=int(os.environ.get("IMPORT_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)))
+    parser.add_argument("--sheet", help="XLSX sheet name (default: first sheet)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = mysql.connector.connect(**connect_args_from_env())
+    try:
+        stats = import_file(
+            conn, args.path, chunk_size=args.chunk_size, sheet=args.sheet,
+            progress=lambda s: print(f"  ... {s['rows']} rows read"),
+        )
+    finally:
+        conn.close()
+
+    print(f"Rows read: {stats['rows']}")
+    print(f"Inserted: {stats['inserted']}  Updated: {stats['updated']}  Skipped: {stats['skipped']}")
+    print(f"Took {stats['seconds']}s ({stats['rows_per_sec']} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
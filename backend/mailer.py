@@ -0,0 +1,152 @@
+# mailer.py
+# Background delivery of outbound email (password resets).
+#
+# Requests call EmailQueue.enqueue() and return straight away; one daemon
+# thread per worker process sends the messages, retrying failures with
+# exponential backoff. The transport is pluggable so local runs and tests can
+# use StubTransport instead of SendGrid (EMAIL_TRANSPORT=stub).
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from metrics import timed
+
+FROM_EMAIL = os.environ.get("EMAIL_FROM", "muhammed.shaikh@onmyowntechnology.com")
+
+
+class SendGridTransport:
+    def __init__(self, api_key):
+        self.api_key = api_key
+
+    def send(self, to_email, subject, html):
+        # Imported here so processes that never send mail don't pay for it
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail
+
+        message = Mail(from_email=FROM_EMAIL, to_emails=to_email, subject=subject, html_content=html)
+        response = SendGridAPIClient(self.api_key).send(message)
+        if response.status_code >= 400:
+            raise RuntimeError(f"SendGrid returned {response.status_code}")
+        print(f"SendGrid email sent. Status: {response.status_code}")
+
+
+class StubTransport:
+    """Keeps sent messages in memory (and prints them) instead of sending."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, to_email, subject, html):
+        self.sent.append((to_email, subject, html))
+        print(f"[stub email] to={to_email} subject={subject!r}")
+
+
+def transport_from_env():
+    if os.environ.get("EMAIL_TRANSPORT", "sendgrid").lower() == "stub":
+        return StubTransport()
+    return SendGridTransport(os.environ.get("SENDGRID_API_KEY"))
+
+
+class EmailQueue:
+    def __init__(self, transport, max_attempts=5, base_delay=2.0, max_delay=300.0,
+                 per_recipient_limit=3, per_recipient_window=3600.0):
+        self.transport = transport
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.per_recipient_limit = per_recipient_limit
+        self.per_recipient_window = per_recipient_window
+
+        self._jobs = []  # heap of (due_at, seq, job)
+        self._seq = itertools.count()
+        self._recent = defaultdict(deque)  # recipient -> enqueue times inside the window
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    @classmethod
+    def from_env(cls, transport=None):
+        return cls(
+            transport or transport_from_env(),
+            max_attempts=int(os.environ.get("EMAIL_MAX_ATTEMPTS", 5)),
+            base_delay=float(os.environ.get("EMAIL_RETRY_BASE_DELAY", 2)),
+            per_recipient_limit=int(os.environ.get("EMAIL_PER_RECIPIENT_LIMIT", 3)),
+            per_recipient_window=float(os.environ.get("EMAIL_PER_RECIPIENT_WINDOW", 3600)),
+        )
+
+    def enqueue(self, to_email, subject, html):
+        """Queues a message; returns False if the recipient hit its rate limit."""
+        now = time.monotonic()
+        key = to_email.lower()
+        with self._cond:
+            recent = self._recent[key]
+            while recent and now - recent[0] > self.per_recipient_window:
+                recent.popleft()
+            if len(recent) >= self.per_recipient_limit:
+                self.rate_limited += 1
+                return False
+            recent.append(now)
+
+            job = {"to": to_email, "subject": subject, "html": html, "attempts": 0}
+            heapq.heappush(self._jobs, (now, next(self._seq), job))
+            self._ensure_worker()
+            self._cond.notify()
+        return True
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="email-queue", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs or self._jobs[0][0] > time.monotonic():
+                    timeout = self._jobs[0][0] - time.monotonic() if self._jobs else None
+                    self._cond.wait(timeout)
+                _, _, job = heapq.heappop(self._jobs)
+                self._prune_recent()
+
+            try:
+                with timed("email_send"):
+                    self.transport.send(job["to"], job["subject"], job["html"])
+            except Exception as e:
+                job["attempts"] += 1
+                with self._cond:
+                    if job["attempts"] >= self.max_attempts:
+                        self.failed += 1
+                        print(f"Email to {job['to']} failed after {job['attempts']} attempts: {e}")
+                        continue
+                    delay = min(self.max_delay, self.base_delay * 2 ** (job["attempts"] - 1))
+                    delay *= random.uniform(0.8, 1.2)
+                    self.retried += 1
+                    print(f"Email to {job['to']} failed ({e}); retrying in {delay:.1f}s")
+                    heapq.heappush(self._jobs, (time.monotonic() + delay, next(self._seq), job))
+            else:
+                with self._cond:
+                    self.sent += 1
+
+    def _prune_recent(self):
+        # Drop recipients whose window has fully expired so the dict stays small
+        now = time.monotonic()
+        stale = [k for k, d in self._recent.items() if not d or now - d[-1] > self.per_recipient_window]
+        for k in stale:
+            del self._recent[k]
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._jobs),
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+                "rate_limited": self.rate_limited,
+            }
@@ -0,0 +1,225 @@
+# metrics.py
+# In-process request/DB metrics, rendered in the Prometheus text format.
+#
+# backend.py opens a RequestStats for every request (before_request) and
+# observes it when the response is ready (after_request): latency, number of
+# DB queries and their total time, rows fetched and response bytes, all
+# labelled by route. db.py reports each query through observe_query(), which
+# also logs queries slower than SLOW_QUERY_MS with their SQL (never the
+# parameters). Values are per worker process; Prometheus sums the workers.
+import contextvars
+import os
+import re
+import threading
+import time
+from contextlib import ContextDecorator
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{n}="{escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in sorted(items):
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for label_values, series in sorted(items):
+            for bound, count in zip(self.buckets, series):
+                yield f"{self.name}_bucket{format_labels(self.labels, label_values, [('le', bound)])} {count}"
+            yield f"{self.name}_bucket{format_labels(self.labels, label_values, [('le', '+Inf')])} {series[-1]}"
+            yield f"{self.name}_sum{format_labels(self.labels, label_values)} {round(series[-2], 6)}"
+            yield f"{self.name}_count{format_labels(self.labels, label_values)} {series[-1]}"
+
+
+class Gauge:
+    """Value read at scrape time from a callback returning {label values tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.read = read
+
+    def samples(self):
+        try:
+            values = self.read()
+        except Exception as e:
+            print(f"Metrics gauge {self.name} failed: {e}")
+            return
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to build the response", ("route", "method", "status")))
+request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "DB queries per request", ("route",), COUNT_BUCKETS))
+request_db_seconds = registry.register(Histogram(
+    "http_request_db_seconds", "Total DB time per request", ("route",)))
+request_rows = registry.register(Histogram(
+    "http_request_db_rows", "Rows fetched from the DB per request", ("route",), ROWS_BUCKETS))
+response_bytes = registry.register(Histogram(
+    "http_response_bytes", "Response body size (when known up front)", ("route",), BYTES_BUCKETS))
+query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Duration of single DB statements", ("statement",)))
+slow_queries = registry.register(Counter(
+    "db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("statement",)))
+operation_duration = registry.register(Histogram(
+    "operation_duration_seconds", "Time spent in named operations (password hashing, email send, ...)",
+    ("operation",)))
+
+
+class RequestStats:
+    __slots__ = ("route", "started", "queries", "db_seconds", "rows")
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def start_request(route):
+    stats = RequestStats(route)
+    _current.set(stats)
+    return stats
+
+
+def finish_request(method, status, body_bytes=None):
+    stats = _current.get()
+    if stats is None:
+        return None
+    _current.set(None)
+    elapsed = time.perf_counter() - stats.started
+    request_duration.observe(elapsed, stats.route, method, str(status))
+    request_db_queries.observe(stats.queries, stats.route)
+    request_db_seconds.observe(stats.db_seconds, stats.route)
+    request_rows.observe(stats.rows, stats.route)
+    if body_bytes is not None:
+        response_bytes.observe(body_bytes, stats.route)
+    return stats
+
+
+_WS = re.compile(r"\s+")
+
+
+def statement_kind(sql):
+    word = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "?"
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE") else "OTHER"
+
+
+def observe_query(sql, seconds):
+    """Called by db.py after each execute()/executemany()."""
+    kind = statement_kind(sql)
+    query_duration.observe(seconds, kind)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc(kind)
+        route = stats.route if stats else "-"
+        print(f"[slow query] {seconds * 1000:.0f}ms route={route} sql={_WS.sub(' ', sql).strip()[:500]}")
+
+
+def observe_rows(count):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += count
+
+
+class timed(ContextDecorator):
+    """with timed("password_hash"): ...  or  @timed("email_send")"""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self._started = None
+
+    def _recreate_cm(self):
+        # Fresh instance per decorated call, so concurrent calls don't share the start time
+        return type(self)(self.operation)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        operation_duration.observe(time.perf_counter() - self._started, self.operation)
+        return False
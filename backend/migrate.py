@@ -0,0 +1,205 @@
+# migrate.py
+# Versioned schema migrations and an EXPLAIN check for the app's queries.
+#
+# Usage (from backend/):
+#   python migrate.py              # apply pending migrations
+#   python migrate.py --status     # list applied / pending versions
+#   flask --app backend migrate    # same as the first, via the app
+#   flask --app backend check-queries
+#
+# Migrations live in migrations/NNNN_name.py, each with an up(cur) function,
+# and run in version order. Every applied version is recorded in
+# schema_migrations, so each runs once per database; they are also written to
+# be safe on databases that already had the tables before migrations existed
+# (CREATE TABLE IF NOT EXISTS, ensure_index()).
+import argparse
+import importlib.util
+import os
+import re
+import time
+from datetime import datetime
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+
+def ensure_index(cur, table, name, columns, unique=False):
+    """Creates the index unless one with this name exists (MySQL has no CREATE INDEX IF NOT EXISTS)."""
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (table, name))
+    if cur.fetchone():
+        return False
+    if unique:
+        check_unique(cur, table, name, columns)
+    print(f"  creating index {name} on {table} ({columns})")
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    cur.execute(f"CREATE {kind} {name} ON {table} ({columns})")
+    return True
+
+
+def check_unique(cur, table, name, columns, shown=20):
+    """
+    Raises RuntimeError naming the rows that share a value of columns, so a
+    UNIQUE index fails with something fixable instead of a bare duplicate-key error.
+    """
+    cur.execute(f"""
+        SELECT {columns}, COUNT(*), GROUP_CONCAT(id ORDER BY id)
+        FROM {table} GROUP BY {columns} HAVING COUNT(*) > 1
+        ORDER BY COUNT(*) DESC LIMIT {int(shown) + 1}
+    """)
+    clashes = cur.fetchall()
+    if not clashes:
+        return
+    lines = [f"  {tuple(row[:-2])!r}: {row[-2]} rows, ids {row[-1]}" for row in clashes[:shown]]
+    if len(clashes) > shown:
+        lines.append("  ...")
+    raise RuntimeError(
+        f"Can't create unique index {name}: {table} has duplicate ({columns}) values.\n"
+        + "\n".join(lines)
+        + "\nMerge or delete the extra rows, then run the migration again."
+    )
+
+
+def ensure_column(cur, table, column, definition):
+    """Adds the column unless it exists."""
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        LIMIT 1
+    """, (table, column))
+    if cur.fetchone():
+        return False
+    print(f"  adding column {table}.{column}")
+    cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """[(version, name, path)] sorted by version."""
+    found = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    found.sort()
+    versions = [v for v, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+    return found
+
+
+def load(path):
+    spec = importlib.util.spec_from_file_location(f"migration_{os.path.basename(path)[:-3]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY, name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL, seconds DOUBLE NOT NULL
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {r[0] for r in cur.fetchall()}
+
+
+def migrate(conn, target=None):
+    """Applies pending migrations up to target (default: all); returns the versions applied."""
+    cur = conn.cursor()
+    try:
+        done = applied_versions(cur)
+        conn.commit()
+        applied = []
+        for version, name, path in discover():
+            if version in done or (target is not None and version > target):
+                continue
+            print(f"Applying migration {version:04d}_{name}")
+            started = time.perf_counter()
+            # DDL auto-commits in MySQL/TiDB, which is why every migration is re-runnable
+            load(path).up(cur)
+            seconds = time.perf_counter() - started
+            cur.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at, seconds) VALUES (%s, %s, %s, %s)",
+                (version, name, datetime.utcnow().replace(microsecond=0), round(seconds, 3))
+            )
+            conn.commit()
+            applied.append(version)
+        return applied
+    finally:
+        cur.close()
+
+
+def status(conn):
+    """[(version, name, applied_at or None)]."""
+    cur = conn.cursor()
+    try:
+        applied_versions(cur)
+        conn.commit()
+        cur.execute("SELECT version, applied_at FROM schema_migrations")
+        applied = dict(cur.fetchall())
+    finally:
+        cur.close()
+    return [(version, name, applied.get(version)) for version, name, _ in discover()]
+
+
+def full_scans(plan_rows):
+    """Tables the plan reads in full. Handles MySQL (type=ALL) and TiDB (TableFullScan) EXPLAIN output."""
+    tables = []
+    for row in plan_rows:
+        if row.get("type") == "ALL":
+            tables.append(row.get("table"))
+        elif "TableFullScan" in str(row.get("id", "")):
+            tables.append(row.get("access object") or row.get("id"))
+    return tables
+
+
+def explain_check(conn, queries):
+    """
+    queries: [(name, sql, params, allow_full_scan)]. Runs EXPLAIN on each and
+    returns [(name, tables)] for the ones that would scan a whole table without
+    being allowed to. An empty list means every plan uses an index.
+    """
+    failures = []
+    cur = conn.cursor(dictionary=True)
+    try:
+        for name, sql, params, allow_full_scan in queries:
+            cur.execute("EXPLAIN " + sql, params)
+            scanned = full_scans(cur.fetchall())
+            if scanned and not allow_full_scan:
+                failures.append((name, scanned))
+    finally:
+        cur.close()
+    return failures
+
+
+def main():
+    import mysql.connector
+    from dotenv import load_dotenv
+    from db import connect_args_from_env
+
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations and exit")
+    parser.add_argument("--target", type=int, help="apply up to this version only")
+    args = parser.parse_args()
+
+    load_dotenv()
+    conn = mysql.connector.connect(**connect_args_from_env())
+    try:
+        if args.status:
+            for version, name, applied_at in status(conn):
+                print(f"{version:04d}_{name:<40} {applied_at or 'pending'}")
+            return
+        applied = migrate(conn, args.target)
+    finally:
+        conn.close()
+    print(f"Applied {len(applied)} migration(s)." if applied else "Database is up to date.")
+
+
+if __name__ == "__main__":
+    main()
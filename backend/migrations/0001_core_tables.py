@@ -0,0 +1,57 @@
+# The tables the app started with. Existing databases already have them, so
+# CREATE TABLE IF NOT EXISTS leaves those alone; 0003 adds the keys they lack.
+from migrate import ensure_index
+
+
+def up(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(255),
+            email VARCHAR(255) UNIQUE NOT NULL, password VARCHAR(255) NOT NULL,
+            role VARCHAR(50) NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS school_data (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            school_name VARCHAR(255) NOT NULL, location VARCHAR(255) NOT NULL DEFAULT '',
+            reporting_branch VARCHAR(255), num_students VARCHAR(50),
+            UNIQUE KEY uq_school_location (school_name, location)
+        )
+    """)
+    # submitted_at holds IST timestamps written by the submit routes
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS entries (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            school_name VARCHAR(255), location VARCHAR(255),
+            grade VARCHAR(50), term VARCHAR(50), workbook VARCHAR(255),
+            count INT, remark TEXT, submitted_by VARCHAR(255),
+            submitted_at DATETIME(6), delivered VARCHAR(10) NOT NULL DEFAULT 'No'
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS workbook_status (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            grade VARCHAR(50) NOT NULL, workbook_name VARCHAR(255) NOT NULL,
+            quantity INT NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS reset_tokens (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            email VARCHAR(255) NOT NULL, token VARCHAR(64) NOT NULL,
+            expires_at DATETIME NOT NULL
+        )
+    """)
+    # Older databases created users by hand; make sure login's lookup is indexed
+    if not has_email_key(cur):
+        ensure_index(cur, "users", "uq_users_email", "email", unique=True)
+
+
+def has_email_key(cur):
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = 'users' AND column_name = 'email' AND seq_in_index = 1
+        LIMIT 1
+    """)
+    return cur.fetchone() is not None
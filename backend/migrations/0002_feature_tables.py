@@ -0,0 +1,52 @@
+# Tables added alongside the batch submit, summary, stock ledger and access
+# token features (previously created in init_db()).
+
+
+def up(cur):
+    # Stored responses of /submit/batch so a retried batch is not inserted twice
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            idem_key VARCHAR(128) PRIMARY KEY, response MEDIUMTEXT,
+            created_at DATETIME NOT NULL
+        )
+    """)
+    # Soft-deleted submissions (bulk delete with archive=true)
+    cur.execute("CREATE TABLE IF NOT EXISTS entries_archive LIKE entries")
+    # Delivered submissions past ENTRY_RETENTION_DAYS, see archive_delivered_entries()
+    cur.execute("CREATE TABLE IF NOT EXISTS entries_history LIKE entries")
+    # Materialized per-group totals of entries, see apply_entry_totals()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS entry_totals (
+            group_key CHAR(40) PRIMARY KEY,
+            school_name VARCHAR(255), location VARCHAR(255), reporting_branch VARCHAR(255),
+            grade VARCHAR(50), term VARCHAR(50), workbook VARCHAR(255), delivered VARCHAR(10),
+            row_count INT NOT NULL DEFAULT 0, total_count BIGINT NOT NULL DEFAULT 0,
+            KEY idx_totals_branch_grade (reporting_branch, grade, delivered),
+            KEY idx_totals_school (school_name, location)
+        )
+    """)
+    # Stock ledger and cached balances, see record_stock_movements()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            grade VARCHAR(50) NOT NULL, workbook_name VARCHAR(255) NOT NULL,
+            kind VARCHAR(20) NOT NULL, on_hand_delta INT NOT NULL, reserved_delta INT NOT NULL,
+            entry_id INT NULL, created_at DATETIME NOT NULL,
+            KEY idx_movements_item (grade, workbook_name, id)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS stock_balances (
+            grade VARCHAR(50) NOT NULL, workbook_name VARCHAR(255) NOT NULL,
+            on_hand INT NOT NULL DEFAULT 0, reserved INT NOT NULL DEFAULT 0,
+            updated_at DATETIME NOT NULL,
+            PRIMARY KEY (grade, workbook_name)
+        )
+    """)
+    # Access-token revocations (unix time), see auth.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_revocations (
+            user_id INT PRIMARY KEY, revoked_at DOUBLE NOT NULL,
+            KEY idx_revocations_at (revoked_at)
+        )
+    """)
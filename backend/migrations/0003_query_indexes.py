@@ -0,0 +1,29 @@
+# Indexes for the queries the routes run (see ROUTE_QUERIES in backend.py,
+# checked by `flask --app backend check-queries`):
+#   entries        keyset pages / exports ORDER BY submitted_at DESC, id DESC,
+#                  optionally filtered by school or delivered; stock rebuild by item
+#   school_data    lookups by school_name (+ location); unique for the roster upsert
+#                  (ensure_index() stops with the clashing ids if the table
+#                  already holds duplicates -- merge them, then re-run)
+#   workbook_status  DISTINCT grade, and workbook names WHERE grade=%s, both
+#                  answered from the index alone
+#   reset_tokens   WHERE token=%s, and the expiry purge
+#   idempotency_keys  the age-based purge
+from migrate import ensure_index
+
+INDEXES = [
+    ("entries", "idx_entries_submitted", "submitted_at, id", False),
+    ("entries", "idx_entries_school_submitted", "school_name, submitted_at, id", False),
+    ("entries", "idx_entries_delivered_submitted", "delivered, submitted_at, id", False),
+    ("entries", "idx_entries_item_delivered", "grade, workbook, delivered, count", False),
+    ("school_data", "uq_school_location", "school_name, location", True),
+    ("workbook_status", "idx_workbook_grade_name", "grade, workbook_name", False),
+    ("reset_tokens", "uq_reset_token", "token", True),
+    ("reset_tokens", "idx_reset_tokens_expires", "expires_at", False),
+    ("idempotency_keys", "idx_idempotency_created", "created_at", False),
+]
+
+
+def up(cur):
+    for table, name, columns, unique in INDEXES:
+        ensure_index(cur, table, name, columns, unique)
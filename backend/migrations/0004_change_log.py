@@ -0,0 +1,16 @@
+# change_log: one row per row created/updated/deleted by the admin and submit
+# routes, read by GET /admin/changes and the SSE stream (see record_changes()
+# in backend.py). Pruned by the purge-change-log maintenance job.
+
+
+def up(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            table_name VARCHAR(32) NOT NULL,
+            row_id INT NULL,
+            op VARCHAR(10) NOT NULL,
+            changed_at DATETIME(6) NOT NULL,
+            KEY idx_change_log_changed (changed_at, id)
+        )
+    """)
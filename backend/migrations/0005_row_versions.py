@@ -0,0 +1,9 @@
+# Row versions for optimistic concurrency on the admin-editable tables: every
+# update bumps version, and PATCH /admin/entries, /admin/workbooks only apply a
+# change whose version still matches (see bulkedit.py).
+from migrate import ensure_column
+
+
+def up(cur):
+    ensure_column(cur, "school_data", "version", "INT NOT NULL DEFAULT 1")
+    ensure_column(cur, "workbook_status", "version", "INT NOT NULL DEFAULT 1")
@@ -0,0 +1,8 @@
+# entries.submitted_by for the submissions search (?q= in submission_filters):
+# q is a prefix match on school_name or submitted_by, each answered from an
+# index (idx_entries_school_submitted and this one) instead of a full scan.
+from migrate import ensure_index
+
+
+def up(cur):
+    ensure_index(cur, "entries", "idx_entries_submitted_by", "submitted_by, submitted_at, id")
@@ -0,0 +1,34 @@
+# paging.py
+# Keyset cursors and chunking, shared by the submissions pages, the change
+# feed (GET /admin/changes) and the bulk routes in backend.py.
+#
+# A cursor is the (timestamp, id) position of the last row a client has seen,
+# as url-safe base64 JSON: opaque to clients, and the next page is a
+# "WHERE (ts, id) is past the cursor" range read on the index instead of an OFFSET.
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(submitted_at, row_id):
+    """Opaque keyset cursor for the (submitted_at, id) position of the last row on a page."""
+    if isinstance(submitted_at, datetime):
+        submitted_at = submitted_at.isoformat(sep=" ")
+    raw = json.dumps([str(submitted_at), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns (submitted_at, id) from a cursor, or None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        submitted_at, row_id = json.loads(raw)
+        return str(submitted_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def chunked(seq, size):
+    """Consecutive slices of seq of at most size items (IN (...) lists stay bounded)."""
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
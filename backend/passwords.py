@@ -0,0 +1,46 @@
+# passwords.py
+# Password hashing with a configurable algorithm/cost.
+#
+# PASSWORD_HASH_METHOD takes any werkzeug method string, e.g.
+#   scrypt:32768:8:1        (werkzeug's default)
+#   pbkdf2:sha256:600000
+# Stored hashes keep the method they were made with ("method$salt$hash"), so
+# needs_rehash() can spot hashes made with an older setting; login upgrades
+# those in the background after a successful check.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from metrics import timed
+
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+
+# Rehashes are CPU-bound and rare, one background thread is plenty
+_rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rehash")
+
+
+@timed("password_hash")
+def hash_password(password, method=None):
+    return generate_password_hash(password, method=method or PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH)
+
+
+@timed("password_verify")
+def verify_password(stored_hash, password):
+    return check_password_hash(stored_hash, password)
+
+
+def needs_rehash(stored_hash, method=None):
+    return stored_hash.split("$", 1)[0] != (method or PASSWORD_HASH_METHOD)
+
+
+def rehash_later(password, save):
+    """Hashes password with the current method off the request thread, then calls save(new_hash)."""
+    def run():
+        try:
+            save(hash_password(password))
+        except Exception as e:
+            print(f"Password rehash failed: {e}")
+
+    _rehash_executor.submit(run)
@@ -0,0 +1,179 @@
+# ratelimit.py
+# Sliding-window rate limiting for the auth endpoints (login, forgot/reset password).
+#
+# Each rule is "limit attempts per window seconds" for one key (client IP or
+# email). The window slides: an attempt counts until exactly window seconds
+# after it was made, so there is no burst at fixed window boundaries.
+#
+# Backends:
+#   MemoryBackend  per process (default). With several gunicorn workers each
+#                  worker counts separately, so the effective limit is
+#                  limit x workers.
+#   RedisBackend   shared by every worker/instance (RATE_LIMIT_BACKEND=redis,
+#                  RATE_LIMIT_REDIS_URL). Needs the redis package.
+# Checks never touch the database, so a rejected request costs one dict/redis
+# lookup instead of a query plus a password hash.
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+
+def parse_rule(value):
+    """"5/900" -> (5, 900.0): 5 attempts per 900 seconds."""
+    limit, window = str(value).split("/", 1)
+    return int(limit), float(window)
+
+
+class MemoryBackend:
+    def __init__(self, prune_every=1000):
+        self._hits = defaultdict(deque)  # key -> attempt times, oldest first
+        self._lock = threading.Lock()
+        self._ops = 0
+        self.prune_every = prune_every
+
+    def window(self, key, window, now):
+        """(attempts inside the window, time of the oldest one)."""
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0, None
+            while hits and now - hits[0] >= window:
+                hits.popleft()
+            return len(hits), (hits[0] if hits else None)
+
+    def add(self, key, window, now, keep):
+        with self._lock:
+            hits = self._hits[key]
+            hits.append(now)
+            # Only the newest `keep` attempts can ever matter for the limit
+            while len(hits) > keep:
+                hits.popleft()
+            self._ops += 1
+            if self._ops % self.prune_every == 0:
+                self._prune(now, window)
+
+    def clear(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _prune(self, now, window):
+        # Drops keys with no recent attempts so spraying random emails can't grow memory forever
+        stale = [k for k, d in self._hits.items() if not d or now - d[-1] >= window]
+        for k in stale:
+            del self._hits[k]
+
+    def size(self):
+        with self._lock:
+            return len(self._hits)
+
+
+class RedisBackend:
+    """One sorted set per key (member = unique id, score = attempt time)."""
+
+    def __init__(self, url, prefix="ratelimit:"):
+        # Imported here so the redis package is only needed when this backend is used
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def window(self, key, window, now):
+        k = self.prefix + key
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(k, 0, now - window)
+        pipe.zrange(k, 0, 0, withscores=True)
+        pipe.zcard(k)
+        _, oldest, count = pipe.execute()
+        return count, (oldest[0][1] if oldest else None)
+
+    def add(self, key, window, now, keep):
+        k = self.prefix + key
+        pipe = self.client.pipeline()
+        pipe.zadd(k, {uuid.uuid4().hex: now})
+        pipe.zremrangebyrank(k, 0, -keep - 1)
+        pipe.expire(k, int(window) + 1)
+        pipe.execute()
+
+    def clear(self, key):
+        self.client.delete(self.prefix + key)
+
+    def size(self):
+        return None
+
+
+def backend_from_env():
+    if os.environ.get("RATE_LIMIT_BACKEND", "memory").lower() == "redis":
+        return RedisBackend(os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    return MemoryBackend()
+
+
+class RateLimiter:
+    def __init__(self, backend, enabled=True):
+        self.backend = backend
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = defaultdict(int)  # rule name -> rejections
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(backend_from_env(), enabled=os.environ.get("RATE_LIMIT_ENABLED", "1") != "0")
+
+    def retry_after(self, name, key, limit, window):
+        """Seconds until key may try again under this rule, 0 if it may try now."""
+        if not self.enabled:
+            return 0
+        now = time.time()
+        try:
+            count, oldest = self.backend.window(f"{name}:{key}", window, now)
+        except Exception as e:
+            # A broken shared backend must not lock everyone out of login
+            with self._lock:
+                self.errors += 1
+            print(f"Rate limiter backend error: {e}")
+            return 0
+        if count < limit:
+            return 0
+        with self._lock:
+            self.rejected[name] += 1
+        return max(1, int(oldest + window - now + 0.999))
+
+    def add(self, name, key, limit, window):
+        if not self.enabled:
+            return
+        try:
+            self.backend.add(f"{name}:{key}", window, time.time(), limit)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"Rate limiter backend error: {e}")
+
+    def hit(self, name, key, limit, window):
+        """Checks the rule and, if allowed, counts this attempt. Returns retry_after."""
+        wait = self.retry_after(name, key, limit, window)
+        if wait:
+            return wait
+        self.add(name, key, limit, window)
+        with self._lock:
+            self.allowed += 1
+        return 0
+
+    def reset(self, name, key):
+        try:
+            self.backend.clear(f"{name}:{key}")
+        except Exception as e:
+            print(f"Rate limiter backend error: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "enabled": self.enabled,
+                "allowed": self.allowed,
+                "rejected": dict(self.rejected),
+                "errors": self.errors,
+                "tracked_keys": self.backend.size(),
+            }
@@ -0,0 +1,128 @@
+# scheduler.py
+# Small interval scheduler for housekeeping jobs (expired reset tokens, old
+# delivered entries, ...).
+#
+# Jobs are plain functions returning the number of rows they touched. Each run
+# is timed and logged as "[maintenance] <job>: <rows> rows in <s>s". The
+# scheduler runs either on a daemon thread inside the web process
+# (Scheduler.start) or in the foreground as a separate worker
+# (`flask --app backend maintenance --loop`). With several web workers, pass a
+# `guard` context manager (backend.py uses a MySQL GET_LOCK) so only one
+# process runs a given job at a time.
+import random
+import threading
+import time
+from contextlib import nullcontext
+
+
+class Job:
+    def __init__(self, name, fn, interval):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.next_run = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_rows = None
+        self.last_seconds = None
+        self.last_error = None
+        self.last_run_at = None
+        self.total_rows = 0
+
+
+class Scheduler:
+    def __init__(self, guard=None, jitter=0.1):
+        self.guard = guard  # guard(job_name) -> context manager yielding True if this process may run it
+        self.jitter = jitter
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, name, fn, interval):
+        job = Job(name, fn, interval)
+        # Spread the first runs out a little so all workers don't fire at boot
+        job.next_run = time.monotonic() + random.uniform(0, min(interval, 60))
+        with self._lock:
+            self._jobs[name] = job
+        return job
+
+    def run_job(self, name):
+        """Runs one job now (ignoring its schedule) and returns its row count, or None if skipped."""
+        job = self._jobs[name]
+        started = time.perf_counter()
+        # Taking (or releasing) the guard can fail too, e.g. the database is
+        # down: that counts as a failed run, not an error out of run_pending
+        try:
+            with (self.guard(name) if self.guard else nullcontext(True)) as acquired:
+                if not acquired:
+                    job.skipped += 1
+                    return None
+                rows = job.fn() or 0
+        except Exception as e:
+            seconds = time.perf_counter() - started
+            with self._lock:
+                job.failures += 1
+                job.last_error = str(e)
+                job.last_seconds = round(seconds, 3)
+            print(f"[maintenance] {name}: failed after {seconds:.2f}s: {e}")
+            return None
+
+        seconds = time.perf_counter() - started
+        with self._lock:
+            job.runs += 1
+            job.last_rows = rows
+            job.total_rows += rows
+            job.last_seconds = round(seconds, 3)
+            job.last_error = None
+            job.last_run_at = time.time()
+        print(f"[maintenance] {name}: {rows} rows in {seconds:.2f}s")
+        return rows
+
+    def run_pending(self):
+        now = time.monotonic()
+        for job in list(self._jobs.values()):
+            if job.next_run <= now:
+                self.run_job(job.name)
+                job.next_run = time.monotonic() + job.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def seconds_until_next(self):
+        with self._lock:
+            if not self._jobs:
+                return 60.0
+            return max(0.0, min(j.next_run for j in self._jobs.values()) - time.monotonic())
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            self._stop.wait(min(60.0, self.seconds_until_next()) or 0.1)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": bool(self._thread and self._thread.is_alive()),
+                "jobs": {
+                    name: {
+                        "interval_s": job.interval,
+                        "runs": job.runs,
+                        "failures": job.failures,
+                        "skipped": job.skipped,
+                        "last_rows": job.last_rows,
+                        "last_seconds": job.last_seconds,
+                        "last_error": job.last_error,
+                        "last_run_at": job.last_run_at,
+                        "total_rows": job.total_rows,
+                    }
+                    for name, job in self._jobs.items()
+                },
+            }
@@ -0,0 +1,290 @@
+# schoolsearch.py
+# In-memory typeahead index over school_data rows.
+#
+# Names are normalized (case, punctuation, extra spaces, a few common
+# abbreviations) so "St. Xavier's  High Sch" and "saint xaviers high school"
+# look the same. Three structures answer a query, best matches first:
+#   - the normalized "school location" keys in sorted order: rows whose whole
+#     name starts with the query, alphabetically (a bisect, no scan)
+#   - a prefix trie over the words of school name + location; every query word
+#     must start some word of the row ("dps than" -> DPS, Thane)
+#   - a trigram index for typos ("delhi publik") when prefixes find too little
+# Rows are added/removed one at a time, so admin edits don't need a rebuild.
+# Results are memoized per query until the next change, since typeahead sends
+# the same short prefixes over and over.
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+
+ABBREVIATIONS = {
+    "st": "saint",
+    "sch": "school",
+    "schl": "school",
+    "hs": "high school",
+    "hr": "higher",
+    "sec": "secondary",
+    "intl": "international",
+    "int'l": "international",
+    "eng": "english",
+    "med": "medium",
+    "vid": "vidyalaya",
+}
+FUZZY_MIN_SCORE = 0.5  # share of the query's trigrams a fuzzy match must contain
+FUZZY_COMMON_SHARE = 0.05  # trigrams in more rows than this share don't seed fuzzy candidates
+MEMO_SIZE = 2048
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize(text):
+    """Lower-cased words with punctuation dropped and known abbreviations expanded."""
+    words = _NON_WORD.sub("", str(text or "").lower().replace("-", " ")).split()
+    return " ".join(ABBREVIATIONS.get(w, w) for w in words)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _Node:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()  # rows with a word starting with this node's prefix
+
+
+class SchoolIndex:
+    """Thread-safe prefix + trigram index of (id, school_name, location, reporting_branch) rows."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self.rows = {}  # id -> (school_name, location, reporting_branch)
+        self._keys = {}  # id -> normalized "school location"
+        self._sorted = []  # (key, id), sorted
+        self._by_length = []  # (len(key), key, id), sorted: shortest names first
+        self._root = _Node()
+        self._grams = defaultdict(set)  # trigram -> ids
+        self._row_grams = {}  # id -> trigrams of its key
+        self._memo = {}  # (query, k) -> search() result
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self.upsert(*row)
+
+    def upsert(self, row_id, school_name, location, reporting_branch):
+        with self._lock:
+            self.remove(row_id)
+            key = normalize(f"{school_name} {location}")
+            self.rows[row_id] = (school_name, location, reporting_branch)
+            self._keys[row_id] = key
+            bisect.insort(self._sorted, (key, row_id))
+            bisect.insort(self._by_length, (len(key), key, row_id))
+            self._memo.clear()
+            for word in set(key.split()):
+                node = self._root
+                for ch in word:
+                    node = node.children.setdefault(ch, _Node())
+                    node.ids.add(row_id)
+            self._row_grams[row_id] = trigrams(key)
+            for gram in self._row_grams[row_id]:
+                self._grams[gram].add(row_id)
+
+    def remove(self, row_id):
+        with self._lock:
+            key = self._keys.pop(row_id, None)
+            if key is None:
+                return
+            del self.rows[row_id]
+            del self._sorted[bisect.bisect_left(self._sorted, (key, row_id))]
+            del self._by_length[bisect.bisect_left(self._by_length, (len(key), key, row_id))]
+            self._memo.clear()
+            for word in set(key.split()):
+                node = self._root
+                path = []
+                for ch in word:
+                    path.append((node, ch))
+                    node = node.children[ch]
+                    node.ids.discard(row_id)
+                # Drop branches no row uses any more
+                for parent, ch in reversed(path):
+                    child = parent.children[ch]
+                    if child.ids or child.children:
+                        break
+                    del parent.children[ch]
+            for gram in self._row_grams.pop(row_id):
+                ids = self._grams[gram]
+                ids.discard(row_id)
+                if not ids:
+                    del self._grams[gram]
+
+    def _prefix_ids(self, word):
+        node = self._root
+        for ch in word:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.ids
+
+    def search(self, query, k=10):
+        """Top-k rows for query as (score, id) pairs, best first."""
+        q = normalize(query)
+        if not q or k <= 0:
+            return []
+        with self._lock:
+            memo = self._memo.get((q, k))
+            if memo is None:
+                memo = self._search(q, k)
+                if len(self._memo) >= MEMO_SIZE:
+                    self._memo.clear()
+                self._memo[(q, k)] = memo
+            return memo
+
+    def _search(self, q, k):
+        # 1. Whole-name prefix, alphabetical: scores 3.x
+        results = []
+        start = bisect.bisect_left(self._sorted, (q,))
+        for key, i in self._sorted[start:start + k]:
+            if not key.startswith(q):
+                break
+            results.append((3.0 - len(results) / (k + 1), i))
+        if len(results) == k:
+            return results
+        seen = {i for _, i in results}
+
+        # 2. Every query word starts some word of the row: scores 2.x, shorter names first.
+        # Longest word first, its id set is usually the smallest.
+        words = sorted(set(q.split()), key=len, reverse=True)
+        found = self._prefix_ids(words[0])  # not copied unless intersected
+        for word in words[1:]:
+            if not found:
+                break
+            found = found & self._prefix_ids(word)
+        want = k - len(results)
+        if len(found) > 8 * k:
+            # Broad words ("school"): walking the rows shortest-first finds
+            # `want` members of a big set after a few steps
+            ranked = []
+            for length, _, i in self._by_length:
+                if i in found and i not in seen:
+                    ranked.append((2.0 + 1.0 / (1 + length), i))
+                    if len(ranked) == want:
+                        break
+        else:
+            ranked = heapq.nlargest(want, (
+                (2.0 + 1.0 / (1 + len(self._keys[i])), i) for i in found if i not in seen))
+        results.extend(ranked)
+        if len(results) == k:
+            return results
+
+        # 3. Trigram overlap: scores < 1. A row holding FUZZY_MIN_SCORE of the
+        # query's trigrams must hold one of its rarest ones, so only their
+        # postings are read; trigrams most rows have ("sch", "ool") would
+        # only add noise and are skipped.
+        grams = sorted(trigrams(q), key=lambda g: len(self._grams.get(g, ())))
+        rare = grams[:len(grams) - math.ceil(FUZZY_MIN_SCORE * len(grams)) + 1]
+        common = max(100, FUZZY_COMMON_SHARE * len(self.rows))
+        candidates = set()
+        for gram in rare:
+            ids = self._grams.get(gram, ())
+            if len(ids) <= common:
+                candidates.update(ids)
+        query_grams = set(grams)
+        fuzzy = []
+        for i in candidates:
+            if i in seen or i in found:
+                continue
+            score = len(query_grams & self._row_grams[i]) / len(query_grams)
+            if score >= FUZZY_MIN_SCORE:
+                fuzzy.append((score, i))
+        results.extend(heapq.nlargest(k - len(results), fuzzy))
+        return results
+
+    def results(self, query, k=10):
+        """search() as dicts for the API."""
+        with self._lock:
+            return [
+                {"id": i, "school_name": self.rows[i][0], "location": self.rows[i][1],
+                 "reporting_branch": self.rows[i][2], "score": round(score, 3)}
+                for score, i in self.search(query, k)
+            ]
+
+    def duplicates(self, threshold=0.85):
+        """
+        Groups of rows that are probably the same school spelled differently:
+        identical after normalize(), or trigram-similar (Jaccard >= threshold)
+        names at the same location with the same numbers in them.
+        """
+        with self._lock:
+            names = {i: normalize(row[0]) for i, row in self.rows.items()}
+            parent = {i: i for i in self.rows}
+
+            def find(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+
+            def union(a, b):
+                parent[find(a)] = find(b)
+
+            numbers = {i: re.findall(r"\d+", names[i]) for i in names}
+            by_location = defaultdict(list)
+            for i, row in self.rows.items():
+                by_location[normalize(row[1])].append(i)
+            for ids in by_location.values():
+                grams = {i: trigrams(names[i]) for i in ids}
+                exact = {}
+                for i in ids:
+                    if names[i] in exact:
+                        union(i, exact[names[i]])
+                    else:
+                        exact[names[i]] = i
+                # Prefix filter: with grams ordered rarest first, two names that
+                # reach the threshold share one of the first len - ceil(t*len) + 1
+                # grams of each, so only those are indexed (common grams like
+                # "sch" don't turn this into an all-pairs comparison)
+                distinct = list(exact.values())
+                freq = defaultdict(int)
+                for i in distinct:
+                    for gram in grams[i]:
+                        freq[gram] += 1
+                postings = defaultdict(list)
+                candidates = set()
+                for i in distinct:
+                    ordered = sorted(grams[i], key=lambda g: (freq[g], g))
+                    for gram in ordered[:len(ordered) - math.ceil(threshold * len(ordered)) + 1]:
+                        candidates.update((j, i) for j in postings[gram])
+                        postings[gram].append(i)
+                for a, b in candidates:
+                    n = len(grams[a] & grams[b])
+                    # "School No. 4" and "School No. 5" are different schools
+                    if numbers[a] == numbers[b] and n / (len(grams[a]) + len(grams[b]) - n) >= threshold:
+                        union(a, b)
+
+            groups = defaultdict(list)
+            for i in self.rows:
+                groups[find(i)].append(i)
+            report = []
+            for ids in groups.values():
+                if len(ids) > 1:
+                    report.append([
+                        {"id": i, "school_name": self.rows[i][0], "location": self.rows[i][1],
+                         "reporting_branch": self.rows[i][2]}
+                        for i in sorted(ids)
+                    ])
+            report.sort(key=lambda group: normalize(group[0]["school_name"]))
+            return report
+
+    def stats(self):
+        with self._lock:
+            return {"rows": len(self.rows), "trigrams": len(self._grams)}
@@ -0,0 +1,6 @@
+# The backend modules import each other as top-level modules (run from backend/),
+# so the tests put backend/ on the path the same way.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
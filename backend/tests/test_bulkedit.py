@@ -0,0 +1,179 @@
+import re
+
+import pytest
+
+import bulkedit
+
+
+class DuplicateKey(Exception):
+    pass
+
+
+class FakeTable:
+    """school_data-like rows keyed by id, with a unique (school_name, location)."""
+
+    def __init__(self, rows):
+        self.rows = {row["id"]: dict(row) for row in rows}
+        self.committed = None
+        self.rolled_back = False
+
+    def snapshot(self):
+        return {i: dict(row) for i, row in self.rows.items()}
+
+
+class FakeCursor:
+    """Understands just the statements bulkedit sends."""
+
+    def __init__(self, table):
+        self.table = table
+        self.rowcount = 0
+        self._result = []
+
+    def execute(self, sql, params):
+        if sql.startswith("SELECT"):
+            names = [n.strip() for n in re.match(r"SELECT (.*) FROM", sql).group(1).split(",")]
+            self._result = [tuple(self.table.rows[i][n] for n in names) for i in params if i in self.table.rows]
+            return
+        columns = re.findall(r"(\w+) = %s", sql.split(" WHERE ")[0])
+        *values, row_id, version = params
+        row = self.table.rows.get(row_id)
+        if row is None or row["version"] != version:
+            self.rowcount = 0
+            return
+        updated = {**row, **dict(zip(columns, values)), "version": version + 1}
+        key = (updated["school_name"], updated["location"])
+        if any((r["school_name"], r["location"]) == key for i, r in self.table.rows.items() if i != row_id):
+            raise DuplicateKey(f"Duplicate entry '{key[0]}-{key[1]}' for key 'uq_school_location'")
+        self.table.rows[row_id] = updated
+        self.rowcount = 1
+
+    def fetchall(self):
+        return self._result
+
+
+class FakeConn:
+    def __init__(self, table):
+        self.table = table
+        self.saved = table.snapshot()
+
+    def commit(self):
+        self.table.committed = self.table.snapshot()
+
+    def rollback(self):
+        self.table.rows = self.saved
+        self.table.rolled_back = True
+
+
+def load_rows(cur, table, ids):
+    return [dict(cur.table.rows[i]) for i in ids if i in cur.table.rows]
+
+
+@pytest.fixture
+def table():
+    return FakeTable([
+        {"id": 1, "version": 1, "school_name": "DPS", "location": "Thane", "num_students": 100},
+        {"id": 2, "version": 3, "school_name": "KV", "location": "Pune", "num_students": 200},
+        {"id": 3, "version": 1, "school_name": "St Xavier", "location": "Mumbai", "num_students": 300},
+    ])
+
+
+def run(table, edits, **kwargs):
+    conn = FakeConn(table)
+    return bulkedit.run(conn, FakeCursor(table), "school_data", edits, load_rows, DuplicateKey, **kwargs)
+
+
+def statuses(body):
+    return {r["id"]: r["status"] for r in body["results"]}
+
+
+def test_status_matrix(table):
+    status, body, updated = run(table, [
+        (1, 1, {"num_students": 120}),           # current version
+        (2, 2, {"num_students": 250}),           # stale copy
+        (9, 1, {"num_students": 5}),             # deleted meanwhile
+        (3, 1, {"school_name": "KV", "location": "Pune"}),  # clashes with row 2
+    ])
+    assert status == 200
+    assert statuses(body) == {1: "updated", 2: "conflict", 9: "not_found", 3: "invalid"}
+    assert updated == [1]
+    assert body["success"] is False
+    assert (body["updated"], body["conflict"], body["not_found"], body["invalid"]) == (1, 1, 1, 1)
+    assert table.committed[1]["num_students"] == 120 and table.committed[1]["version"] == 2
+    assert table.committed[2]["num_students"] == 200
+
+
+def test_report_carries_current_rows(table):
+    _, body, _ = run(table, [(1, 1, {"num_students": 120}), (2, 1, {"num_students": 1}), (9, 1, {"num_students": 1})])
+    rows = {r["id"]: r.get("row") for r in body["results"]}
+    assert rows[1]["version"] == 2
+    assert rows[2] == {"id": 2, "version": 3, "school_name": "KV", "location": "Pune", "num_students": 200}
+    assert rows[9] is None
+    assert "message" not in body["results"][0]
+
+
+def test_invalid_row_has_message(table):
+    _, body, _ = run(table, [(3, 1, {"school_name": "DPS", "location": "Thane"})])
+    assert body["results"][0]["status"] == "invalid"
+    assert "uq_school_location" in body["results"][0]["message"]
+
+
+def test_all_updated_is_success(table):
+    status, body, updated = run(table, [(1, 1, {"num_students": 1}), (2, 3, {"num_students": 2})])
+    assert status == 200 and body["success"] is True and updated == [1, 2]
+
+
+def test_atomic_conflict_rolls_back_with_409(table):
+    calls = []
+    status, body, updated = run(
+        table, [(1, 1, {"num_students": 120}), (2, 2, {"num_students": 250})],
+        atomic=True, before_commit=lambda *args: calls.append(args),
+    )
+    assert status == 409
+    assert statuses(body) == {1: "rolled_back", 2: "conflict"}
+    assert body["rolled_back"] == 1 and body["updated"] == 0
+    assert updated == [] and calls == []
+    assert table.rolled_back and table.committed is None
+    assert table.rows[1]["num_students"] == 100 and table.rows[1]["version"] == 1
+
+
+def test_atomic_without_misses_commits(table):
+    status, body, updated = run(table, [(1, 1, {"num_students": 120})], atomic=True)
+    assert status == 200 and updated == [1] and table.committed[1]["num_students"] == 120
+
+
+def test_before_commit_sees_previous_values(table):
+    seen = {}
+
+    def before_commit(cur, edits, updated, previous):
+        seen.update(previous)
+
+    run(table, [(1, 1, {"location": "Mumbai"}), (9, 1, {"location": "x"})],
+        lock_columns=("school_name", "location"), before_commit=before_commit)
+    assert seen == {1: {"version": 1, "school_name": "DPS", "location": "Thane"}}
+
+
+def test_parse_edits():
+    fields = ("num_students", "quantity")
+
+    def whole(value):
+        if int(value) < 0:
+            raise ValueError("quantity must be >= 0")
+        return int(value)
+
+    edits = bulkedit.parse_edits(
+        {"rows": [{"id": "1", "version": 2, "num_students": 5, "school_name": "ignored"}, {"id": 2, "version": 1, "quantity": "7"}]},
+        fields, {"quantity": whole})
+    assert edits == [(1, 2, {"num_students": 5}), (2, 1, {"quantity": 7})]
+
+
+@pytest.mark.parametrize("data, message", [
+    ({}, "non-empty"),
+    ({"rows": []}, "non-empty"),
+    ({"rows": [{"id": 1, "num_students": 1}]}, "numeric id and version"),
+    ({"rows": [{"id": 1, "version": 1, "num_students": 1}, {"id": 1, "version": 1, "num_students": 2}]}, "twice"),
+    ({"rows": [{"id": 1, "version": 1}]}, "changes nothing"),
+    ({"rows": [{"id": 1, "version": 1, "num_students": 1}] * 3}, "At most 2"),
+])
+def test_parse_edits_rejects(data, message):
+    with pytest.raises(ValueError, match=message):
+        bulkedit.parse_edits(data, ("num_students",), max_rows=2)
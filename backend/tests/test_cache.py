@@ -0,0 +1,82 @@
+import asyncio
+
+import cache
+from cache import LookupCache, make_etag
+
+
+class Loader:
+    def __init__(self, value="v"):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_hit_skips_the_loader():
+    c, load = LookupCache(), Loader(["a", "b"])
+    first = c.get_or_load(("schools",), load)
+    assert c.get_or_load(("schools",), load) == first == (["a", "b"], make_etag(["a", "b"]))
+    assert load.calls == 1
+    assert (c.stats()["hits"], c.stats()["misses"]) == (1, 1)
+
+
+def test_expired_entry_is_reloaded(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c, load = LookupCache(ttl=10), Loader()
+    c.get_or_load("k", load)
+    now[0] += 9.9
+    c.get_or_load("k", load)
+    assert load.calls == 1
+    now[0] += 0.2
+    c.get_or_load("k", load)
+    assert load.calls == 2
+
+
+def test_least_recently_used_is_evicted():
+    c = LookupCache(maxsize=2)
+    c.get_or_load("a", Loader())
+    c.get_or_load("b", Loader())
+    c.get_or_load("a", Loader())  # a is now the most recent
+    c.get_or_load("c", Loader())
+    load_b = Loader()
+    c.get_or_load("b", load_b)
+    assert load_b.calls == 1
+    assert c.stats()["size"] == 2
+
+
+def test_invalidate_drops_entries_and_bumps_version():
+    c, load = LookupCache(), Loader()
+    c.get_or_load("k", load)
+    c.invalidate()
+    c.get_or_load("k", load)
+    assert load.calls == 2
+    assert c.stats()["version"] == 1
+
+
+def test_load_in_flight_during_invalidate_is_not_stored():
+    c = LookupCache()
+
+    def stale_load():
+        c.invalidate()  # an admin edit lands while the query runs
+        return "old"
+
+    assert c.get_or_load("k", stale_load) == ("old", make_etag("old"))
+    assert c.get_or_load("k", Loader("new"))[0] == "new"
+
+
+def test_async_loader():
+    c = LookupCache()
+
+    async def load():
+        return [1, 2]
+
+    assert asyncio.run(c.get_or_load_async("k", load)) == ([1, 2], make_etag([1, 2]))
+    assert c.get_or_load("k", Loader())[0] == [1, 2]
+
+
+def test_etag_ignores_key_order():
+    assert make_etag({"a": 1, "b": 2}) == make_etag({"b": 2, "a": 1})
+    assert make_etag({"a": 1}) != make_etag({"a": 2})
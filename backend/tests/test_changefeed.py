@@ -0,0 +1,160 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from changefeed import ChangeNotifier, collapse_changes, read_changes
+from paging import decode_cursor
+
+T0 = datetime(2025, 3, 1, 10, 0, 0, 500)
+
+
+def wait_until(check, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_wait_returns_when_the_marker_moves():
+    marker = [1]
+    notifier = ChangeNotifier(lambda: marker[0], interval=0.01)
+    assert notifier.wait(None, timeout=1.0) == 1
+
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(notifier.wait(1, timeout=2.0)))
+    waiter.start()
+    wait_until(lambda: notifier.stats()["waiting"] == 1)
+    marker[0] = 2
+    waiter.join(2.0)
+    assert result == [2]
+
+
+def test_wait_times_out_without_changes():
+    notifier = ChangeNotifier(lambda: 5, interval=0.01)
+    started = time.monotonic()
+    assert notifier.wait(5, timeout=0.1) == 5
+    assert time.monotonic() - started >= 0.1
+
+
+def test_poller_stops_when_nobody_waits():
+    notifier = ChangeNotifier(lambda: 1, interval=0.01)
+    notifier.wait(None, timeout=0.5)
+    wait_until(lambda: notifier._thread is None)
+    polls = notifier.stats()["polls"]
+    time.sleep(0.05)
+    assert notifier.stats()["polls"] == polls
+
+
+def test_failed_poll_is_counted_and_polling_goes_on():
+    calls = []
+
+    def load_latest():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("database is down")
+        return 3
+
+    notifier = ChangeNotifier(load_latest, interval=0.01)
+    assert notifier.wait(None, timeout=1.0) == 3
+    assert notifier.stats()["errors"] == 1
+
+
+def test_collapse_lists_each_row_once_in_feed_order():
+    log = [
+        (1, "entries", 7, "upsert", T0),
+        (2, "users", 3, "delete", T0),
+        (3, "entries", 5, "upsert", T0),
+        (4, "entries", 7, "delete", T0),
+    ]
+    reset, touched = collapse_changes(log)
+    assert reset == set()
+    assert touched == {"entries": [7, 5], "users": [3]}
+
+
+def test_collapse_reset_replaces_row_changes():
+    log = [(1, "entries", 7, "upsert", T0), (2, "entries", None, "reset", T0), (3, "users", 1, "upsert", T0)]
+    reset, touched = collapse_changes(log)
+    assert reset == {"entries"}
+    assert touched == {"users": [1]}
+
+
+class FeedCursor:
+    """Stub cursor for read_changes(): the NOW(6) query, then one page of change_log."""
+
+    def __init__(self, log, settled=T0 + timedelta(seconds=10), horizon=T0 - timedelta(hours=48)):
+        self.log = log
+        self.settled = settled
+        self.horizon = horizon
+        self.queries = []
+
+    def execute(self, sql, params):
+        self.queries.append((" ".join(sql.split()), list(params)))
+
+    def fetchone(self):
+        return self.settled, self.horizon
+
+    def fetchall(self):
+        # The page the database would return for the last query's keyset and LIMIT
+        params = self.queries[-1][1]
+        since, since_id, settled, limit = params[0], params[2], params[3], params[-1]
+        rows = [row for row in self.log if (row[4], row[0]) > (since, since_id) and row[4] <= settled]
+        return sorted(rows, key=lambda row: (row[4], row[0]))[:limit]
+
+
+def load_rows(cur, table, ids):
+    # Even row ids still exist, odd ones were deleted
+    return [{"id": i} for i in ids if i % 2 == 0]
+
+
+def read(cur, since, limit=4, tables=("entries",)):
+    return read_changes(cur, since, list(tables), load_rows, settle=3, retention_hours=48, limit=limit)
+
+
+def test_read_changes_without_since_returns_the_settled_version():
+    cur = FeedCursor([])
+    body = read(cur, None)
+    assert decode_cursor(body["version"]) == (str(cur.settled), 0)
+    assert cur.queries == [("SELECT NOW(6) - INTERVAL %s MICROSECOND, NOW(6) - INTERVAL %s HOUR", [3000000, 48])]
+
+
+def test_read_changes_resets_when_since_was_pruned():
+    cur = FeedCursor([])
+    body = read(cur, (T0 - timedelta(hours=49), 5), tables=("entries", "users"))
+    assert body["reset"] == ["entries", "users"]
+    assert len(cur.queries) == 1
+
+
+def test_read_changes_query_and_params():
+    cur = FeedCursor([])
+    since = (T0, 9)
+    read(cur, since, tables=("entries", "users"))
+    sql, params = cur.queries[1]
+    assert "WHERE (changed_at > %s OR (changed_at = %s AND id > %s)) AND changed_at <= %s" in sql
+    assert "AND table_name IN (%s,%s) ORDER BY changed_at, id LIMIT %s" in sql
+    assert params == [T0, T0, 9, cur.settled, "entries", "users", 5]
+
+
+def test_read_changes_pages_cover_the_log_once():
+    log = [(i, "entries", i, "upsert", T0 + timedelta(microseconds=i // 3)) for i in range(1, 11)]
+    since, seen, pages = (T0 - timedelta(seconds=1), 0), [], 0
+    while True:
+        cur = FeedCursor(log)
+        body = read(cur, since)
+        changes = body["changes"].get("entries", {"upserts": [], "deletes": []})
+        seen.extend([row["id"] for row in changes["upserts"]] + changes["deletes"])
+        pages += 1
+        if not body["more"]:
+            break
+        changed_at, row_id = decode_cursor(body["version"])
+        since = (datetime.fromisoformat(changed_at), row_id)
+    assert sorted(seen) == list(range(1, 11))
+    assert pages == 3
+
+
+def test_read_changes_splits_upserts_and_deletes_by_current_state():
+    log = [(1, "entries", 4, "delete", T0), (2, "entries", 7, "upsert", T0), (3, "entries", None, "reset", T0)]
+    body = read(FeedCursor(log[:2]), (T0 - timedelta(seconds=1), 0))
+    # 4 was logged as deleted but exists again; 7 was updated and is gone since
+    assert body["changes"] == {"entries": {"upserts": [{"id": 4}], "deletes": [7]}}
+    body = read(FeedCursor(log), (T0 - timedelta(seconds=1), 0))
+    assert (body["reset"], body["changes"]) == (["entries"], {})
@@ -0,0 +1,113 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from db import DBPool, PoolTimeout
+
+
+class DriverError(Exception):
+    pass
+
+
+class InterfaceError(DriverError):
+    pass
+
+
+class FakeRaw:
+    def __init__(self):
+        self.in_transaction = False
+        self.closed = False
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def driver():
+    """Fake DB-API module; driver.opened lists the raw connections it made, in order."""
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(FakeRaw())
+        return opened[-1]
+
+    return SimpleNamespace(connect=connect, opened=opened, Error=DriverError,
+                           InterfaceError=InterfaceError, OperationalError=DriverError)
+
+
+def test_returned_connection_is_reused(driver):
+    pool = DBPool({}, pool_size=2, driver=driver)
+    with pool.connection() as conn:
+        first = conn._raw
+    with pool.connection() as conn:
+        assert conn._raw is first
+    assert len(driver.opened) == 1
+    assert pool.stats()["in_use"] == 0
+
+
+def test_uncommitted_work_is_rolled_back_on_release(driver):
+    pool = DBPool({}, pool_size=1, driver=driver)
+    with pool.connection() as conn:
+        conn._raw.in_transaction = True
+    assert driver.opened[0].in_transaction is False
+
+
+def test_overflow_connections_are_closed_on_release(driver):
+    pool = DBPool({}, pool_size=1, max_overflow=1, driver=driver)
+    a, b = pool.acquire(), pool.acquire()
+    a.close()
+    b.close()
+    assert [raw.closed for raw in driver.opened] == [False, True]
+    assert pool.stats()["idle"] == 1
+
+
+def test_waiter_gets_the_released_connection(driver):
+    pool = DBPool({}, pool_size=1, timeout=2.0, driver=driver)
+    held = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    deadline = time.monotonic() + 2.0
+    while pool.stats()["waiting"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    held.close()
+    waiter.join(2.0)
+    assert got and got[0]._raw is driver.opened[0]
+    assert pool.stats()["waits"] == 1
+
+
+def test_wait_times_out(driver):
+    pool = DBPool({}, pool_size=1, timeout=0.05, driver=driver)
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_full_wait_queue_fails_fast(driver):
+    pool = DBPool({}, pool_size=1, timeout=5.0, max_waiters=0, driver=driver)
+    pool.acquire()
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout, match="too many requests waiting"):
+        pool.acquire()
+    assert time.monotonic() - started < 1.0
+
+
+def test_failed_connect_frees_the_slot(driver):
+    def refuse(**kwargs):
+        raise InterfaceError("can't connect")
+
+    driver.connect = refuse
+    pool = DBPool({}, pool_size=1, connect_retries=1, retry_delay=0, driver=driver)
+    with pytest.raises(InterfaceError):
+        pool.acquire()
+    stats = pool.stats()
+    assert (stats["in_use"], stats["errors"]) == (0, 2)
@@ -0,0 +1,54 @@
+import pytest
+
+from migrate import ensure_index
+
+
+class FakeCursor:
+    """Answers the index lookup and the duplicate preflight from canned rows."""
+
+    def __init__(self, index_exists=False, clashes=()):
+        self.index_exists = index_exists
+        self.clashes = list(clashes)
+        self.executed = []
+        self._result = []
+
+    def execute(self, sql, params=None):
+        self.executed.append(" ".join(sql.split()))
+        if "information_schema.statistics" in sql:
+            self._result = [(1,)] if self.index_exists else []
+        elif "HAVING COUNT(*) > 1" in sql:
+            self._result = self.clashes
+        else:
+            self._result = []
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+
+def test_unique_index_created_when_no_duplicates():
+    cur = FakeCursor()
+    assert ensure_index(cur, "school_data", "uq_school_location", "school_name, location", unique=True)
+    assert cur.executed[-1] == "CREATE UNIQUE INDEX uq_school_location ON school_data (school_name, location)"
+
+
+def test_unique_index_aborts_naming_the_duplicates():
+    cur = FakeCursor(clashes=[("Sunrise School", "Pune", 2, "4,9")])
+    with pytest.raises(RuntimeError) as err:
+        ensure_index(cur, "school_data", "uq_school_location", "school_name, location", unique=True)
+    assert "('Sunrise School', 'Pune'): 2 rows, ids 4,9" in str(err.value)
+    assert not any(sql.startswith("CREATE") for sql in cur.executed)
+
+
+def test_existing_index_skips_preflight():
+    cur = FakeCursor(index_exists=True, clashes=[("x", "y", 2, "1,2")])
+    assert not ensure_index(cur, "school_data", "uq_school_location", "school_name, location", unique=True)
+    assert len(cur.executed) == 1
+
+
+def test_plain_index_skips_preflight():
+    cur = FakeCursor(clashes=[("x", 2, "1,2")])
+    assert ensure_index(cur, "entries", "idx_entries_submitted", "submitted_at, id")
+    assert not any("HAVING" in sql for sql in cur.executed)
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+
+from paging import chunked, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2025-03-01T10:15:00", 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2025-03-01T10:15:00", 42)
+
+
+def test_cursor_keeps_microseconds_of_a_datetime():
+    # change_log.changed_at is DATETIME(6): the position must survive exactly
+    changed_at = datetime(2025, 3, 1, 10, 15, 0, 123456)
+    submitted_at, row_id = decode_cursor(encode_cursor(changed_at, 7))
+    assert (datetime.fromisoformat(submitted_at), row_id) == (changed_at, 7)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", encode_cursor("x", "y")[:-2], "WzFd"])
+def test_malformed_cursor_is_none(cursor):
+    assert decode_cursor(cursor) is None
+
+
+def test_chunked():
+    assert list(chunked([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+    assert list(chunked([], 500)) == []
+    assert list(chunked(list(range(1000)), 500))[1][0] == 500
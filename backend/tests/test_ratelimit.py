@@ -0,0 +1,84 @@
+import pytest
+
+import ratelimit
+from ratelimit import MemoryBackend, RateLimiter, parse_rule
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "time", lambda: now[0])
+    return now
+
+
+def test_parse_rule():
+    assert parse_rule("5/900") == (5, 900.0)
+    with pytest.raises(ValueError):
+        parse_rule("5")
+
+
+def test_limit_then_retry_after_the_oldest_attempt_leaves(clock):
+    limiter = RateLimiter(MemoryBackend())
+    for _ in range(3):
+        assert limiter.hit("login", "1.2.3.4", 3, 60) == 0
+        clock[0] += 10
+    # attempts at 1000, 1010, 1020; now 1030 -> the first one leaves at 1060
+    assert limiter.hit("login", "1.2.3.4", 3, 60) == 30
+    clock[0] = 1060
+    assert limiter.hit("login", "1.2.3.4", 3, 60) == 0
+    assert limiter.stats()["rejected"] == {"login": 1}
+
+
+def test_window_slides_instead_of_resetting(clock):
+    limiter = RateLimiter(MemoryBackend())
+    limiter.hit("login", "k", 2, 60)
+    clock[0] += 50
+    limiter.hit("login", "k", 2, 60)
+    clock[0] += 20  # a fixed window would have reset here
+    assert limiter.hit("login", "k", 2, 60) == 0
+    assert limiter.hit("login", "k", 2, 60) == 40  # until the attempt at +50 leaves
+
+
+def test_rules_and_keys_are_counted_separately(clock):
+    limiter = RateLimiter(MemoryBackend())
+    assert limiter.hit("login", "a", 1, 60) == 0
+    assert limiter.hit("login", "b", 1, 60) == 0
+    assert limiter.hit("forgot", "a", 1, 60) == 0
+    assert limiter.hit("login", "a", 1, 60) > 0
+
+
+def test_reset_clears_a_key(clock):
+    limiter = RateLimiter(MemoryBackend())
+    limiter.hit("login", "a", 1, 60)
+    limiter.reset("login", "a")
+    assert limiter.hit("login", "a", 1, 60) == 0
+
+
+def test_disabled_limiter_allows_everything(clock):
+    limiter = RateLimiter(MemoryBackend(), enabled=False)
+    assert all(limiter.hit("login", "a", 1, 60) == 0 for _ in range(5))
+
+
+def test_backend_errors_fail_open(clock):
+    class Broken:
+        def window(self, *args):
+            raise ConnectionError("redis down")
+
+        def add(self, *args):
+            raise ConnectionError("redis down")
+
+        def size(self):
+            return None
+
+    limiter = RateLimiter(Broken())
+    assert limiter.hit("login", "a", 1, 60) == 0
+    assert limiter.stats()["errors"] == 2
+
+
+def test_memory_backend_keeps_only_limit_attempts_and_prunes_stale_keys():
+    backend = MemoryBackend(prune_every=3)
+    for i in range(5):
+        backend.add("a", 60, 1000.0 + i, keep=2)
+    assert backend.window("a", 60, 1005.0) == (2, 1003.0)
+    backend.add("b", 60, 2000.0, keep=2)  # third op: "a" is older than the window
+    assert backend.size() == 1
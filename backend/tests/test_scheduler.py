@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+
+from scheduler import Scheduler
+
+
+def make(guard=None, fn=lambda: 3):
+    scheduler = Scheduler(guard=guard)
+    scheduler.add("job", fn, 60)
+    return scheduler
+
+
+def job_stats(scheduler):
+    return scheduler.stats()["jobs"]["job"]
+
+
+def test_run_job_counts_rows():
+    scheduler = make()
+    assert scheduler.run_job("job") == 3
+    stats = job_stats(scheduler)
+    assert (stats["runs"], stats["total_rows"], stats["failures"]) == (1, 3, 0)
+
+
+def test_job_error_is_a_failure():
+    def boom():
+        raise RuntimeError("deadlock")
+
+    scheduler = make(fn=boom)
+    assert scheduler.run_job("job") is None
+    stats = job_stats(scheduler)
+    assert (stats["runs"], stats["failures"], stats["last_error"]) == (0, 1, "deadlock")
+
+
+def test_guard_not_acquired_skips():
+    @contextmanager
+    def busy(name):
+        yield False
+
+    ran = []
+    scheduler = make(guard=busy, fn=lambda: ran.append(1))
+    assert scheduler.run_job("job") is None
+    assert ran == []
+    assert job_stats(scheduler)["skipped"] == 1
+
+
+def test_guard_that_fails_to_acquire_is_a_job_failure():
+    def unreachable(name):
+        raise ConnectionError("database is down")
+
+    scheduler = make(guard=unreachable)
+    assert scheduler.run_job("job") is None
+    stats = job_stats(scheduler)
+    assert (stats["failures"], stats["last_error"]) == (1, "database is down")
+
+
+def test_guard_that_fails_to_release_is_a_job_failure():
+    @contextmanager
+    def lost(name):
+        yield True
+        raise ConnectionError("lost connection")
+
+    scheduler = make(guard=lost)
+    assert scheduler.run_job("job") is None
+    assert job_stats(scheduler)["failures"] == 1
+
+
+def test_run_pending_reschedules_after_a_guard_failure():
+    def unreachable(name):
+        raise ConnectionError("database is down")
+
+    scheduler = make(guard=unreachable)
+    job = scheduler._jobs["job"]
+    job.next_run = 0.0
+    scheduler.run_pending()
+    assert job.next_run > 0.0
+    assert job_stats(scheduler)["failures"] == 1
@@ -0,0 +1,83 @@
+from schoolsearch import SchoolIndex, normalize
+
+ROWS = [
+    (1, "St. Xavier's High Sch", "Mumbai", "West"),
+    (2, "Delhi Public School", "Thane", "West"),
+    (3, "Delhi Public School", "Noida", "North"),
+    (4, "Kendriya Vidyalaya No. 4", "Pune", "West"),
+    (5, "Kendriya Vidyalaya No. 5", "Pune", "West"),
+]
+
+
+def index(rows=ROWS):
+    idx = SchoolIndex()
+    idx.rebuild(rows)
+    return idx
+
+
+def ids(idx, query, k=10):
+    return [i for _, i in idx.search(query, k)]
+
+
+def word_matches(idx, query):
+    """Rows found by the prefix tiers, without the fuzzy ones (scores >= 2)."""
+    return [i for score, i in idx.search(query) if score >= 2]
+
+
+def test_normalize_expands_abbreviations_and_drops_punctuation():
+    assert normalize("St. Xavier's  High Sch") == "saint xaviers high school"
+    assert normalize("saint xaviers high school") == "saint xaviers high school"
+
+
+def test_whole_name_prefix_ranks_first():
+    assert ids(index(), "delhi public school noida")[0] == 3
+    assert ids(index(), "st xav") == [1]
+
+
+def test_every_word_must_start_a_word():
+    assert word_matches(index(), "dps than") == []
+    assert word_matches(index(), "public than") == [2]
+
+
+def test_fuzzy_match_for_typos():
+    assert set(ids(index(), "delhi publik school")) == {2, 3}
+
+
+def test_upsert_replaces_the_row():
+    idx = index()
+    assert word_matches(idx, "public than") == [2]
+    idx.upsert(2, "Delhi Public School", "Kalyan", "West")
+    assert word_matches(idx, "public than") == []
+    assert word_matches(idx, "public kaly") == [2]
+    assert idx.rows[2] == ("Delhi Public School", "Kalyan", "West")
+    assert idx.stats()["rows"] == len(ROWS)
+
+
+def test_remove_forgets_words_and_trigrams():
+    idx = index([(1, "Zebra Academy", "Goa", "South")])
+    idx.remove(1)
+    assert ids(idx, "zebra") == []
+    assert idx.stats() == {"rows": 0, "trigrams": 0}
+    assert idx._root.children == {}
+    idx.remove(1)  # already gone: no error
+
+
+def test_memo_is_dropped_on_change():
+    idx = index()
+    assert ids(idx, "kendriya") == [4, 5]
+    idx.remove(4)
+    assert ids(idx, "kendriya") == [5]
+
+
+def test_results_as_dicts():
+    [row] = index().results("st xav", 1)
+    assert row == {"id": 1, "school_name": "St. Xavier's High Sch", "location": "Mumbai",
+                   "reporting_branch": "West", "score": 3.0}
+
+
+def test_duplicates_group_spellings_at_the_same_location():
+    idx = index(ROWS + [(6, "Saint Xaviers High School", "Mumbai", "West"),
+                        (7, "St Xavier's High School", "Goa", "South")])
+    groups = [[row["id"] for row in group] for group in idx.duplicates()]
+    # Same spelling elsewhere (7) or only the number different (4, 5) is not a duplicate
+    assert groups == [[1, 6]]
@@ -0,0 +1,32 @@
+# totals.py
+# Keeps entry_totals.reporting_branch in step with school_data.
+#
+# entry_totals (see DEMAND / DELIVERY SUMMARY in backend.py) stores each
+# group's reporting branch, looked up in school_data by school + location.
+# The branch is not part of the group key, so when a school_data row is added,
+# edited, deleted or re-imported the groups of its old and new school +
+# location are re-read in place, in the same transaction as the change.
+# import_excel.py needs this as well as backend.py, hence its own module.
+REFRESH_CHUNK = 500
+
+
+def branch_of(alias):
+    """SQL for the reporting branch of the school + location of table alias (first school_data row by id)."""
+    return (
+        "COALESCE((SELECT s.reporting_branch FROM school_data s "
+        f"WHERE s.school_name = {alias}.school_name AND s.location = {alias}.location "
+        "ORDER BY s.id LIMIT 1), '')"
+    )
+
+
+def refresh_branches(cur, keys):
+    """Re-reads reporting_branch of the entry_totals groups of these (school_name, location) pairs."""
+    keys = sorted({(str(school), str(location)) for school, location in keys if school is not None and location is not None})
+    for i in range(0, len(keys), REFRESH_CHUNK):
+        chunk = keys[i:i + REFRESH_CHUNK]
+        placeholders = ",".join(["(%s, %s)"] * len(chunk))
+        cur.execute(
+            f"UPDATE entry_totals t SET t.reporting_branch = {branch_of('t')} "
+            f"WHERE (t.school_name, t.location) IN ({placeholders})",
+            [v for key in chunk for v in key]
+        )
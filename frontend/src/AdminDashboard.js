@@ -1,5 +1,4 @@
-import React, { useEffect, useState, useMemo } from "react";
-import * as XLSX from "xlsx";
+import React, { useEffect, useState, useMemo, useCallback, useRef } from "react";
 import DataTable from "react-data-table-component";
 import styled from "styled-components";
 // Import icons for a better UI experience
@@ -7,6 +6,11 @@ import { FaSchool, FaUsers, FaClipboardList, FaBookOpen, FaSearch, FaTimes, FaSi
 
 const API_BASE = "https://school-operation-app.onrender.com";
 
+// Access token from /login; every /admin request must carry it
+const authHeaders = (extra = {}) => ({ ...extra, Authorization: `Bearer ${localStorage.getItem("authToken") || ""}` });
+// Admin tables are requested as ?format=columns ({columns, rows}: keys sent once, not per row)
+const fromColumns = ({ columns = [], rows = [] }) => rows.map((row) => Object.fromEntries(columns.map((c, i) => [c, row[i]])));
+
 // --- Styled Components for UI Consistency and Responsiveness (IMPROVED) ---
 
 const Container = styled.div`
@@ -251,7 +255,7 @@ const AdminDashboard = () => {
   // --- Initial Admin Name Fetch (Functionality unchanged) ---
   useEffect(() => {
     if (adminEmail) {
-      fetch(`${API_BASE}/user-info?email=${adminEmail}`)
+      fetch(`${API_BASE}/user-info`, { headers: authHeaders() })
         .then((res) => res.json())
         .then((data) => {
           if (data.success) setAdminName(data.name);
@@ -280,10 +284,10 @@ const AdminDashboard = () => {
   useEffect(() => {
     if (activeTab === "schools") {
       setLoadingSchools(true);
-      fetch(`${API_BASE}/admin/entries`)
+      fetch(`${API_BASE}/admin/entries?format=columns`, { headers: authHeaders() })
         .then((res) => res.json())
         .then((data) => {
-          setEntries(data);
+          setEntries(fromColumns(data));
           setLoadingSchools(false);
         })
         .catch(() => setLoadingSchools(false));
@@ -293,21 +297,32 @@ const AdminDashboard = () => {
   const handleEditClick = (row) => { setEditingRow(row.id); setEditedRow({ ...row }); };
   const handleCancelClick = () => { setEditingRow(null); setEditedRow({}); };
   const handleSaveClick = () => {
-    fetch(`${API_BASE}/admin/update/${editedRow.id}`, {
-      method: "PUT", headers: { "Content-Type": "application/json" }, body: JSON.stringify(editedRow),
+    // Send only the edited fields plus the version we loaded; the server refuses stale edits
+    const original = entries.find((e) => e.id === editedRow.id) || {};
+    const change = { id: editedRow.id, version: original.version };
+    ["school_name", "location", "reporting_branch", "num_students"].forEach((field) => {
+      if (editedRow[field] !== original[field]) change[field] = editedRow[field];
+    });
+    if (Object.keys(change).length === 2) { setEditingRow(null); return; }
+    fetch(`${API_BASE}/admin/entries`, {
+      method: "PATCH", headers: authHeaders({ "Content-Type": "application/json" }), body: JSON.stringify({ rows: [change] }),
     }).then((res) => res.json()).then((data) => {
-      if (data.success) {
-        setEntries(entries.map(e => e.id === editedRow.id ? editedRow : e));
+      const result = (data.results || [])[0] || {};
+      if (result.row) setEntries((prev) => prev.map((e) => (e.id === result.row.id ? result.row : e)));
+      if (result.status === "updated") {
         setEditingRow(null);
         alert("School updated successfully ✅");
-      } else alert("Update failed");
+      } else if (result.status === "conflict") {
+        setEditedRow({ ...result.row });
+        alert("Someone else changed this school meanwhile ⚠️ Their version is loaded, re-apply your edit and save again.");
+      } else alert(result.message || data.message || "Update failed");
     });
   };
   const handleDeleteClick = async (id) => {
     if (!window.confirm("Are you sure you want to remove this school?")) return;
 
     try {
-      const res = await fetch(`${API_BASE}/admin/delete/${id}`, { method: "DELETE" });
+      const res = await fetch(`${API_BASE}/admin/delete/${id}`, { method: "DELETE", headers: authHeaders() });
       const data = await res.json().catch(() => ({})); // safe json parse
 
       if (data.success) {
@@ -325,10 +340,10 @@ const AdminDashboard = () => {
   const handleAddSchool = () => {
     if (!newSchool.school_name || !newSchool.location || !newSchool.reporting_branch || !newSchool.num_students) return alert("Enter all required data");
     fetch(`${API_BASE}/admin/entries`, {
-      method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify(newSchool),
+      method: "POST", headers: authHeaders({ "Content-Type": "application/json" }), body: JSON.stringify(newSchool),
     }).then((res) => res.json()).then((data) => {
       if (data.success) {
-        setEntries([...entries, { ...newSchool, id: data.id }]);
+        setEntries([...entries, { ...newSchool, id: data.id, version: data.version }]);
         alert("School added successfully ✅");
         setNewSchool({ school_name: "", location: "", reporting_branch: "", num_students: "" });
       } else alert("Failed to add school");
@@ -378,7 +393,7 @@ const AdminDashboard = () => {
       button: true,
       minWidth: '220px',
     },
-  ], [editingRow, editedRow, getButtonStyle]);
+  ], [editingRow, editedRow, entries, getButtonStyle]);
 
   const schoolFilteredItems = entries.filter(
     (item) => Object.values(item).some(value => String(value).toLowerCase().includes(filterText.toLowerCase()))
@@ -394,10 +409,10 @@ const AdminDashboard = () => {
   useEffect(() => {
     if (activeTab === "users") {
       setLoadingUsers(true);
-      fetch(`${API_BASE}/admin/users`)
+      fetch(`${API_BASE}/admin/users?format=columns`, { headers: authHeaders() })
         .then((res) => res.json())
         .then((data) => {
-          setUsers(data);
+          setUsers(fromColumns(data));
           setLoadingUsers(false);
         })
         .catch(() => setLoadingUsers(false));
@@ -406,7 +421,7 @@ const AdminDashboard = () => {
 
   const handleAddUser = () => {
     if (!newUser.email || !newUser.password || !newUser.name) return alert("Enter name, email & password");
-    fetch(`${API_BASE}/admin/users`, { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify(newUser) })
+    fetch(`${API_BASE}/admin/users`, { method: "POST", headers: authHeaders({ "Content-Type": "application/json" }), body: JSON.stringify(newUser) })
       .then((res) => res.json()).then((data) => {
         if (data.success) {
           setUsers([...users, { ...newUser, id: data.id }]);
@@ -420,7 +435,7 @@ const AdminDashboard = () => {
     if (!window.confirm(`Are you sure to remove ${userToDelete?.email}?`)) return;
 
     try {
-      const res = await fetch(`${API_BASE}/admin/users/${id}`, { method: "DELETE" });
+      const res = await fetch(`${API_BASE}/admin/users/${id}`, { method: "DELETE", headers: authHeaders() });
       const data = await res.json().catch(() => ({})); // safe json parse
 
       if (data.success) {
@@ -438,10 +453,16 @@ const AdminDashboard = () => {
   const handleEditUser = (u) => { setEditingUser(u.id); setEditedUser({ ...u }); };
   const handleCancelUser = () => { setEditingUser(null); setEditedUser({}); };
   const handleSaveUser = (id) => {
-    fetch(`${API_BASE}/admin/users/${id}`, { method: "PUT", headers: { "Content-Type": "application/json" }, body: JSON.stringify(editedUser) })
+    // Send only what changed; the password is re-hashed only when a new one is typed
+    const original = users.find((u) => u.id === id) || {};
+    const changes = {};
+    ["name", "email", "role"].forEach((k) => { if (editedUser[k] !== original[k]) changes[k] = editedUser[k]; });
+    if (editedUser.password) changes.password = editedUser.password;
+    if (!Object.keys(changes).length) { setEditingUser(null); return; }
+    fetch(`${API_BASE}/admin/users/${id}`, { method: "PATCH", headers: authHeaders({ "Content-Type": "application/json" }), body: JSON.stringify(changes) })
       .then((res) => res.json()).then((data) => {
         if (data.success) {
-          setUsers(users.map((u) => (u.id === id ? editedUser : u)));
+          setUsers(users.map((u) => (u.id === id ? { ...editedUser, password: undefined } : u)));
           setEditingUser(null);
           alert("User updated successfully ✅");
         } else alert("Failed to update user");
@@ -463,7 +484,7 @@ const AdminDashboard = () => {
     {
       name: "Password", selector: (row) => row.password, sortable: true,
       cell: (row) => editingUser === row.id ?
-        <Input placeholder="Enter Password" value={editedUser.password} onChange={(e) => setEditedUser({ ...editedUser, password: e.target.value })} /> : row.password
+        <Input placeholder="New password (leave blank to keep)" value={editedUser.password || ""} onChange={(e) => setEditedUser({ ...editedUser, password: e.target.value })} /> : row.password
     },
     {
       name: "Actions",
@@ -498,22 +519,70 @@ const AdminDashboard = () => {
   const [selectedSubs, setSelectedSubs] = useState([]);
   const [fromDate, setFromDate] = useState("");
   const [toDate, setToDate] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalSubmissions, setTotalSubmissions] = useState(0);
+  const submissionsRef = useRef(submissions);
+  submissionsRef.current = submissions;
+
+  // 🔹 Server filters + sorts (latest first); we only pull one page at a time
+  const fetchSubmissions = useCallback((cursor) => {
+    const params = new URLSearchParams({ limit: "200", format: "columns" });
+    if (fromDate) params.set("from", fromDate);
+    if (toDate) params.set("to", toDate);
+    if (filterText) params.set("q", filterText);
+    if (cursor) params.set("cursor", cursor);
+
+    setLoadingSubmissions(true);
+    return fetch(`${API_BASE}/admin/form-submissions?${params}`, { headers: authHeaders() })
+      .then((res) => res.json())
+      .then((data) => {
+        const page = fromColumns(data);
+        setSubmissions((prev) => (cursor ? [...prev, ...page] : page));
+        setNextCursor(data.next_cursor || null);
+        // The server only counts on the first page
+        if (data.total != null) setTotalSubmissions(data.total);
+        setLoadingSubmissions(false);
+      })
+      .catch(() => setLoadingSubmissions(false));
+  }, [fromDate, toDate, filterText]);
 
   useEffect(() => {
-    if (activeTab === "submissions") {
-      setLoadingSubmissions(true);
-      fetch(`${API_BASE}/admin/form-submissions`)
-        .then((res) => res.json())
-        .then((data) => {
-          // 🔹 Sort by submitted_at (latest first)
-          const sorted = [...data].sort((a, b) => new Date(b.submitted_at) - new Date(a.submitted_at));
-          setSubmissions(sorted);
-          setLoadingSubmissions(false);
-        })
-
-        .catch(() => setLoadingSubmissions(false));
-    }
-  }, [activeTab]);
+    if (activeTab !== "submissions") return;
+    // 🔹 Debounce so typing in the filter box doesn't fire a request per keystroke
+    const timer = setTimeout(() => fetchSubmissions(null), 300);
+    return () => clearTimeout(timer);
+  }, [activeTab, fetchSubmissions]);
+
+  // 🔹 Live updates: new/changed/deleted entries arrive over SSE (/admin/changes/stream)
+  // instead of re-fetching the page. New rows are only prepended when no filter is set,
+  // since we can't tell client-side whether they'd match the server filters.
+  useEffect(() => {
+    if (activeTab !== "submissions" || typeof EventSource === "undefined") return;
+    const unfiltered = !fromDate && !toDate && !filterText;
+    const token = encodeURIComponent(localStorage.getItem("authToken") || "");
+    const source = new EventSource(`${API_BASE}/admin/changes/stream?tables=entries&access_token=${token}`);
+
+    source.addEventListener("changes", (event) => {
+      const { changes, reset } = JSON.parse(event.data);
+      if (reset.includes("entries")) {
+        fetchSubmissions(null);
+        return;
+      }
+      const { upserts = [], deletes = [] } = changes.entries || {};
+      const prev = submissionsRef.current;
+      const byId = new Map(upserts.map((row) => [row.id, row]));
+      const gone = new Set(deletes);
+      const kept = prev.filter((row) => !gone.has(row.id)).map((row) => {
+        const updated = byId.get(row.id);
+        byId.delete(row.id);
+        return updated || row;
+      });
+      const added = unfiltered ? [...byId.values()].sort((a, b) => b.id - a.id) : [];
+      setSubmissions([...added, ...kept]);
+      setTotalSubmissions((total) => Math.max(0, total + added.length - (prev.length - kept.length)));
+    });
+    return () => source.close();
+  }, [activeTab, fromDate, toDate, filterText, fetchSubmissions]);
 
   const handleDeleteSubmission = async (ids) => {
     if (!ids || ids.length === 0) {
@@ -527,20 +596,17 @@ const AdminDashboard = () => {
     if (!confirmed) return;
 
     try {
-      // 🔹 Multiple delete requests in parallel
-      const responses = await Promise.allSettled(
-        ids.map((id) =>
-          fetch(`${API_BASE}/admin/form-submissions/${id}`, { method: "DELETE" })
-        )
-      );
-
-      // 🔹 Successful deletions filter karo
-      const deletedIds = [];
-      responses.forEach((res, index) => {
-        if (res.status === "fulfilled" && res.value.ok) {
-          deletedIds.push(ids[index]);
-        }
+      // 🔹 One bulk request, deleted in a single transaction on the server
+      const res = await fetch(`${API_BASE}/admin/form-submissions/bulk-delete`, {
+        method: "POST", headers: authHeaders({ "Content-Type": "application/json" }), body: JSON.stringify({ ids }),
       });
+      const data = await res.json().catch(() => ({}));
+      if (!data.success) {
+        alert(data.message || "❌ Failed to delete submissions.");
+        return;
+      }
+
+      const deletedIds = ids.filter((id) => data.results?.[id] === "deleted");
 
       // 🔹 Update state
       if (deletedIds.length > 0) {
@@ -562,7 +628,7 @@ const AdminDashboard = () => {
   const updateDeliveredStatus = (markDelivered) => {
     if (selectedSubs.length === 0) return alert("Select at least one entry");
     fetch(`${API_BASE}/admin/mark-delivered`, {
-      method: "PUT", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ ids: selectedSubs, delivered: markDelivered ? "Yes" : "No" }),
+      method: "PUT", headers: authHeaders({ "Content-Type": "application/json" }), body: JSON.stringify({ ids: selectedSubs, delivered: markDelivered ? "Yes" : "No" }),
     }).then((res) => res.json()).then((data) => {
       if (data.success) {
         setSubmissions((prev) =>
@@ -580,29 +646,16 @@ const AdminDashboard = () => {
       prev.includes(row.id) ? prev.filter((x) => x !== row.id) : [...prev, row.id]
     );
   };
-  const submissionsFilteredItems = useMemo(() => {
-    return submissions.filter((s) => {
-      // Date Filtering Logic (Unchanged)
-      if (s.submitted_at) {
-        const submitted = new Date(s.submitted_at);
-        let from = fromDate ? new Date(fromDate) : null;
-        let to = toDate ? new Date(toDate) : null;
-        if (from && submitted < from) return false;
-        if (to) {
-          to.setHours(23, 59, 59, 999);
-          if (submitted > to) return false;
-        }
-      }
-      // Text Filtering Logic (Unchanged)
-      const lowerCaseFilter = filterText.toLowerCase();
-      return Object.values(s).some(value => String(value).toLowerCase().includes(lowerCaseFilter));
-    });
-  }, [submissions, fromDate, toDate, filterText]);
-  const downloadExcel = () => {
-    const ws = XLSX.utils.json_to_sheet(submissionsFilteredItems);
-    const wb = XLSX.utils.book_new();
-    XLSX.utils.book_append_sheet(wb, ws, "Submissions");
-    XLSX.writeFile(wb, "submissions.xlsx");
+  // Date + text filtering now happens on the server (see fetchSubmissions)
+  const submissionsFilteredItems = submissions;
+  // 🔹 Server streams the export with the same filters, so it covers every matching row
+  const downloadExcel = (report = "submissions") => {
+    // A plain navigation can't send headers, so the token goes in the query string
+    const params = new URLSearchParams({ format: "xlsx", report, access_token: localStorage.getItem("authToken") || "" });
+    if (fromDate) params.set("from", fromDate);
+    if (toDate) params.set("to", toDate);
+    if (filterText) params.set("q", filterText);
+    window.location.href = `${API_BASE}/admin/form-submissions/export?${params}`;
   };
 
   const submissionColumns = useMemo(() => [
@@ -637,6 +690,7 @@ const AdminDashboard = () => {
   const [workbooks, setWorkbooks] = useState([]);
   const [loadingWorkbooks, setLoadingWorkbooks] = useState(false);
   const [adjustValues, setAdjustValues] = useState({});
+  const [pendingQty, setPendingQty] = useState({}); // id -> new quantity, saved together by saveQuantities()
   const [newWorkbook, setNewWorkbook] = useState({
     grade: "",
     workbook_name: "",
@@ -646,10 +700,10 @@ const AdminDashboard = () => {
   useEffect(() => {
     if (activeTab === "workbooks") {
       setLoadingWorkbooks(true);
-      fetch(`${API_BASE}/admin/workbooks`)
+      fetch(`${API_BASE}/admin/workbooks?format=columns`, { headers: authHeaders() })
         .then((res) => res.json())
         .then((data) => {
-          setWorkbooks(data);
+          setWorkbooks(fromColumns(data));
           setLoadingWorkbooks(false);
         })
         .catch(() => setLoadingWorkbooks(false));
@@ -660,7 +714,7 @@ const AdminDashboard = () => {
     if (!window.confirm("Are you sure you want to delete this workbook?")) return;
 
     try {
-      const res = await fetch(`${API_BASE}/admin/workbooks/${id}`, { method: "DELETE" });
+      const res = await fetch(`${API_BASE}/admin/workbooks/${id}`, { method: "DELETE", headers: authHeaders() });
       const data = await res.json().catch(() => ({})); // safe json parse
 
       if (data.success) {
@@ -676,20 +730,38 @@ const AdminDashboard = () => {
   };
 
   const updateQuantity = (id, newQty) => {
-    fetch(`${API_BASE}/admin/workbooks/${id}`, { method: "PUT", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ quantity: newQty }), })
-      .then(() => {
-        setWorkbooks(workbooks.map((w) => (w.id === id ? { ...w, quantity: newQty } : w)));
-        setAdjustValues((prev) => ({ ...prev, [id]: "" }));
-        alert("Quantity updated successfully ✅");
+    setPendingQty((prev) => ({ ...prev, [id]: newQty }));
+    setAdjustValues((prev) => ({ ...prev, [id]: "" }));
+  };
+  const saveQuantities = () => {
+    const rows = workbooks.filter((w) => w.id in pendingQty).map((w) => ({ id: w.id, version: w.version, quantity: pendingQty[w.id] }));
+    if (!rows.length) return;
+    fetch(`${API_BASE}/admin/workbooks`, { method: "PATCH", headers: authHeaders({ "Content-Type": "application/json" }), body: JSON.stringify({ rows }), })
+      .then((res) => res.json())
+      .then((data) => {
+        if (!data.results) return alert(data.message || "Failed to update quantities.");
+        const current = {};
+        data.results.forEach((r) => { if (r.row) current[r.id] = r.row; });
+        setWorkbooks((prev) => prev
+          .filter((w) => !data.results.some((r) => r.id === w.id && r.status === "not_found"))
+          .map((w) => current[w.id] || w));
+        // Conflicting rows stay unsaved: their counts changed meanwhile, so recheck before saving again
+        setPendingQty((prev) => {
+          const next = { ...prev };
+          data.results.forEach((r) => { if (r.status !== "conflict") delete next[r.id]; });
+          return next;
+        });
+        if (data.conflict) alert(`Saved ${data.updated}, but ${data.conflict} workbook(s) were changed by someone else meanwhile ⚠️ Check the refreshed stock and save again.`);
+        else alert(`Quantities updated successfully ✅ (${data.updated})`);
       })
-      .catch(() => alert("Failed to update quantity."));
+      .catch(() => alert("Failed to update quantities."));
   };
   const handleAdjustChange = (id, value) => { setAdjustValues((prev) => ({ ...prev, [id]: value })); };
   const handleAdjustQuantity = (id, type) => {
     const adjust = parseInt(adjustValues[id] || 0, 10);
     if (isNaN(adjust) || adjust <= 0) return alert("Enter a valid positive number");
     const workbook = workbooks.find((w) => w.id === id);
-    let newQty = parseInt(workbook.quantity, 10);
+    let newQty = parseInt(id in pendingQty ? pendingQty[id] : workbook.quantity, 10);
     if (type === "add") newQty += adjust;
     if (type === "sub") newQty -= adjust;
     if (newQty < 0) return alert("Quantity cannot be negative.");
@@ -700,10 +772,10 @@ const AdminDashboard = () => {
     if (!grade || !workbook_name || !quantity) return alert("Enter grade, workbook name & quantity");
     const qtyNum = parseInt(quantity, 10);
     if (isNaN(qtyNum) || qtyNum < 0) return alert("Enter valid quantity (non-negative number)");
-    fetch(`${API_BASE}/admin/workbooks`, { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ grade, workbook_name, quantity: qtyNum }), })
+    fetch(`${API_BASE}/admin/workbooks`, { method: "POST", headers: authHeaders({ "Content-Type": "application/json" }), body: JSON.stringify({ grade, workbook_name, quantity: qtyNum }), })
       .then((res) => res.json()).then((data) => {
         if (data.success) {
-          setWorkbooks([...workbooks, { ...newWorkbook, id: data.id, quantity: qtyNum }]);
+          setWorkbooks([...workbooks, { ...newWorkbook, id: data.id, quantity: qtyNum, version: data.version }]);
           alert("Workbook added successfully ✅");
           setNewWorkbook({ grade: "", workbook_name: "", quantity: "" });
         } else alert("Failed to add workbook");
@@ -714,7 +786,12 @@ const AdminDashboard = () => {
     { name: "S.No", width: '80px', cell: (row, index) => index + 1 },
     { name: "Grade", selector: (row) => row.grade, sortable: true, width: '100px' },
     { name: "Workbook Name", selector: (row) => row.workbook_name, sortable: true, wrap: true, minWidth: '150px' },
-    { name: "Current Stock Qty", selector: (row) => row.quantity, sortable: true, width: '200px' },
+    {
+      name: "Current Stock Qty", selector: (row) => row.quantity, sortable: true, width: '200px',
+      cell: (row) => (row.id in pendingQty ? <span>{row.quantity} → <b>{pendingQty[row.id]}</b> (unsaved)</span> : row.quantity),
+    },
+    { name: "Reserved", selector: (row) => row.reserved, sortable: true, width: '130px' },
+    { name: "Available", selector: (row) => row.available, sortable: true, width: '130px' },
     {
       name: "Adjust Stock (New / Delivered)",
       cell: (row) => (
@@ -732,7 +809,7 @@ const AdminDashboard = () => {
       button: true,
       minWidth: '350px',
     },
-  ], [adjustValues, getButtonStyle]);
+  ], [adjustValues, pendingQty, workbooks, getButtonStyle]);
 
   const workbookFilteredItems = workbooks.filter(
     (item) => Object.values(item).some(value => String(value).toLowerCase().includes(filterText.toLowerCase()))
@@ -886,8 +963,14 @@ const AdminDashboard = () => {
             <Button onClick={() => updateDeliveredStatus(false)} bgColor="#6B7280" disabled={selectedSubs.length === 0}>
               <FaTimes /> Mark Undelivered
             </Button>
-            <Button onClick={downloadExcel} bgColor="#4F46E5">
-              <FaDownload /> Download Excel ({submissionsFilteredItems.length} records)
+            <Button onClick={() => downloadExcel("submissions")} bgColor="#4F46E5">
+              <FaDownload /> Download Excel ({totalSubmissions} records)
+            </Button>
+            <Button onClick={() => downloadExcel("delivery")} bgColor="#4F46E5">
+              <FaDownload /> Delivery Report
+            </Button>
+            <Button onClick={() => fetchSubmissions(nextCursor)} bgColor="#3B82F6" disabled={!nextCursor || loadingSubmissions}>
+              <FaPlus /> Load More ({submissions.length} of {totalSubmissions})
             </Button>
           </ControlGroup>
           
@@ -912,6 +995,12 @@ const AdminDashboard = () => {
             />
             <Button onClick={handleAddWorkbook} bgColor="#10B981" style={{ minWidth: '150px' }}><FaPlus /> Add Workbook</Button>
           </ControlGroup>
+          {Object.keys(pendingQty).length > 0 && (
+            <ControlGroup>
+              <Button onClick={saveQuantities} bgColor="#4F46E5"><FaSave /> Save changes ({Object.keys(pendingQty).length})</Button>
+              <Button onClick={() => setPendingQty({})} bgColor="#6B7280">Discard</Button>
+            </ControlGroup>
+          )}
         </Card>
       )}
 
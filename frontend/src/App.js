@@ -28,6 +28,7 @@ function App() {
   const handleLogout = () => {
     localStorage.removeItem("userRole");
     localStorage.removeItem("userEmail");
+    localStorage.removeItem("authToken");
     setIsLoggedIn(false);
     setRole("");
   };
@@ -33,34 +33,43 @@ const FormPage = () => {
     return () => window.removeEventListener("resize", handleResize);
   }, []);
 
-  // Fetch Grades (UNCHANGED)
+  // One request for the whole school/location/branch/grade/workbook tree;
+  // every cascading dropdown below is resolved locally from it.
+  const [formTree, setFormTree] = useState({ schools: [], grades: [] });
+
   useEffect(() => {
-    axios.get(`${API_BASE}/grades`)
-      .then(res => setGrades(res.data || []))
-      .catch(() => setGrades([]));
+    axios
+      .get(`${API_BASE}/form-bootstrap`)
+      .then((res) => {
+        const tree = res.data || {};
+        setFormTree({ schools: tree.schools || [], grades: tree.grades || [] });
+        setSchools((tree.schools || []).map(([name]) => name));
+        setGrades((tree.grades || []).map(([g]) => g));
+      })
+      .catch(() => {
+        setSchools([]);
+        setGrades([]);
+      });
   }, []);
 
-  // Fetch Workbook Options
-  const fetchWorkbookOptions = async (g, s, loc) => {
-    if (!g) {
-      setWorkbookOptions([]);
-      return;
-    }
-    try {
-      const res = await axios.get(`${API_BASE}/workbook_name`, {
-        params: { grade: g, school: s, location: loc },
-      });
-      setWorkbookOptions(res.data.workbooks || []);
-    } catch {
-      setWorkbookOptions([]);
-    }
+  const locationsFor = (s) => {
+    const entry = formTree.schools.find(([name]) => name === s);
+    return entry ? entry[1] : [];
+  };
+
+  // Workbook Options
+  const fetchWorkbookOptions = (g) => {
+    const entry = formTree.grades.find(([name]) => String(name) === String(g));
+    setWorkbookOptions(entry ? entry[1] : []);
   };
 
   // Fetch User Info (UNCHANGED)
   useEffect(() => {
     if (userEmail) {
       axios
-        .get(`${API_BASE}/user-info`, { params: { email: userEmail } })
+        .get(`${API_BASE}/user-info`, {
+          headers: { Authorization: `Bearer ${localStorage.getItem("authToken") || ""}` },
+        })
         .then((res) => {
           if (res.data.success) setUserName(res.data.name);
         })
@@ -68,41 +77,21 @@ const FormPage = () => {
     }
   }, [userEmail]);
 
-  // Fetch Schools (UNCHANGED)
-  useEffect(() => {
-    axios
-      .get(`${API_BASE}/schools`)
-      .then((res) => setSchools(res.data))
-      .catch(() => setSchools([]));
-  }, []);
-
-  // Fetch Locations (UNCHANGED logic, but used in handler)
-  const fetchLocations = async (s) => {
-    try {
-      const res = await axios.get(`${API_BASE}/locations`, {
-        params: { school: s },
-      });
-      setLocations(res.data || []);
-      if (res.data?.length === 1) {
-        const onlyLoc = res.data[0];
-        setLocation(onlyLoc);
-        fetchReportingBranch(s, onlyLoc);
-      }
-    } catch {
-      setLocations([]);
+  // Locations for a school (from the bootstrap tree)
+  const fetchLocations = (s) => {
+    const locs = locationsFor(s).map(([loc]) => loc);
+    setLocations(locs);
+    if (locs.length === 1) {
+      const onlyLoc = locs[0];
+      setLocation(onlyLoc);
+      fetchReportingBranch(s, onlyLoc);
     }
   };
 
-  // Fetch Reporting Branch (UNCHANGED)
-  const fetchReportingBranch = async (s, loc) => {
-    try {
-      const res = await axios.get(`${API_BASE}/reporting_branch`, {
-        params: { school: s, location: loc },
-      });
-      setReportingBranch(res.data.reporting_branch || "");
-    } catch {
-      setReportingBranch("");
-    }
+  // Reporting Branch (from the bootstrap tree)
+  const fetchReportingBranch = (s, loc) => {
+    const entry = locationsFor(s).find(([name]) => name === loc);
+    setReportingBranch(entry ? entry[1] || "" : "");
   };
 
   // 1. School Change Handler (Fixed cascading reset)
@@ -118,6 +107,35 @@ const FormPage = () => {
     fetchLocations(s);
   };
 
+  // School typeahead: the server ranks matches (prefix first, typos tolerated),
+  // so we don't filter the whole school list in the browser
+  const [schoolQuery, setSchoolQuery] = useState("");
+  const [schoolMatches, setSchoolMatches] = useState([]);
+
+  useEffect(() => {
+    const q = schoolQuery.trim();
+    if (!q || q === school) {
+      setSchoolMatches([]);
+      return;
+    }
+    const timer = setTimeout(() => {
+      axios
+        .get(`${API_BASE}/schools/search`, { params: { q, k: 10 } })
+        .then((res) => setSchoolMatches(res.data || []))
+        .catch(() => setSchoolMatches([]));
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [schoolQuery, school]);
+
+  const handleSchoolInput = (value) => {
+    setSchoolQuery(value);
+    if (schools.includes(value)) {
+      handleSchoolChange(value);
+    } else if (school) {
+      handleSchoolChange("");
+    }
+  };
+
   // 2. Location Change Handler (Fixed cascading reset)
   const handleLocationChange = (loc) => {
     setLocation(loc);
@@ -139,8 +157,7 @@ const FormPage = () => {
     setGrade(g);
     setWorkbook("");
     setWorkbookOptions([]);
-    // Pass school and location for robust workbook fetching
-    fetchWorkbookOptions(g, school, location); 
+    fetchWorkbookOptions(g);
   };
   
   // Submission Logic (UNCHANGED)
@@ -167,6 +184,7 @@ const FormPage = () => {
       });
       window.alert("Submitted successfully!");
       setSchool("");
+      setSchoolQuery("");
       setLocation("");
       setGrade("");
       setTerm("");
@@ -267,20 +285,20 @@ const FormPage = () => {
         {/* 1. School */}
         <div style={styles.field}>
           <label style={styles.label}>School</label>
-          <select
-            value={school}
-            onChange={(e) => handleSchoolChange(e.target.value)}
+          <input
+            list="school-matches"
+            value={schoolQuery}
+            placeholder="Type to search school"
+            onChange={(e) => handleSchoolInput(e.target.value)}
             style={sharedInputStyle}
             onMouseEnter={applyHover}
             onMouseLeave={removeHover}
-          >
-            <option value="">Select School</option>
-            {schools.map((s, i) => (
-              <option key={i} value={s}>
-                {s}
-              </option>
+          />
+          <datalist id="school-matches">
+            {[...new Set(schoolMatches.map((m) => m.school_name))].map((name) => (
+              <option key={name} value={name} />
             ))}
-          </select>
+          </datalist>
         </div>
 
         {/* 2. Location */}
@@ -42,12 +42,13 @@ export default function LoginPage({ onLogin }) {
       if (res.data.success) {
         localStorage.setItem("userRole", res.data.role);
         localStorage.setItem("userEmail", res.data.email);
+        localStorage.setItem("authToken", res.data.token);
         onLogin();
       } else {
         setError("Invalid email or password");
       }
-    } catch {
-      setError("Invalid email or password");
+    } catch (err) {
+      setError(err.response?.status === 429 ? err.response.data.message : "Invalid email or password");
     } finally {
       setLoading(false);
     }
@@ -81,7 +82,7 @@ export default function LoginPage({ onLogin }) {
       }
     } catch (err) {
       console.error(err);
-      setForgotMessage("Error contacting server. Try again later.");
+      setForgotMessage(err.response?.status === 429 ? err.response.data.message : "Error contacting server. Try again later.");
     } finally {
       setLoading(false);
     }